@@ -11,7 +11,6 @@ except ImportError:
         def __init__(self, api_key=None):
             self.api_key = api_key
             print("Warning: OpenAI library not available. AI features will be limited.")
-import ta
 import time
 import requests
 from datetime import datetime, timedelta
@@ -19,15 +18,27 @@ import telegram
 import numpy as np
 from concurrent.futures import ThreadPoolExecutor
 import logging
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_not_exception_type
 import threading
-import hashlib
 import tensorflow as tf
 from sklearn.preprocessing import MinMaxScaler
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import LSTM, Dense, Dropout
 import pytz
 import signal
+from kis_http import KISHttpPool, SingleFlight, deadline_scope, current_deadline, submit_with_context
+from circuit_breaker import CircuitOpenError
+from kis_token_store import get_token_store
+from ohlcv_bars import OHLCVBars
+from bar_store import BarStore
+from volume_screener import build_panel, screen_volume_increase
+from symbol_registry import SymbolRegistry
+from ticker_context import cycle_scope, current_cycle
+from score_table import ScoreTable
+from indicators import IndicatorPool, summarize_bars, MIN_INDICATOR_BARS
+from kis_quota import shared_quota_for_app, KIS_API_MAX_RATE
+from cache_store import MemoryCache, SQLiteCacheStore, BackgroundRefresher, MISS, make_cache_key, takes_self, UncacheableArgument
+from rate_limit import TokenBucket, AdaptiveRateController, priority_scope, current_lane, LANE_ORDER, LANE_RISK, LANE_SCAN
 
 # Firebase 설정을 위한 추가 라이브러리
 try:
@@ -106,11 +117,39 @@ def load_firebase_config():
 STOCKS_FILE = "purchased_stocks.json"
 TRADE_HISTORY_FILE = "trade_history.json"
 POSITIONS_FILE = "positions.json"
-CACHE_DIR = "api_cache"
+# cache_result 디스크 캐시 (예전 api_cache/ 디렉토리는 더 이상 쓰지 않으므로 지워도 됨)
+CACHE_DB_FILE = "api_cache.db"
+# 스캔 점수 테이블 (응답 캐시와 LRU/최대 항목 수를 나눠 쓰지 않도록 별도 파일)
+SCORE_DB_FILE = "score_table.db"
 TOKEN_FILE = "kis_token.json"
-
-# 캐시 디렉토리 생성
-os.makedirs(CACHE_DIR, exist_ok=True)
+# Flask 서버가 봇 상태 화면에 보여줄 KIS 연결 상태 (차단기 등)
+BOT_HEALTH_FILE = "bot_health.json"
+
+# 디스크 캐시 최대 항목 수와 만료 항목 정리 주기 (초)
+CACHE_MAX_ENTRIES = 20000
+CACHE_SWEEP_INTERVAL = 300
+# 점수 테이블 최대 항목 수 (종목당 한 항목)
+SCORE_MAX_ENTRIES = 5000
+cache_store = SQLiteCacheStore(CACHE_DB_FILE, max_entries=CACHE_MAX_ENTRIES,
+                               sweep_interval=CACHE_SWEEP_INTERVAL)
+cache_store.start_sweeper()
+
+# cache_result 메모리 캐시 (디스크는 메모리에 없을 때와 시작 시 적재에만 사용)
+MEMORY_CACHE_SIZE = 2048
+memory_cache = MemoryCache(maxsize=MEMORY_CACHE_SIZE)
+memory_cache.warm(cache_store.recent(MEMORY_CACHE_SIZE))
+# stale_seconds를 준 cache_result 항목의 백그라운드 갱신
+cache_refresher = BackgroundRefresher()
+# 스캔 점수 테이블 (입력이 바뀐 종목만 다시 점수 계산)
+score_store = SQLiteCacheStore(SCORE_DB_FILE, max_entries=SCORE_MAX_ENTRIES,
+                               sweep_interval=CACHE_SWEEP_INTERVAL)
+score_store.start_sweeper()
+score_table = ScoreTable(score_store)
+# evaluate_coin 점수 방식이 바뀌면 올려서 저장된 점수를 모두 다시 계산
+SCORE_VERSION = 1
+
+# 종목별 일봉 저장소 (bar_store/<TICKER>.npz, 새 봉만 이어 붙임)
+bar_store = BarStore()
 
 # 설정 로드 함수
 def load_trading_config():
@@ -276,13 +315,64 @@ if missing_keys:
         raise ValueError("One or more API keys are missing from .env file")
 
 # 한국투자증권 API 설정
-KIS_BASE_URL = "https://openapi.koreainvestment.com:9443"
-KIS_TOKEN_URL = "https://openapi.koreainvestment.com:9443/oauth2/tokenP"
+# (.env의 KIS_BASE_URL로 kis_stub_server.py 같은 로컬 대역 서버를 지정 가능)
+KIS_BASE_URL = os.getenv("KIS_BASE_URL", "https://openapi.koreainvestment.com:9443").rstrip('/')
+KIS_TOKEN_URL = f"{KIS_BASE_URL}/oauth2/tokenP"
 
 # 해외 주식 API 설정 (웹사이트 설정에서 로드)
-OVERSEAS_BASE_URL = "https://openapi.koreainvestment.com:9443"
+OVERSEAS_BASE_URL = KIS_BASE_URL
 OVERSEAS_MARKET_CODE = "NAS" if TARGET_MARKET == "NASDAQ" else "NYS"  # NASDAQ 또는 NYSE
 
+# 중소형 기술주/바이오 중심 스캔 후보 (KIS 종목 마스터로 상장 여부와 거래소를 확인해 사용)
+SCAN_CANDIDATES = [
+    # 중소형 기술주
+    "ROKU", "SNAP", "PINS", "DOCU", "FSLY", "FVRR", "UPWK", "TTD", "TTWO",
+    "EA", "ATVI", "MTCH", "GRUB", "BYND", "PTON", "WORK", "SLACK", "TWTR",
+    "ZM", "TEAM", "SNOW", "PLTR", "DDOG", "MDB", "OKTA", "ZS", "CRWD", "NET",
+    "SQ", "SHOP", "TWLO", "RNG", "SPOT", "UBER", "LYFT",
+
+    # 중소형 바이오/헬스케어
+    "GILD", "REGN", "VRTX", "BIIB", "AMGN", "ILMN", "DXCM", "ALGN", "IDXX", "ISRG",
+    "ABMD", "AGN", "TEVA", "HUM", "AET", "CNC", "MOH", "WCG", "ANTM", "CI",
+    "AFL", "BEN", "IVZ", "TROW", "LM", "AMG", "SEIC", "WDR", "JHG", "APAM",
+
+    # 중소형 기술주 추가
+    "INTU", "ADP", "PAYX", "WDAY", "VEEV", "HUBS", "ESTC", "SPLK", "DT", "FTNT",
+    "CHKP", "CYBR", "QLYS", "TENB", "RPD", "SMAR", "ASAN", "ORCL", "CSCO", "PYPL",
+    "INTC", "AMD", "QCOM", "AVGO", "TXN", "MU", "ADI", "MRVL", "KLAC", "LRCX",
+
+    # 중소형 바이오/헬스케어 추가
+    "ABBV", "BMY", "LLY", "NVO", "NVS", "AZN", "GSK", "SNY", "SAN",
+    "ROG", "NOVN", "BAYRY", "PFE", "MRK", "ABT", "JNJ", "TMO", "DHR", "UNH",
+
+    # 추가 중소형 기술주들
+    "CG", "KKR", "BX", "APO", "ARES", "OWL", "STEP", "PJT", "HLI", "LAZ",
+    "VIAC", "PARA", "LGF.A", "LGF.B", "NWSA", "NWS", "GCI", "MEG", "GTN", "SSP",
+    "FOXA", "CMCSA", "DIS", "NFLX"
+]
+
+# KIS 해외주식 종목 마스터 (kis_master/nasmst.cod 등)
+symbol_registry = SymbolRegistry()
+
+# KIS 초당 호출 시작 속도 (적응형 조절 상한은 Flask 서버와 같은 kis_quota.KIS_API_MAX_RATE)
+KIS_API_RATE = float(os.getenv("KIS_API_RATE", "10"))
+
+# 종목 스캔 병렬 작업 수
+SCAN_MAX_WORKERS = 10
+
+# KIS 호출 공용 연결 풀 (스캔 스레드 수 + 포지션 점검/주문용 여유분)
+kis_http = KISHttpPool(pool_maxsize=SCAN_MAX_WORKERS + 2)
+
+# 같은 (엔드포인트, 종목) 동시 조회를 하나의 KIS 요청으로 합치는 single-flight 계층
+kis_flight = SingleFlight()
+
+# 거래 사이클 마감 시간 (사이클 안의 모든 KIS 요청 타임아웃이 이 안으로 줄어듦)
+CYCLE_DEADLINE_SECONDS = 300
+# 포지션 점검(손절/익절) 단계 마감 시간
+POSITION_CHECK_DEADLINE_SECONDS = 30
+# 시세 조회 요청을 p95 지연 뒤 한 번 더 보내는 헤지 요청 사용 여부 (호출 한도를 추가로 소모)
+HEDGE_QUOTE_READS = os.getenv("KIS_HEDGE_QUOTE_READS", "False").lower() == "true"
+
 # 페이퍼 트레이딩 설정 (웹사이트 설정에서 로드)
 # PAPER_TRADING = True  # True: 페이퍼 트레이딩, False: 실제 거래
 # PAPER_TRADING_BALANCE = 1000000  # 페이퍼 트레이딩 초기 자금 (백만원)
@@ -370,55 +460,38 @@ def check_for_exit():
 
 class KISClient:
     def __init__(self):
-        self.access_token = None
-        self.token_expiry = 0
+        # 토큰은 Flask 서버와 같은 파일(kis_token.json)을 공유하며 만료 전에 백그라운드에서 갱신
+        self.token_store = get_token_store(KIS_APP_KEY, KIS_APP_SECRET, token_file=TOKEN_FILE,
+                                           token_url=KIS_TOKEN_URL, http=kis_http)
         self.load_or_refresh_token()
 
+    @property
+    def access_token(self):
+        return self.token_store.access_token
+
+    @property
+    def token_expiry(self):
+        return self.token_store.expires_at
+
     def load_or_refresh_token(self):
         try:
-            if os.path.exists(TOKEN_FILE):
-                with open(TOKEN_FILE, 'r', encoding='utf-8') as f:
-                    token_data = json.load(f)
-                    self.access_token = token_data.get("access_token")
-                    self.token_expiry = token_data.get("expires_at", 0)
-            
-            if time.time() > self.token_expiry - 300:  # 5분 여유
-                self.refresh_token()
+            self.token_store.get_token()
+            self.token_store.start_background_refresh()
         except Exception as e:
             logger.error(f"Token load failed: {e}")
-            self.refresh_token()
+            raise
 
     def refresh_token(self):
         try:
-            body = {
-                "grant_type": "client_credentials",
-                "appkey": KIS_APP_KEY,
-                "appsecret": KIS_APP_SECRET
-            }
-            response = requests.post(KIS_TOKEN_URL, json=body)
-            data = response.json()
-            if "access_token" in data:
-                self.access_token = data["access_token"]
-                self.token_expiry = time.time() + int(data.get("expires_in", 86400))
-                token_data = {
-                    "access_token": self.access_token,
-                    "expires_at": self.token_expiry
-                }
-                with open(TOKEN_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(token_data, f)
-                logger.info("Access token refreshed")
-            else:
-                raise Exception(f"Token refresh failed: {data}")
+            self.token_store.refresh(force=True)
         except Exception as e:
             logger.error(f"Token refresh failed: {e}")
             raise
 
     def get_headers(self):
-        if time.time() > self.token_expiry - 300:
-            self.refresh_token()
         return {
             "content-type": "application/json",
-            "authorization": f"Bearer {self.access_token}",
+            "authorization": f"Bearer {self.token_store.get_token()}",
             "appkey": KIS_APP_KEY,
             "appsecret": KIS_APP_SECRET
         }
@@ -432,75 +505,137 @@ logger.info("Telegram bot will be initialized on demand")
 
 # API 호출 제한 Rate limiting 설정
 class RateLimiter:
-    def __init__(self):
-        self.order_lock = threading.Lock()
-        self.api_lock = threading.Lock()
-        self.order_count = 0
-        self.api_count = 0
-        self.last_reset = time.time()
-        
-    def _reset_if_needed(self):
-        current_time = time.time()
-        if current_time - self.last_reset >= 1:
-            with self.order_lock:
-                self.order_count = 0
-            with self.api_lock:
-                self.api_count = 0
-            self.last_reset = current_time
-            
-    def can_make_order(self):
-        self._reset_if_needed()
-        with self.order_lock:
-            if self.order_count < 5:
-                self.order_count += 1
-                return True
-            return False
-            
-    def can_make_api_call(self, max_wait=10):
-        self._reset_if_needed()
-        start_time = time.time()
-        with self.api_lock:
-            while self.api_count >= 10:
-                if time.time() - start_time > max_wait:
-                    logger.warning("Max wait time exceeded for API call")
-                    return False
-                time.sleep(0.1)
-                self._reset_if_needed()
-            self.api_count += 1
+    """KIS 호출 한도 (초당 API 10건, 주문 5건) 토큰 버킷
+
+    대기는 락 밖에서 우선순위 차선(주문 > 위험 점검 > 잔고 > 스캔)과 도착 순서대로 하며,
+    차선은 priority_scope로 지정합니다. 대기 시간은 현재 사이클 마감 시간을 넘지 않습니다.
+    같은 앱키를 쓰는 Flask 서버와 한도를 나눠 쓰도록 토큰은 공용 파일(kis_quota.json)에서 관리합니다.
+    """
+    def __init__(self, api_rate=KIS_API_RATE, order_rate=5, api_max_rate=KIS_API_MAX_RATE):
+        api_shared = order_shared = None
+        if KIS_APP_KEY and KIS_APP_SECRET:
+            api_shared = shared_quota_for_app(KIS_APP_KEY, KIS_APP_SECRET, 'api', api_rate, label='bot',
+                                              max_rate=api_max_rate)
+            order_shared = shared_quota_for_app(KIS_APP_KEY, KIS_APP_SECRET, 'order', order_rate, label='bot')
+        self.api_bucket = TokenBucket(api_rate, name='api', shared=api_shared)
+        self.order_bucket = TokenBucket(order_rate, name='order', shared=order_shared)
+        # 초과(EGW00201) 응답이면 줄이고, 정상이면 api_max_rate까지 천천히 올림
+        self.api_controller = AdaptiveRateController(self.api_bucket, max_rate=api_max_rate)
+
+    def observe(self, url, response, elapsed):
+        """KIS 응답 콜백 (kis_http.add_response_listener)"""
+        self.api_controller.observe(url, response, elapsed)
+
+    @staticmethod
+    def _bounded_timeout(timeout):
+        deadline = current_deadline()
+        if deadline is None:
+            return timeout
+        remaining = max(deadline.remaining(), 0)
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def acquire_api(self, timeout=10, lane=None):
+        if self.api_bucket.acquire(timeout=self._bounded_timeout(timeout), lane=lane):
             return True
+        logger.warning("Max wait time exceeded for API call")
+        return False
+
+    def acquire_order(self, timeout=10):
+        """주문 한도와 함께 공용 API 예산에서도 가장 높은 차선으로 허가를 받음"""
+        timeout = self._bounded_timeout(timeout)
+        if self.order_bucket.acquire(timeout=timeout, lane=LANE_ORDER) and \
+                self.api_bucket.acquire(timeout=timeout, lane=LANE_ORDER):
+            return True
+        logger.warning("Max wait time exceeded for order")
+        return False
+
+    def get_stats(self):
+        return {
+            'api': self.api_bucket.get_stats(),
+            'order': self.order_bucket.get_stats(),
+            'adaptive': self.api_controller.get_stats()
+        }
 
 rate_limiter = RateLimiter()
+kis_http.add_response_listener(rate_limiter.observe)
+# 연결 풀의 재시도/헤지 요청도 API 한도에서 허가를 받음 (차선은 호출한 작업의 priority_scope)
+kis_http.set_permit_source(rate_limiter.api_bucket.acquire)
+
+def stop_at_deadline(retry_state):
+    """현재 사이클 마감 시간까지 재시도할 여유가 없으면 재시도 중단"""
+    deadline = current_deadline()
+    return deadline is not None and deadline.remaining() <= 1
 #함수 결과를 캐싱해 반복 호출을 줄이고, 실패 시 자동 재시도하는 효율적인 데코레이터
-def cache_result(expiry_seconds=3600):
+# version: 함수 결과 형식이 바뀌면 올려서 예전 캐시를 무시
+# stale_seconds: 만료 후 이 시간까지는 이전 값을 바로 돌려주고 백그라운드에서 갱신 (0이면 만료 즉시 다시 계산)
+def cache_result(expiry_seconds=3600, version=1, stale_seconds=0):
+    max_age = expiry_seconds + stale_seconds
+
     def decorator(func):
-        @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-        def wrapper(*args, **kwargs):
-            cache_key = f"{func.__name__}_{hashlib.md5(str(args).encode() + str(kwargs).encode()).hexdigest()}"
-            cache_file = os.path.join(CACHE_DIR, f"{cache_key}.json")
+        # 첫 매개변수가 self/cls인 메서드만 키에서 첫 인자를 뺌 (staticmethod는 그대로)
+        skip_self = takes_self(func)
+
+        def store(cache_key, result):
+            # None은 실패(호출 한도 대기 초과, API 오류 등)라 캐시하지 않고 다음 호출에서 다시 조회
+            if result is None:
+                logger.debug(f"Not caching empty result for {func.__name__}")
+                return
+            # 마감 시간이 지난 뒤 얻은 결과는 불완전할 수 있으므로 캐시하지 않음
+            deadline = current_deadline()
+            if deadline is not None and deadline.expired():
+                logger.warning(f"Deadline exceeded, not caching result for {func.__name__}")
+                return
             
+            now = time.time()
             try:
-                if os.path.exists(cache_file):
-                    with open(cache_file, 'r', encoding='utf-8') as f:
-                        cache_data = json.load(f)
-                        if time.time() - cache_data.get('timestamp', 0) < expiry_seconds:
-                            logger.info(f"Using cached result for {func.__name__}")
-                            return cache_data['result']
-            except Exception as e:
-                logger.error(f"Failed to read cache for {func.__name__}: {e}")
-            
-            result = func(*args, **kwargs)
-            
+                memory_cache.set(cache_key, result, now)
+            except (TypeError, ValueError) as e:
+                logger.error(f"Result of {func.__name__} is not cacheable: {e}")
+                return
             try:
-                cache_data = {
-                    'timestamp': time.time(),
-                    'result': result
-                }
-                with open(cache_file, 'w', encoding='utf-8') as f:
-                    json.dump(cache_data, f)
+                cache_store.set(cache_key, result, max_age, now)
                 logger.info(f"Cached result for {func.__name__}")
             except Exception as e:
                 logger.error(f"Failed to write cache for {func.__name__}: {e}")
+
+        def refresh(cache_key, args, kwargs):
+            # 백그라운드 갱신은 사이클 마감 시간과 무관하며, 스캔 차선으로 호출해 위험 점검을 막지 않음
+            with priority_scope(LANE_SCAN):
+                store(cache_key, func(*args, **kwargs))
+
+        # 차단기가 열려 있으면 재시도해도 바로 실패하므로 CircuitOpenError는 재시도 없이 호출부로 전달
+        @retry(stop=stop_after_attempt(3) | stop_at_deadline, wait=wait_exponential(multiplier=1, min=1, max=4),
+               retry=retry_if_not_exception_type(CircuitOpenError))
+        def wrapper(*args, **kwargs):
+            # 메서드는 self를 빼고 인자를 정규화해 TradingBot을 다시 만들거나 재시작해도 같은 키 사용
+            try:
+                cache_key = make_cache_key(func, args, kwargs, version=version, skip_self=skip_self)
+            except UncacheableArgument as e:
+                logger.warning(f"Not caching {func.__name__}: {e}")
+                return func(*args, **kwargs)
+            
+            cached = memory_cache.get(cache_key, max_age)
+            if cached is MISS:
+                try:
+                    cached = cache_store.get(cache_key, max_age)
+                    if cached is not MISS:
+                        memory_cache.set(cache_key, cached[1], cached[0])
+                except Exception as e:
+                    logger.error(f"Failed to read cache for {func.__name__}: {e}")
+                    cached = MISS
+            
+            if cached is not MISS:
+                timestamp, result = cached
+                if time.time() - timestamp < expiry_seconds:
+                    logger.debug(f"Using cached result for {func.__name__}")
+                    return result
+                # 만료됐지만 stale_seconds 안이면 기다리지 않고 이전 값 사용
+                if cache_refresher.submit(cache_key, lambda: refresh(cache_key, args, kwargs)):
+                    logger.info(f"Serving stale result for {func.__name__}, refreshing in background")
+                return result
             
+            result = func(*args, **kwargs)
+            store(cache_key, result)
             return result
         return wrapper
     return decorator
@@ -508,13 +643,11 @@ def cache_result(expiry_seconds=3600):
 class TradingError(Exception):
     pass
 #API 요청 시 캐싱, 재시도, 속도 제한을 모두 고려해 안정적이고 효율적인 외부 데이터 요청
-@cache_result(expiry_seconds=7200)
+# 하루 단위로 바뀌는 지수라 만료 후 2시간까지는 이전 값을 쓰며 백그라운드에서 갱신
+@cache_result(expiry_seconds=7200, stale_seconds=7200)
 def get_fear_and_greed():
-    if not rate_limiter.can_make_api_call():
-        time.sleep(0.1)
-        return get_fear_and_greed()
     try:
-        response = requests.get("https://api.alternative.me/fng/")
+        response = requests.get("https://api.alternative.me/fng/", timeout=(3.05, 10))
         data = response.json()
         logger.info("Fetched Fear and Greed index")
         return int(data['data'][0]['value'])
@@ -522,6 +655,11 @@ def get_fear_and_greed():
         logger.error(f"Fear and Greed index fetch failed: {e}")
         return 50
 
+def get_cycle_fear_and_greed():
+    """매매 사이클 안에서는 종목마다 다시 조회하지 않고 한 번 읽은 값 사용"""
+    cycle = current_cycle()
+    return get_fear_and_greed() if cycle is None else cycle.market('fear_greed', get_fear_and_greed)
+
 @cache_result(expiry_seconds=300)
 def get_current_price(ticker):
     if PAPER_TRADING:
@@ -541,22 +679,32 @@ def get_current_price(ticker):
         # ±5% 랜덤 변동
         price_change = random.uniform(-0.05, 0.05)
         return base_price * (1 + price_change)
-        
-    if not rate_limiter.can_make_api_call():
-        time.sleep(0.1)
-        return get_current_price(ticker)
+
+    # 같은 종목을 동시에 조회하면 진행 중인 요청 결과를 공유
+    # (위험 점검이 스캔 차선 요청 뒤에서 기다리지 않도록 차선별로 합침)
+    return kis_flight.do(("quotations/price", OVERSEAS_MARKET_CODE, ticker, current_lane()),
+                         _fetch_current_price, ticker)
+
+def _fetch_current_price(ticker):
+    # 위험 점검은 10초 제한 없이 사이클 마감 시간까지 대기
+    if not rate_limiter.acquire_api(timeout=None if current_lane() == LANE_RISK else 10):
+        return None
     try:
         url = f"{OVERSEAS_BASE_URL}/uapi/overseas-price/v1/quotations/price"
         params = {
             "fid_cond_mrkt_div_code": OVERSEAS_MARKET_CODE,
             "fid_input_iscd": ticker
         }
-        response = requests.get(url, headers=kis_client.get_headers(), params=params)
+        response = kis_http.get(url, headers=kis_client.get_headers(), params=params,
+                                retries=1, hedge=HEDGE_QUOTE_READS)
         data = response.json()
         if data.get("rt_cd") == "0":
             return float(data["output"]["last"])
         logger.error(f"Failed to fetch price for {ticker}: {data}")
         return None
+    except CircuitOpenError:
+        # 차단기 빠른 실패는 None으로 바꾸지 않고 그대로 올려 호출부가 건너뛰도록 함
+        raise
     except Exception as e:
         logger.error(f"Price fetch failed for {ticker}: {e}")
         return None
@@ -647,9 +795,6 @@ class TradingHistory:
         send_telegram_message(message)
     #주어진 종목에 대해 총 투자금, 회수금, 현재 가치 및 수익률을 종합적으로 계산해주는 투자 성과 평가 함수
     def calculate_performance(self, ticker):
-        if not rate_limiter.can_make_api_call():
-            time.sleep(0.1)
-            return self.calculate_performance(ticker)
         try:
             trades = [t for t in self.history["trades"] if t["ticker"] == ticker]
             if not trades:
@@ -735,17 +880,23 @@ class MarketAnalyzer:
     
     def prepare_data(self, df):
         # 간단한 데이터 준비 (LSTM 대신)
-        data = df[['close']].values  # 종가만 사용
+        data = df.close.reshape(-1, 1)  # 종가만 사용
         X = []
         for i in range(30, len(data)):
             X.append(data[i-30:i])
         return np.array(X)
+
+    def ticker_memo(self, ticker, name, compute):
+        """매매 사이클 안이면 종목별로 한 번만 계산하고 재사용"""
+        cycle = current_cycle()
+        return compute() if cycle is None else cycle.ticker(ticker).memo(name, compute)
+
+    def get_prediction(self, ticker):
+        """사이클 안에서 공유되는 predict_next_price 결과"""
+        return self.ticker_memo(ticker, 'prediction', lambda: self.predict_next_price(ticker))
 # LSTM 모델을 활용해 특정 종목(ticker)의 다음 날 종가를 예측
     @cache_result(expiry_seconds=7200)
     def predict_next_price(self, ticker):
-        if not rate_limiter.can_make_api_call():
-            time.sleep(0.1)
-            return self.predict_next_price(ticker)
         try:
             df = self.get_ohlcv(ticker, count=60)
             if df is None or len(df) < 30:
@@ -760,7 +911,7 @@ class MarketAnalyzer:
             # 가격 예측을 위한 간단한 방법 사용 (LSTM 대신)
             if len(df) >= 5:
                 # 최근 5일 평균 가격 변화율로 다음 가격 예측
-                recent_prices = df['close'].tail(5).values
+                recent_prices = df.close[-5:]
                 price_changes = [(recent_prices[i] - recent_prices[i-1]) / recent_prices[i-1] for i in range(1, len(recent_prices))]
                 avg_change = sum(price_changes) / len(price_changes)
                 predicted_price = recent_prices[-1] * (1 + avg_change)
@@ -788,7 +939,7 @@ class MarketAnalyzer:
             logger.info(f"API Params: {params}")
             logger.info(f"Headers: {kis_client.get_headers()}")
             
-            response = requests.get(url, headers=kis_client.get_headers(), params=params)
+            response = kis_http.get(url, headers=kis_client.get_headers(), params=params)
             
             logger.info(f"API Response Status: {response.status_code}")
             logger.info(f"API Response Headers: {dict(response.headers)}")
@@ -850,7 +1001,7 @@ class MarketAnalyzer:
                     "fid_org_adj_prc": "1"
                 }
                 
-                response = requests.get(url, headers=kis_client.get_headers(), params=params)
+                response = kis_http.get(url, headers=kis_client.get_headers(), params=params)
                 
                 logger.info(f"{period_name} Response Status: {response.status_code}")
                 
@@ -894,20 +1045,19 @@ class MarketAnalyzer:
                 return False
             
             # 전일 대비 오늘 가격 변화율
-            yesterday_close = df['close'].iloc[-2]
-            today_close = df['close'].iloc[-1]
+            yesterday_close = df.close[-2]
+            today_close = df.close[-1]
             price_change = (today_close - yesterday_close) / yesterday_close * 100
             
             # 전일 대비 오늘 거래량 변화율
-            yesterday_volume = df['volume'].iloc[-2]
-            today_volume = df['volume'].iloc[-1]
+            yesterday_volume = df.volume[-2]
+            today_volume = df.volume[-1]
             volume_change = (today_volume - yesterday_volume) / yesterday_volume * 100
             
             # 5일 이동평균선 계산 (최근 5일 데이터)
             df_5days = self.get_ohlcv(ticker, count=5)
             if df_5days is not None and len(df_5days) >= 5:
-                df_5days['5ma'] = df_5days['close'].rolling(window=5).mean()
-                last_5ma = df_5days['5ma'].iloc[-1]
+                last_5ma = df_5days.close[-5:].mean()
                 
                 # 매수 조건:
                 # 1. 전일 대비 가격이 5% 이상 상승 (급등 조건)
@@ -940,11 +1090,19 @@ class MarketAnalyzer:
         """전일 거래량 조회 (해외 주식 일봉 데이터 활용)"""
         df = self.get_ohlcv(ticker, count=2)
         if df is not None and len(df) >= 2:
-            return df['volume'].iloc[-2]
+            return df.volume[-2]
         return None
 
     def get_ohlcv(self, ticker, count=10):
-        """해외 주식 일봉 데이터 조회"""
+        """해외 주식 일봉 데이터 조회 (OHLCVBars 반환, DataFrame이 필요하면 to_dataframe())"""
+        # 매매 사이클 안이면 종목별로 한 번 읽은 긴 구간에서 잘라 씀
+        cycle = current_cycle()
+        if cycle is not None and count <= cycle.max_bars:
+            return cycle.ticker(ticker).bars(count)
+        return self.fetch_ohlcv(ticker, count)
+
+    def fetch_ohlcv(self, ticker, count=10):
+        """사이클 컨텍스트 없이 일봉 조회"""
         if PAPER_TRADING:
             # 페이퍼 트레이딩에서는 더미 데이터 사용
             import random
@@ -962,83 +1120,65 @@ class MarketAnalyzer:
                     'close': base_price,
                     'volume': volume
                 })
-            df = pd.DataFrame(data)
-            df['date'] = dates
-            return df
-            
-        if not rate_limiter.can_make_api_call():
-            time.sleep(0.1)
-            return self.get_ohlcv(ticker, count)
+            return OHLCVBars(
+                open=[row['open'] for row in data],
+                high=[row['high'] for row in data],
+                low=[row['low'] for row in data],
+                close=[row['close'] for row in data],
+                volume=[row['volume'] for row in data],
+                dates=dates.values
+            )
+
         try:
-            url = f"{OVERSEAS_BASE_URL}/uapi/overseas-price/v1/quotations/dailyprice"
-            params = {
-                "fid_cond_mrkt_div_code": OVERSEAS_MARKET_CODE,
-                "fid_input_iscd": ticker,
-                "fid_period_div_code": "D",
-                "fid_org_adj_prc": "1"
-            }
-            response = requests.get(url, headers=kis_client.get_headers(), params=params)
-            data = response.json()
-            if data.get("rt_cd") != "0":
-                logger.error(f"Failed to fetch OHLCV for {ticker}: {data}")
+            # 마지막 조회 뒤 장이 마감되지 않았으면 저장된 일봉에서 잘라 씀 (종목당 하루 한 번 조회)
+            if not bar_store.needs_refresh(ticker):
+                return bar_store.read(ticker, count)
+            # 일봉 요청 파라미터는 count와 무관하므로 종목 단위로 동시 조회와 디코딩을 합침
+            bars = kis_flight.do(("quotations/dailyprice", OVERSEAS_MARKET_CODE, ticker),
+                                 self._fetch_daily_bars, ticker)
+            if bars is None:
                 return None
-            df = pd.DataFrame(data["output"])
-            df = df.rename(columns={
-                "ovrs_oprc": "open",
-                "ovrs_hgpr": "high",
-                "ovrs_lwpr": "low", 
-                "ovrs_clpr": "close",
-                "acml_vol": "volume"
-            })
-            df = df.astype({"open": float, "high": float, "low": float, "close": float, "volume": float})
-            return df.tail(count)
+            return bars.tail(count)
         except Exception as e:
             logger.error(f"OHLCV fetch failed for {ticker}: {e}")
             return None
 
+    def _fetch_daily_bars(self, ticker):
+        """일봉 응답을 DataFrame 없이 컬럼 배열(OHLCVBars)로 바로 변환해 저장된 일봉 뒤에 이어 붙임"""
+        data = self._fetch_daily_price(ticker)
+        if data.get("rt_cd") != "0":
+            logger.error(f"Failed to fetch OHLCV for {ticker}: {data}")
+            return None
+        return bar_store.merge(ticker, OHLCVBars.from_kis_output(data["output"]))
+
+    def _fetch_daily_price(self, ticker):
+        """해외 주식 일봉 원본 응답 조회"""
+        if not rate_limiter.acquire_api():
+            raise TradingError(f"Rate limit wait timed out for {ticker} daily price")
+        url = f"{OVERSEAS_BASE_URL}/uapi/overseas-price/v1/quotations/dailyprice"
+        params = {
+            "fid_cond_mrkt_div_code": OVERSEAS_MARKET_CODE,
+            "fid_input_iscd": ticker,
+            "fid_period_div_code": "D",
+            "fid_org_adj_prc": "1"
+        }
+        response = kis_http.get(url, headers=kis_client.get_headers(), params=params,
+                                retries=1, hedge=HEDGE_QUOTE_READS)
+        return response.json()
+
     def get_all_nasdaq_stocks_from_kis(self):
-        """KIS API에서 나스닥 전체 종목 리스트 받아오기"""
+        """스캔 후보 종목을 KIS 종목 마스터로 확인해 반환 (중복 제거, 대상 거래소 상장 종목만)"""
         try:
-            # KIS API에서 나스닥 전체 종목 마스터 조회
-            # 실제 KIS API 문서를 참고하여 구현해야 합니다.
-            # 예시: 종목 마스터 조회 API 등
-            
-            # 임시로 더 많은 종목들을 포함 (실제로는 API에서 받아와야 함)
-            # 실제 구현 시에는 KIS API의 나스닥 전체 종목 조회 엔드포인트 사용 필요
-            
-            logger.warning("Using extended stock list - replace with actual KIS API call for full NASDAQ stocks")
-            
-            # 중소형 기술주/바이오 중심 종목 리스트 (성장주/가치주 제외)
-            extended_stocks = [
-                # 중소형 기술주
-                "ROKU", "SNAP", "PINS", "DOCU", "FSLY", "FVRR", "UPWK", "TTD", "TTWO",
-                "EA", "ATVI", "MTCH", "GRUB", "BYND", "PTON", "WORK", "SLACK", "TWTR",
-                "ZM", "TEAM", "SNOW", "PLTR", "DDOG", "MDB", "OKTA", "ZS", "CRWD", "NET",
-                "SQ", "SHOP", "TWLO", "RNG", "SPOT", "UBER", "LYFT", "ZM", "TEAM", "WORK",
-                
-                # 중소형 바이오/헬스케어
-                "GILD", "REGN", "VRTX", "BIIB", "AMGN", "ILMN", "DXCM", "ALGN", "IDXX", "ISRG",
-                "ABMD", "AGN", "TEVA", "HUM", "AET", "CNC", "MOH", "WCG", "ANTM", "CI",
-                "AFL", "BEN", "IVZ", "TROW", "LM", "AMG", "SEIC", "WDR", "JHG", "APAM",
-                
-                # 중소형 기술주 추가
-                "INTU", "ADP", "PAYX", "WDAY", "VEEV", "HUBS", "ESTC", "SPLK", "DT", "FTNT",
-                "CHKP", "CYBR", "QLYS", "TENB", "RPD", "SMAR", "ASAN", "ORCL", "CSCO", "PYPL",
-                "INTC", "AMD", "QCOM", "AVGO", "TXN", "MU", "ADI", "MRVL", "KLAC", "LRCX",
-                
-                # 중소형 바이오/헬스케어 추가
-                "ABBV", "BMY", "LLY", "NVO", "NVS", "AZN", "GSK", "SNY", "SAN", "NVS",
-                "ROG", "NOVN", "BAYRY", "BAYRY", "PFE", "MRK", "ABT", "JNJ", "TMO", "DHR",
-                "UNH", "ANTM", "CI", "HUM", "AET", "CNC", "MOH", "WCG", "AGN", "TEVA",
-                
-                # 추가 중소형 기술주들
-                "CG", "KKR", "BX", "APO", "ARES", "OWL", "STEP", "PJT", "HLI", "LAZ",
-                "VIAC", "PARA", "LGF.A", "LGF.B", "NWSA", "NWS", "GCI", "MEG", "GTN", "SSP",
-                "FOXA", "CMCSA", "DIS", "NFLX", "SPOT", "ROKU", "SNAP", "PINS", "TWTR", "SLACK"
-            ]
+            # 마스터 파일이 바뀌었으면 바뀐 거래소만 다시 읽음
+            symbol_registry.refresh()
+            stocks = symbol_registry.resolve(SCAN_CANDIDATES, exchange=OVERSEAS_MARKET_CODE)
+            if not symbol_registry.loaded:
+                logger.warning(f"KIS symbol master not found in {symbol_registry.directory}, "
+                               f"using candidate list without listing check")
             
-            logger.info(f"Loaded {len(extended_stocks)} mid/small-cap tech/bio NASDAQ stocks for volume analysis")
-            return extended_stocks
+            logger.info(f"Loaded {len(stocks)} mid/small-cap tech/bio {OVERSEAS_MARKET_CODE} stocks "
+                        f"({len(SCAN_CANDIDATES) - len(stocks)} duplicate or unlisted candidates skipped)")
+            return stocks
             
         except Exception as e:
             logger.error(f"Failed to get NASDAQ stocks from KIS: {e}")
@@ -1051,39 +1191,23 @@ class MarketAnalyzer:
             # 나스닥 전체 종목 리스트 받아오기 (실제로는 API에서 받아와야 함)
             all_stocks = self.get_all_nasdaq_stocks_from_kis()
             
-            volume_increase_stocks = []
-            
             logger.info(f"Checking volume increase for {len(all_stocks)} NASDAQ stocks...")
             
-            for ticker in all_stocks:
-                try:
-                    # 최근 2일간 거래량 데이터 조회
-                    df = self.get_ohlcv(ticker, count=2)
-                    if df is None or len(df) < 2:
-                        continue
-                    
-                    yesterday_volume = df['volume'].iloc[-2]  # 전일 거래량
-                    today_volume = df['volume'].iloc[-1]      # 오늘 거래량
-                    
-                    if yesterday_volume > 0:  # 0으로 나누기 방지
-                        volume_increase = ((today_volume - yesterday_volume) / yesterday_volume) * 100
-                        
-                        # 거래량이 50% 이상 증가한 종목만 추가
-                        if volume_increase >= 50:
-                            volume_increase_stocks.append({
-                                'ticker': ticker,
-                                'volume_increase': volume_increase,
-                                'yesterday_volume': yesterday_volume,
-                                'today_volume': today_volume
-                            })
-                            logger.info(f"Volume increase detected: {ticker} (+{volume_increase:.1f}%)")
-                
-                except Exception as e:
-                    logger.error(f"Error checking volume for {ticker}: {e}")
-                    continue
-            
-            # 거래량 증가율 순으로 정렬 (높은 순)
-            volume_increase_stocks.sort(key=lambda x: x['volume_increase'], reverse=True)
+            # 일봉은 스캔 차선에서 병렬로 모은 뒤 (종목 × 일 × 필드) 패널 하나로 한 번에 계산
+            with priority_scope(LANE_SCAN), ThreadPoolExecutor(max_workers=SCAN_MAX_WORKERS) as executor:
+                futures = [submit_with_context(executor, self.get_ohlcv, ticker, 2) for ticker in all_stocks]
+                bars_list = []
+                for ticker, future in zip(all_stocks, futures):
+                    try:
+                        bars_list.append(future.result())
+                    except Exception as e:
+                        logger.error(f"Error checking volume for {ticker}: {e}")
+                        bars_list.append(None)
+            
+            panel, _ = build_panel(bars_list, days=2)
+            volume_increase_stocks = screen_volume_increase(all_stocks, panel, min_increase=50)
+            for stock in volume_increase_stocks:
+                logger.info(f"Volume increase detected: {stock['ticker']} (+{stock['volume_increase']:.1f}%)")
             
             logger.info(f"Found {len(volume_increase_stocks)} stocks with 50%+ volume increase out of {len(all_stocks)} total NASDAQ stocks")
             return volume_increase_stocks
@@ -1097,37 +1221,7 @@ class MarketAnalyzer:
         volume_stocks = self.get_volume_increase_stocks()
         return [stock['ticker'] for stock in volume_stocks]
 #기법
-    def add_technical_indicators(self, df):
-        try:
-            df = df.copy()
-            min_length = 26
-            if len(df) < min_length:
-                logger.warning(f"Data length {len(df)} is less than required {min_length}")
-                return df
-            
-            indicator_bb = ta.volatility.BollingerBands(close=df['close'])
-            df['bb_bbm'] = indicator_bb.bollinger_mavg()
-            df['bb_bbh'] = indicator_bb.bollinger_hband()
-            df['bb_bbl'] = indicator_bb.bollinger_lband()
-            df['rsi'] = ta.momentum.RSIIndicator(close=df['close']).rsi()
-            macd = ta.trend.MACD(close=df['close'])
-            df['macd'] = macd.macd()
-            df['macd_signal'] = macd.macd_signal()
-            df['macd_diff'] = macd.macd_diff()
-            df['ema_9'] = ta.trend.EMAIndicator(close=df['close'], window=9).ema_indicator()
-            df['adx'] = ta.trend.ADXIndicator(high=df['high'], 
-                                            low=df['low'], 
-                                            close=df['close']).adx()
-            df['volume_sma'] = df['volume'].rolling(window=20).mean()
-            return df
-        except Exception as e:
-            logger.error(f"Failed to add technical indicators: {e}")
-            return df
-
     def analyze_order_book(self, ticker):
-        if not rate_limiter.can_make_api_call():
-            time.sleep(0.1)
-            return self.analyze_order_book(ticker)
         try:
             # 해외 주식은 호가 데이터가 제한적이므로 현재가 기준으로 분석
             current_price = get_current_price(ticker)
@@ -1191,11 +1285,8 @@ class MarketAnalyzer:
             logger.error(f"AI 투자 금액 계산 실패: {e}")
             return 0.05  # 기본 5% 반환
 
-    @cache_result(expiry_seconds=7200)
+    @cache_result(expiry_seconds=7200, stale_seconds=3600)
     def analyze_market_trend(self):
-        if not rate_limiter.can_make_api_call():
-            time.sleep(0.1)
-            return self.analyze_market_trend()
         try:
             top_stocks = ["AAPL", "MSFT", "GOOGL"]  # Apple, Microsoft, Google
             trend_data = {}
@@ -1203,8 +1294,8 @@ class MarketAnalyzer:
                 df = self.get_ohlcv(stock, count=7)
                 if df is not None and not df.empty:
                     trend_data[stock] = {
-                        "price_change": ((df['close'].iloc[-1] - df['close'].iloc[0]) / df['close'].iloc[0] * 100),
-                        "volume_change": ((df['volume'].iloc[-1] - df['volume'].iloc[0]) / df['volume'].iloc[0] * 100)
+                        "price_change": ((df.close[-1] - df.close[0]) / df.close[0] * 100),
+                        "volume_change": ((df.volume[-1] - df.volume[0]) / df.volume[0] * 100)
                     }
             logger.info("Market trend analyzed")
             return trend_data
@@ -1214,12 +1305,9 @@ class MarketAnalyzer:
 
 
     @cache_result(expiry_seconds=7200)
-    @retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=2, min=4, max=60))
+    @retry(stop=stop_after_attempt(5) | stop_at_deadline, wait=wait_exponential(multiplier=2, min=4, max=60))
     def scan_for_opportunities(self):
         """AI 기반 매매 기회 스캔 - 소형/중형 기술주, 바이오주 120개 종목 대상"""
-        if not rate_limiter.can_make_api_call():
-            time.sleep(0.1)
-            return self.scan_for_opportunities()
         try:
             # 소형/중형 기술주, 바이오주 120개 종목 리스트
             target_stocks = self.get_all_nasdaq_stocks_from_kis()
@@ -1228,42 +1316,109 @@ class MarketAnalyzer:
             
             opportunities = {'tickers': {}}
             
-            # 병렬 처리로 AI 분석 수행
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                results = list(executor.map(lambda ticker: (ticker, self.evaluate_coin(ticker)), target_stocks))
-                for ticker, analysis in results:
-                    if analysis and analysis.get('score', 0) >= 50:  # AI 점수 50 이상인 종목만 (매수 추천 기준)
-                        opportunities['tickers'][ticker] = analysis
-                        logger.info(f"AI recommends {ticker}: score={analysis.get('score')}, reason={analysis.get('reason', 'Technical analysis')}")
+            # 1단계 (I/O, 스레드): 입력이 같은 종목은 저장된 점수 사용, 나머지는 일봉과 예측가 로드
+            with ThreadPoolExecutor(max_workers=SCAN_MAX_WORKERS) as executor:
+                # 작업 스레드에도 현재 사이클 마감 시간이 전달되도록 컨텍스트를 복사해 실행
+                futures = [submit_with_context(executor, self.prepare_scoring, ticker) for ticker in target_stocks]
+                prepared = []
+                for ticker, future in zip(target_stocks, futures):
+                    # 한 종목이 실패해도 스캔 전체가 빈 결과로 끝나지 않도록 종목별로 처리
+                    try:
+                        prepared.append((ticker, future.result()))
+                    except Exception as e:
+                        logger.error(f"Stock evaluation failed for {ticker}: {e}")
+            
+            # 2단계 (CPU, 프로세스 풀): 다시 계산할 종목의 지표를 공유 메모리 패널로 넘겨 병렬 계산
+            pending = [(ticker, job) for ticker, job in prepared if not job['reused']]
+            summaries = indicator_pool.summarize([job['bars'] for _, job in pending])
+            
+            # 3단계: 지표 요약으로 점수 계산 후 점수 테이블에 기록
+            results = {ticker: job['analysis'] for ticker, job in prepared if job['reused']}
+            for (ticker, job), summary in zip(pending, summaries):
+                analysis = self.score_from_indicators(ticker, summary, job['predicted_price'])
+                self.record_score(ticker, job['inputs'], analysis)
+                results[ticker] = analysis
+            
+            for ticker in target_stocks:
+                analysis = results.get(ticker)
+                if analysis and analysis.get('score', 0) >= 50:  # AI 점수 50 이상인 종목만 (매수 추천 기준)
+                    opportunities['tickers'][ticker] = analysis
+                    logger.info(f"AI recommends {ticker}: score={analysis.get('score')}, reason={analysis.get('reason', 'Technical analysis')}")
             
             logger.info(f"AI found {len(opportunities['tickers'])} buy opportunities out of {len(target_stocks)} stocks")
+            logger.info(f"Score table: {score_table.get_stats()}")
             return opportunities
             
         except Exception as e:
             logger.error(f"Market scan failed: {e}")
             return {}
 
-    @cache_result(expiry_seconds=7200)
+    def scoring_inputs(self, ticker):
+        """evaluate_coin 결과를 바꾸는 입력 (마지막 일봉, 공포/탐욕 지수) - 날짜가 없으면 None"""
+        bars = self.get_ohlcv(ticker, count=1)
+        if bars is None or bars.empty or bars.dates is None:
+            return None
+        return {
+            'version': SCORE_VERSION,
+            'bar_date': str(bars.dates[-1]),
+            'close': float(bars.close[-1]),
+            'volume': float(bars.volume[-1]),
+            'fear_greed': get_cycle_fear_and_greed()
+        }
+
+    def prepare_scoring(self, ticker):
+        """스캔 I/O 단계: 입력이 지난번과 같으면 저장된 점수, 아니면 지표 계산에 넘길 일봉과 예측가"""
+        inputs = self.scoring_inputs(ticker)
+        if inputs is not None:
+            reusable, analysis = score_table.lookup(ticker, inputs)
+            if reusable:
+                return {'reused': True, 'analysis': analysis}
+        
+        job = {'reused': False, 'inputs': inputs, 'bars': None, 'predicted_price': None}
+        bars = self.get_ohlcv(ticker, count=30)
+        if bars is not None and len(bars) >= MIN_INDICATOR_BARS:
+            job['bars'] = bars
+            job['predicted_price'] = self.get_prediction(ticker)
+        return job
+
+    def record_score(self, ticker, inputs, analysis):
+        """입력 버전과 함께 점수 저장 (입력을 알 수 없거나 마감 시간이 지난 결과는 저장하지 않음)"""
+        # None은 계산 실패(일시적 API 오류 등)와 구분할 수 없고, 예측가가 없으면 LSTM 실패로 점수가 덜 계산된 것이라
+        # 최대 7일 동안 재사용되지 않도록 저장하지 않고 다음 사이클에 다시 계산
+        if inputs is None or analysis is None or analysis.get('predicted_price') is None:
+            return
+        deadline = current_deadline()
+        if deadline is None or not deadline.expired():
+            score_table.record(ticker, inputs, analysis)
+
     def evaluate_coin(self, ticker):
         """AI 기반 종목 분석 - 기술적 지표 + LSTM 예측 + 시장 상황 종합 분석"""
-        if not rate_limiter.can_make_api_call():
-            time.sleep(0.1)
-            return self.evaluate_coin(ticker)
         try:
-            df = self.get_ohlcv(ticker, count=30)
-            if df is None or df.empty or len(df) < 14:
+            bars = self.get_ohlcv(ticker, count=30)
+            if bars is None or bars.empty or len(bars) < 14:
                 return None
                 
-            df = self.add_technical_indicators(df)
-            if len(df) < 26:
+            # 사이클 안에서는 종목별로 한 번만 계산
+            summary = self.ticker_memo(ticker, 'indicators:30', lambda: summarize_bars(bars))
+            if summary is None:
                 return None
+            return self.score_from_indicators(ticker, summary, self.get_prediction(ticker))
             
+        except Exception as e:
+            logger.error(f"Stock evaluation failed for {ticker}: {e}")
+            return None
+
+    def score_from_indicators(self, ticker, summary, predicted_price):
+        """지표 요약(indicators.indicator_summary), 예측가, 시장 지표로 점수 계산"""
+        if summary is None:
+            return None
+        try:
             # 1. 기술적 지표 분석 (40점 만점)
             technical_score = 0
             reasons = []
             
             # RSI 분석 (과매도 구간)
-            last_rsi = df['rsi'].iloc[-1]
+            last_rsi = summary['rsi']
             if last_rsi < 30:
                 technical_score += 15
                 reasons.append("RSI 과매도")
@@ -1272,25 +1427,24 @@ class MarketAnalyzer:
                 reasons.append("RSI 낮음")
             
             # MACD 골든크로스
-            if df['macd_diff'].iloc[-2] < 0 and df['macd_diff'].iloc[-1] > 0:
+            if summary['macd_diff_prev'] < 0 and summary['macd_diff'] > 0:
                 technical_score += 12
                 reasons.append("MACD 골든크로스")
             
             # 볼린저 밴드 하단 터치
-            if df['close'].iloc[-1] < df['bb_bbl'].iloc[-1]:
+            if summary['close'] < summary['bb_bbl']:
                 technical_score += 10
                 reasons.append("볼린저 밴드 하단")
             
             # 거래량 급증
-            volume_ratio = df['volume'].iloc[-1] / df['volume_sma'].iloc[-1]
+            volume_ratio = np.float64(summary['volume']) / summary['volume_sma']
             if volume_ratio > 1.5:
                 technical_score += 8
                 reasons.append(f"거래량 {volume_ratio:.1f}배 증가")
             
             # 2. LSTM 예측 분석 (30점 만점)
             prediction_score = 0
-            predicted_price = self.predict_next_price(ticker)
-            current_price = df['close'].iloc[-1]
+            current_price = summary['close']
             
             if predicted_price and current_price:
                 price_change_pct = ((predicted_price - current_price) / current_price) * 100
@@ -1306,7 +1460,7 @@ class MarketAnalyzer:
             
             # 3. 시장 상황 분석 (30점 만점)
             market_score = 0
-            fear_greed = get_fear_and_greed()
+            fear_greed = get_cycle_fear_and_greed()
             
             if fear_greed:
                 if fear_greed < 30:  # 공포 구간 - 매수 기회
@@ -1320,7 +1474,7 @@ class MarketAnalyzer:
                     reasons.append("시장 탐욕 구간")
             
             # 4. 가격 모멘텀 분석
-            price_momentum = ((df['close'].iloc[-1] - df['close'].iloc[-5]) / df['close'].iloc[-5]) * 100
+            price_momentum = ((summary['close'] - summary['close_5']) / summary['close_5']) * 100
             if price_momentum > 0:
                 market_score += 10
                 reasons.append(f"가격 상승 모멘텀 +{price_momentum:.1f}%")
@@ -1368,16 +1522,15 @@ class TradingBot:
         if PAPER_TRADING:
             return paper_trading.get_balance()
             
-        if not rate_limiter.can_make_api_call():
-            time.sleep(0.1)
-            return self.get_balance()
+        if not rate_limiter.acquire_api():
+            return None
         try:
             url = f"{OVERSEAS_BASE_URL}/uapi/overseas-stock/v1/trading/inquire-balance"
             params = {
                 "cano": KIS_ACCOUNT_NUMBER,
                 "acnt_prdt_cd": "01"
             }
-            response = requests.get(url, headers=kis_client.get_headers(), params=params)
+            response = kis_http.get(url, headers=kis_client.get_headers(), params=params, retries=1)
             data = response.json()
             if data.get("rt_cd") == "0":
                 return float(data["output1"][0]["dnca_tot_amt"])
@@ -1392,16 +1545,15 @@ class TradingBot:
         if PAPER_TRADING:
             return paper_trading.get_stock_balance(ticker)
             
-        if not rate_limiter.can_make_api_call():
-            time.sleep(0.1)
-            return self.get_stock_balance(ticker)
+        if not rate_limiter.acquire_api():
+            return None
         try:
             url = f"{OVERSEAS_BASE_URL}/uapi/overseas-stock/v1/trading/inquire-balance"
             params = {
                 "cano": KIS_ACCOUNT_NUMBER,
                 "acnt_prdt_cd": "01"
             }
-            response = requests.get(url, headers=kis_client.get_headers(), params=params)
+            response = kis_http.get(url, headers=kis_client.get_headers(), params=params, retries=1)
             data = response.json()
             if data.get("rt_cd") == "0":
                 for stock in data["output2"]:
@@ -1413,6 +1565,50 @@ class TradingBot:
         except Exception as e:
             logger.error(f"Stock balance fetch failed for {ticker}: {e}")
             return None
+
+    def get_connection_stats(self):
+        """KIS 연결 풀 통계 조회 (연결 재사용률, 열린 연결 수, 합쳐진 요청 수)"""
+        stats = kis_http.get_stats()
+        stats['singleflight'] = kis_flight.get_stats()
+        stats['rate_limiter'] = rate_limiter.get_stats()
+        stats['cache'] = memory_cache.get_stats()
+        stats['cache_store'] = cache_store.get_stats()
+        stats['cache_refresh'] = cache_refresher.get_stats()
+        stats['bar_store'] = bar_store.get_stats()
+        stats['score_table'] = score_table.get_stats()
+        stats['score_store'] = score_store.get_stats()
+        stats['indicator_pool'] = indicator_pool.get_stats()
+        stats['symbol_registry'] = symbol_registry.get_stats()
+        return stats
+
+    def log_connection_stats(self):
+        """KIS 연결 풀 통계 로깅"""
+        stats = self.get_connection_stats()
+        logger.info(
+            f"KIS connection pool: requests={stats['requests']}, "
+            f"connections_created={stats['connections_created']}, "
+            f"open={stats['open_connections']}/{stats['pool_maxsize']}, "
+            f"reuse_ratio={stats['reuse_ratio']:.1%}, errors={stats['errors']}, "
+            f"coalesced={stats['singleflight']['shared']}, retries={stats['retries']}, "
+            f"hedges={stats['hedges']}, deadline_exceeded={stats['deadline_exceeded']}"
+        )
+        cache = stats['cache']
+        logger.info(
+            f"Result cache: size={cache['size']}/{cache['maxsize']}, hits={cache['hits']}, "
+            f"misses={cache['misses']}, hit_ratio={cache['hit_ratio']:.1%}, evictions={cache['evictions']}"
+        )
+
+    def save_health_status(self):
+        """엔드포인트별 차단기 상태를 BOT_HEALTH_FILE에 기록 (Flask 서버 봇 상태에 표시)"""
+        stats = kis_http.get_stats()
+        FileManager.save_json(BOT_HEALTH_FILE, {
+            "updated_at": datetime.now().isoformat(),
+            "circuit_breakers": stats['circuit_breakers'],
+            "rate_limit": rate_limiter.get_stats()['adaptive'],
+            "cache": memory_cache.get_stats(),
+            "requests": stats['requests'],
+            "errors": stats['errors']
+        })
 #시장 시간, 잔고, 위험 수준, AI 예측을 기반으로 최대 5개 종목을 관리하며, LSTM 예측과 주문서 분석을 활용해 지정가 매수를 실행하고, 거래 결과를 기록 및 알림
     def execute_trading_strategy(self):
         try:
@@ -1440,7 +1636,7 @@ class TradingBot:
                 return
 
             # 시장 위험도 체크 (간단한 버전)
-            fear_greed = get_fear_and_greed()
+            fear_greed = get_cycle_fear_and_greed()
             if fear_greed and fear_greed < 30:  # 공포 지수가 30 미만이면 위험
                 logger.info(f"Market fear too high: {fear_greed}")
                 return
@@ -1452,7 +1648,7 @@ class TradingBot:
                     if ticker in self.purchased_stocks["stocks"]:
                         continue
 
-                    predicted_price = self.market_analyzer.predict_next_price(ticker)
+                    predicted_price = self.market_analyzer.get_prediction(ticker)
                     current_price = get_current_price(ticker)
                     if predicted_price and current_price and predicted_price > current_price * 1.02:
                         buy_info = self.market_analyzer.analyze_order_book(ticker)
@@ -1461,7 +1657,7 @@ class TradingBot:
                             continue
 
                         # AI가 투자 금액을 판단 (웹사이트 설정 사용)
-                        market_conditions = {'fear_greed_index': get_fear_and_greed()}
+                        market_conditions = {'fear_greed_index': get_cycle_fear_and_greed()}
                         investment_ratio = self.market_analyzer.calculate_ai_investment_amount(
                             ticker, current_price, predicted_price, 
                             market_conditions=market_conditions
@@ -1575,9 +1771,8 @@ class TradingBot:
         if PAPER_TRADING:
             return paper_trading.execute_paper_buy(ticker, price, amount, "페이퍼 트레이딩 매수")
             
-        if not rate_limiter.can_make_order():
-            time.sleep(0.1)
-            return self.execute_limit_buy(ticker, price, amount)
+        if not rate_limiter.acquire_order():
+            return False
         try:
             url = f"{OVERSEAS_BASE_URL}/uapi/overseas-stock/v1/trading/order"
             body = {
@@ -1589,7 +1784,7 @@ class TradingBot:
                 "ord_qty": str(amount),
                 "ord_unpr": str(int(price))
             }
-            response = requests.post(url, headers=kis_client.get_headers(), json=body)
+            response = kis_http.post(url, headers=kis_client.get_headers(), json=body)
             data = response.json()
             if data.get("rt_cd") == "0":
                 return True
@@ -1607,9 +1802,8 @@ class TradingBot:
                 return paper_trading.execute_paper_sell(ticker, current_price, amount, "페이퍼 트레이딩 매도")
             return False
             
-        if not rate_limiter.can_make_order():
-            time.sleep(0.1)
-            return self.execute_market_sell(ticker, amount)
+        if not rate_limiter.acquire_order():
+            return False
         try:
             url = f"{OVERSEAS_BASE_URL}/uapi/overseas-stock/v1/trading/order"
             body = {
@@ -1621,7 +1815,7 @@ class TradingBot:
                 "ord_qty": str(amount),
                 "ord_unpr": "0"
             }
-            response = requests.post(url, headers=kis_client.get_headers(), json=body)
+            response = kis_http.post(url, headers=kis_client.get_headers(), json=body)
             data = response.json()
             if data.get("rt_cd") == "0":
                 return True
@@ -1632,29 +1826,30 @@ class TradingBot:
             return False
 
     def find_trading_opportunities(self):
-        self.opportunities = self.market_analyzer.scan_for_opportunities()
+        # 종목 스캔은 가장 낮은 차선에서 대기해 주문/위험 점검에 예산을 양보
+        with priority_scope(LANE_SCAN):
+            self.opportunities = self.market_analyzer.scan_for_opportunities()
         
 
 #보유 종목의 포지션을 점검해 손절(stop-loss) 또는 익절(take-profit)을 실행
     def check_positions(self):
-        for ticker, position in list(self.stop_loss_manager.positions.items()):
-            if not rate_limiter.can_make_api_call():
-                time.sleep(0.1)
-                continue
-            try:
-                current_price = get_current_price(ticker)
-                if not current_price:
-                    logger.error(f"Failed to get current price for {ticker}")
-                    continue
-                entry_price = position["entry_price"]
-                profit_percent = ((current_price - entry_price) / entry_price) * 100
+        # 위험 점검 차선: 스캔이 예산을 쓰고 있어도 먼저 허가를 받고, 거절돼도 건너뛰지 않고 마감 시간까지 대기
+        with priority_scope(LANE_RISK):
+            for ticker, position in list(self.stop_loss_manager.positions.items()):
+                try:
+                    current_price = get_current_price(ticker)
+                    if not current_price:
+                        logger.error(f"Failed to get current price for {ticker}")
+                        continue
+                    entry_price = position["entry_price"]
+                    profit_percent = ((current_price - entry_price) / entry_price) * 100
                 
-                if profit_percent <= -position["stop_loss"]:
-                    self._execute_stop_loss(ticker, position, current_price)
-                elif profit_percent >= position["take_profit"]:
-                    self._execute_take_profit(ticker, position, current_price)
-            except Exception as e:
-                logger.error(f"Position check failed for {ticker}: {e}")
+                    if profit_percent <= -position["stop_loss"]:
+                        self._execute_stop_loss(ticker, position, current_price)
+                    elif profit_percent >= position["take_profit"]:
+                        self._execute_take_profit(ticker, position, current_price)
+                except Exception as e:
+                    logger.error(f"Position check failed for {ticker}: {e}")
 
 
 #손절 조건 발생 시 시장가 매도 주문을 실행하고, 거래 이력과 보유 종목 상태를 업데이트하며, 텔레그램으로 손절 상황을 실시간 알림
@@ -1792,20 +1987,26 @@ class TradingBot:
             logger.error(f"Portfolio logging error: {e}")
 
     def run_trading_cycle(self):
-        if SHUTDOWN_REQUESTED:
-            return
-        self.check_positions()
-        if SHUTDOWN_REQUESTED:
-            return
-        self.find_trading_opportunities()
-        if SHUTDOWN_REQUESTED:
-            return
-        self.execute_trading_strategy()
+        # 사이클 전체에 마감 시간을 걸어 느린 요청이 다음 사이클을 밀어내지 않도록 함
+        # 사이클 안에서 같은 종목의 일봉/지표/예측은 한 번만 읽고 계산
+        with deadline_scope(CYCLE_DEADLINE_SECONDS), cycle_scope(self.market_analyzer.fetch_ohlcv):
+            if SHUTDOWN_REQUESTED:
+                return
+            with deadline_scope(POSITION_CHECK_DEADLINE_SECONDS):
+                self.check_positions()
+            if SHUTDOWN_REQUESTED:
+                return
+            self.find_trading_opportunities()
+            if SHUTDOWN_REQUESTED:
+                return
+            self.execute_trading_strategy()
+        self.save_health_status()
         
         # 1시간마다 성과 리포트 출력
         current_time = time.time()
         if current_time - self.last_performance_log >= 3600:  # 3600초 = 1시간
             self.log_portfolio_status()
+            self.log_connection_stats()
             self.last_performance_log = current_time
 
 
@@ -2006,6 +2207,11 @@ def get_next_run_time(now):
 if __name__ == "__main__":
     logger.info("📈 Starting main loop...")
     
+    # 스캔 지표 계산용 프로세스 풀 (INDICATOR_WORKERS=1이면 현재 프로세스에서 계산)
+    # 작업 프로세스는 spawn으로 띄우고 이 스크립트 대신 indicators 모듈만 import함
+    indicator_pool = IndicatorPool(int(os.getenv("INDICATOR_WORKERS", "0")) or None)
+    indicator_pool.start()
+    
     # 종료 모니터링 스레드 시작
     import threading
     exit_thread = threading.Thread(target=exit_monitor, daemon=True)
@@ -2085,6 +2291,7 @@ if __name__ == "__main__":
 
     # 프로그램 종료 시 정리 작업
     logger.info("🛑 프로그램을 종료합니다. 정리 작업을 수행합니다...")
+    indicator_pool.shutdown()
     try:
         send_telegram_message("🛑 자동매매 봇이 안전하게 종료되었습니다.")
     except:
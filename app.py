@@ -1,8 +1,11 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from kis_api_client import KISApiClient
+from kis_quota import read_quota_status
+from rate_limit import PermitTimeout
 from code_executor import CodeExecutor
 import json
+import itertools
 import logging
 from datetime import datetime
 import os
@@ -12,6 +15,10 @@ import threading
 import time
 import signal
 import psutil
+import hashlib
+import hmac
+import secrets
+from collections import OrderedDict
 
 # 환경 변수 로드
 load_dotenv()
@@ -24,8 +31,172 @@ CORS(app)  # CORS 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 전역 변수로 API 클라이언트 저장
-kis_client = None
+class KISClientCache:
+    """인증된 KISApiClient를 (appKey, 계좌번호, 상품코드) 해시로 보관하는 LRU 캐시
+    
+    연결에 성공할 때마다 임의의 clientId 토큰을 발급하고 서버에서 캐시 항목과 연결합니다.
+    clientId는 자격 증명에서 계산할 수 없으므로 연결한 브라우저만 사용할 수 있습니다.
+    """
+    
+    def __init__(self, max_size=32, idle_timeout=1800, verify_ttl=60):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout  # 이 시간 동안 쓰이지 않은 클라이언트는 제거
+        self.verify_ttl = verify_ttl      # 최근 연결 테스트 결과를 재사용하는 시간
+        self._entries = OrderedDict()
+        self._client_ids = {}             # clientId 토큰 → 계좌 키
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _account_key(app_key, account_number, account_code):
+        """캐시 항목 키 (서버 안에서만 사용, 클라이언트에 내보내지 않음)"""
+        raw = f"{app_key}|{account_number}|{account_code}".encode('utf-8')
+        return hashlib.sha256(raw).hexdigest()
+    
+    @staticmethod
+    def _secret_digest(app_secret):
+        return hashlib.sha256(app_secret.encode('utf-8')).digest()
+    
+    def _drop(self, account_key):
+        """락 안에서 호출: 캐시 항목과 발급한 clientId를 모두 제거"""
+        entry = self._entries.pop(account_key)
+        for client_id in entry['client_ids']:
+            self._client_ids.pop(client_id, None)
+        self._close(entry)
+    
+    def _evict_idle(self, now):
+        expired = [key for key, entry in self._entries.items()
+                   if now - entry['last_used'] > self.idle_timeout]
+        for key in expired:
+            self._drop(key)
+        while len(self._entries) > self.max_size:
+            self._drop(next(iter(self._entries)))
+    
+    @staticmethod
+    def _close(entry):
+        client = entry['client']
+        # 같은 앱키의 프로세스 공용 토큰 저장소가 토큰 갱신에 쓰는 연결 풀은 닫지 않음
+        if client.token_store.http is client.http:
+            return
+        try:
+            client.http.close()
+        except Exception as e:
+            logger.error(f"API 클라이언트 정리 오류: {e}")
+    
+    def get(self, client_id):
+        """clientId 토큰으로 캐시된 클라이언트 조회"""
+        with self._lock:
+            now = time.time()
+            self._evict_idle(now)
+            account_key = self._client_ids.get(client_id)
+            if account_key is None:
+                return None
+            entry = self._entries[account_key]
+            entry['last_used'] = now
+            self._entries.move_to_end(account_key)
+            return entry['client']
+    
+    def connect(self, app_key, app_secret, account_number, account_code):
+        """캐시된 클라이언트를 재사용하거나 새로 생성해 연결 테스트
+        
+        (client_id, client, 성공 여부)를 반환합니다. 실패하면 client_id는 None입니다.
+        """
+        account_key = self._account_key(app_key, account_number, account_code)
+        secret_digest = self._secret_digest(app_secret)
+        
+        with self._lock:
+            now = time.time()
+            self._evict_idle(now)
+            entry = self._entries.get(account_key)
+            # appSecret이 다르면 캐시를 재사용하지 않음
+            if entry is not None and not hmac.compare_digest(entry['secret_digest'], secret_digest):
+                entry = None
+        
+        if entry is not None:
+            client = entry['client']
+            if now - entry['verified_at'] < self.verify_ttl:
+                ok = True
+            else:
+                ok = client.test_connection()
+        else:
+            client = KISApiClient(
+                app_key=app_key,
+                app_secret=app_secret,
+                account_number=account_number,
+                account_code=account_code
+            )
+            ok = client.test_connection()
+        
+        if not ok:
+            return None, client, False
+        
+        client_id = secrets.token_urlsafe(32)
+        with self._lock:
+            now = time.time()
+            previous = self._entries.get(account_key)
+            if previous is not None and not hmac.compare_digest(previous['secret_digest'], secret_digest):
+                # appSecret이 바뀐 계좌는 이전에 발급한 clientId도 더 이상 받지 않음
+                self._drop(account_key)
+                previous = None
+            if previous is not None and previous['client'] is not client:
+                # 같은 계좌의 동시 첫 연결: 먼저 등록된 클라이언트를 공유하고 새로 만든 것은 닫음
+                self._close({'client': client})
+                client = previous['client']
+            if previous is None:
+                previous = self._entries[account_key] = {
+                    'client': client,
+                    'secret_digest': secret_digest,
+                    'client_ids': set()
+                }
+            previous['client_ids'].add(client_id)
+            previous['verified_at'] = now
+            previous['last_used'] = now
+            self._client_ids[client_id] = account_key
+            self._entries.move_to_end(account_key)
+            self._evict_idle(now)
+        
+        return client_id, client, True
+    
+    def remove(self, client_id):
+        """clientId 토큰 폐기 (계좌의 마지막 토큰이면 클라이언트도 제거)"""
+        with self._lock:
+            account_key = self._client_ids.pop(client_id, None)
+            if account_key is None:
+                return False
+            entry = self._entries[account_key]
+            entry['client_ids'].discard(client_id)
+            if not entry['client_ids']:
+                self._drop(account_key)
+        return True
+    
+    def __len__(self):
+        with self._lock:
+            self._evict_idle(time.time())
+            return len(self._entries)
+
+# 계좌별 인증된 API 클라이언트 캐시
+kis_client_cache = KISClientCache()
+
+def get_request_client():
+    """요청의 clientId(헤더 X-KIS-Client-Id 또는 쿼리)에 해당하는 클라이언트, 없거나 모르는 clientId면 None"""
+    client_id = request.headers.get('X-KIS-Client-Id') or request.args.get('clientId')
+    if not client_id:
+        return None
+    return kis_client_cache.get(client_id)
+
+def permit_timeout_response():
+    """호출 한도 허가를 기다리다 시간이 지난 요청 (잠시 후 다시 시도하도록 429)"""
+    response = jsonify({
+        'success': False,
+        'error': 'API 호출 한도를 초과했습니다. 잠시 후 다시 시도하세요.'
+    })
+    response.headers['Retry-After'] = '1'
+    return response, 429
+
+# 현재가 일괄 조회 최대 종목 수
+MAX_BATCH_SYMBOLS = 100
+
+# 봇이 사이클마다 기록하는 KIS 연결 상태 파일 (Auto-ganggang.py의 BOT_HEALTH_FILE)
+BOT_HEALTH_FILE = "bot_health.json"
 
 # 자동매매 봇 프로세스 관리
 trading_bot_process = None
@@ -137,6 +308,19 @@ def stop_trading_bot():
         log_activity(f'봇 중지 실패: {str(e)}', 'error')
         return False, f"봇 중지 실패: {str(e)}"
 
+def get_quota_summary():
+    """봇과 서버가 함께 쓰는 KIS 호출 한도 사용률 (앱키별 API 버킷 중 가장 바쁜 버킷 기준)"""
+    buckets = read_quota_status()
+    api_buckets = [b for key, b in buckets.items() if key.endswith(':api')]
+    busiest = max(api_buckets, key=lambda b: b['utilization'], default=None)
+    return {
+        'utilization': busiest['utilization'] if busiest else 0.0,
+        'calls_per_second': busiest['calls_per_second'] if busiest else 0.0,
+        'rate': busiest['rate'] if busiest else 0,
+        'processes': len(busiest['processes']) if busiest else 0,
+        'buckets': buckets
+    }
+
 def get_bot_status():
     """봇 상태 조회"""
     global trading_bot_process, bot_status
@@ -149,6 +333,16 @@ def get_bot_status():
             bot_status['status'] = 'stopped'
             trading_bot_process = None
     
+    bot_status['kis_quota'] = get_quota_summary()
+    
+    # 봇 프로세스의 엔드포인트별 차단기 상태
+    try:
+        if os.path.exists(BOT_HEALTH_FILE):
+            with open(BOT_HEALTH_FILE, 'r', encoding='utf-8') as f:
+                bot_status['kis_health'] = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"봇 상태 파일 읽기 실패: {e}")
+    
     return bot_status
 
 @app.route('/api/kis/test-connection', methods=['POST'])
@@ -166,19 +360,19 @@ def test_kis_connection():
                     'error': f'필수 필드가 누락되었습니다: {field}'
                 }), 400
         
-        # API 클라이언트 생성
-        client = KISApiClient(
+        # 캐시된 클라이언트를 재사용하거나 새로 생성해 연결 테스트
+        client_id, client, ok = kis_client_cache.connect(
             app_key=data['appKey'],
             app_secret=data['appSecret'],
             account_number=data['accountNumber'],
             account_code=data['accountCode']
         )
         
-        # 연결 테스트
-        if client.test_connection():
+        if ok:
             return jsonify({
                 'success': True,
                 'message': '한국투자증권 API 연결이 성공했습니다!',
+                'clientId': client_id,
                 'timestamp': datetime.now().isoformat()
             })
         else:
@@ -197,8 +391,6 @@ def test_kis_connection():
 @app.route('/api/kis/connect', methods=['POST'])
 def connect_kis_api():
     """한국투자증권 API 연결"""
-    global kis_client
-    
     try:
         data = request.get_json()
         
@@ -211,21 +403,19 @@ def connect_kis_api():
                     'error': f'필수 필드가 누락되었습니다: {field}'
                 }), 400
         
-        # API 클라이언트 생성 및 연결 테스트
-        client = KISApiClient(
+        # 캐시된 클라이언트를 재사용하거나 새로 생성해 연결 테스트
+        client_id, client, ok = kis_client_cache.connect(
             app_key=data['appKey'],
             app_secret=data['appSecret'],
             account_number=data['accountNumber'],
             account_code=data['accountCode']
         )
         
-        if client.test_connection():
-            # 전역 변수에 저장
-            kis_client = client
-            
+        if ok:
             return jsonify({
                 'success': True,
                 'message': '한국투자증권 API에 성공적으로 연결되었습니다!',
+                'clientId': client_id,
                 'timestamp': datetime.now().isoformat()
             })
         else:
@@ -244,10 +434,10 @@ def connect_kis_api():
 @app.route('/api/kis/disconnect', methods=['POST'])
 def disconnect_kis_api():
     """한국투자증권 API 연결 해제"""
-    global kis_client
-    
     try:
-        kis_client = None
+        client_id = request.headers.get('X-KIS-Client-Id') or request.args.get('clientId')
+        if client_id:
+            kis_client_cache.remove(client_id)
         
         return jsonify({
             'success': True,
@@ -265,13 +455,13 @@ def disconnect_kis_api():
 @app.route('/api/kis/account-info', methods=['GET'])
 def get_account_info():
     """계좌 정보 조회"""
-    global kis_client
+    kis_client = get_request_client()
     
     if not kis_client:
         return jsonify({
             'success': False,
             'error': 'API가 연결되지 않았습니다.'
-        }), 400
+        }), 401
     
     try:
         account_info = kis_client.get_account_info()
@@ -282,6 +472,8 @@ def get_account_info():
             'timestamp': datetime.now().isoformat()
         })
         
+    except PermitTimeout:
+        return permit_timeout_response()
     except Exception as e:
         logger.error(f"계좌 정보 조회 오류: {e}")
         return jsonify({
@@ -292,13 +484,13 @@ def get_account_info():
 @app.route('/api/kis/overseas-balance', methods=['GET'])
 def get_overseas_balance():
     """해외주식 잔고 조회"""
-    global kis_client
+    kis_client = get_request_client()
     
     if not kis_client:
         return jsonify({
             'success': False,
             'error': 'API가 연결되지 않았습니다.'
-        }), 400
+        }), 401
     
     try:
         balance = kis_client.get_overseas_stock_balance()
@@ -309,6 +501,8 @@ def get_overseas_balance():
             'timestamp': datetime.now().isoformat()
         })
         
+    except PermitTimeout:
+        return permit_timeout_response()
     except Exception as e:
         logger.error(f"해외주식 잔고 조회 오류: {e}")
         return jsonify({
@@ -319,13 +513,13 @@ def get_overseas_balance():
 @app.route('/api/kis/stock-price', methods=['GET'])
 def get_stock_price():
     """해외주식 현재가 조회"""
-    global kis_client
+    kis_client = get_request_client()
     
     if not kis_client:
         return jsonify({
             'success': False,
             'error': 'API가 연결되지 않았습니다.'
-        }), 400
+        }), 401
     
     try:
         symbol = request.args.get('symbol')
@@ -345,6 +539,8 @@ def get_stock_price():
             'timestamp': datetime.now().isoformat()
         })
         
+    except PermitTimeout:
+        return permit_timeout_response()
     except Exception as e:
         logger.error(f"주식 현재가 조회 오류: {e}")
         return jsonify({
@@ -352,16 +548,79 @@ def get_stock_price():
             'error': f'주식 현재가 조회에 실패했습니다: {str(e)}'
         }), 500
 
+@app.route('/api/kis/stock-prices', methods=['GET', 'POST'])
+def get_stock_prices():
+    """여러 해외주식 현재가 일괄 조회"""
+    kis_client = get_request_client()
+    
+    if not kis_client:
+        return jsonify({
+            'success': False,
+            'error': 'API가 연결되지 않았습니다.'
+        }), 401
+    
+    try:
+        # GET: ?symbols=AAPL,MSFT&exchange=NASD
+        # POST: {"symbols": ["AAPL", {"symbol": "SONY", "exchange": "NYSE"}], "exchange": "NASD"}
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            raw_symbols = data.get('symbols') or []
+            exchange = data.get('exchange', 'NASD')
+        else:
+            raw_symbols = [s for s in request.args.get('symbols', '').split(',') if s.strip()]
+            exchange = request.args.get('exchange', 'NASD')
+        
+        symbols = []
+        for item in raw_symbols:
+            if isinstance(item, dict):
+                if item.get('symbol'):
+                    symbols.append((item['symbol'].strip(), item.get('exchange') or exchange))
+            elif isinstance(item, str) and item.strip():
+                symbols.append((item.strip(), exchange))
+        
+        if not symbols:
+            return jsonify({
+                'success': False,
+                'error': '주식 심볼이 필요합니다.'
+            }), 400
+        
+        if len(symbols) > MAX_BATCH_SYMBOLS:
+            return jsonify({
+                'success': False,
+                'error': f'한 번에 최대 {MAX_BATCH_SYMBOLS}개 종목까지 조회할 수 있습니다.'
+            }), 400
+        
+        results = kis_client.get_overseas_stock_prices(symbols)
+        failed = [r for r in results if not r['success']]
+        
+        return jsonify({
+            'success': True,
+            'data': results,
+            'errors': {f"{r['exchange']}:{r['symbol']}": r['error'] for r in failed},
+            'total': len(results),
+            'failed': len(failed),
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except PermitTimeout:
+        return permit_timeout_response()
+    except Exception as e:
+        logger.error(f"주식 현재가 일괄 조회 오류: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'주식 현재가 일괄 조회에 실패했습니다: {str(e)}'
+        }), 500
+
 @app.route('/api/kis/stock-chart', methods=['GET'])
 def get_stock_chart():
     """해외주식 차트 데이터 조회"""
-    global kis_client
+    kis_client = get_request_client()
     
     if not kis_client:
         return jsonify({
             'success': False,
             'error': 'API가 연결되지 않았습니다.'
-        }), 400
+        }), 401
     
     try:
         symbol = request.args.get('symbol')
@@ -383,6 +642,8 @@ def get_stock_chart():
             'timestamp': datetime.now().isoformat()
         })
         
+    except PermitTimeout:
+        return permit_timeout_response()
     except Exception as e:
         logger.error(f"주식 차트 데이터 조회 오류: {e}")
         return jsonify({
@@ -393,13 +654,13 @@ def get_stock_chart():
 @app.route('/api/kis/place-order', methods=['POST'])
 def place_order():
     """해외주식 주문 전송"""
-    global kis_client
+    kis_client = get_request_client()
     
     if not kis_client:
         return jsonify({
             'success': False,
             'error': 'API가 연결되지 않았습니다.'
-        }), 400
+        }), 401
     
     try:
         data = request.get_json()
@@ -430,6 +691,8 @@ def place_order():
             'timestamp': datetime.now().isoformat()
         })
         
+    except PermitTimeout:
+        return permit_timeout_response()
     except Exception as e:
         logger.error(f"주문 전송 오류: {e}")
         return jsonify({
@@ -437,29 +700,55 @@ def place_order():
             'error': f'주문 전송에 실패했습니다: {str(e)}'
         }), 500
 
+# 내역이 한 건도 없음을 나타내는 값
+NO_ROWS = object()
+
+def stream_history_ndjson(rows, label):
+    """내역 행을 NDJSON으로 스트리밍 (마지막 줄에 완료 여부와 건수)
+    
+    첫 페이지는 응답을 만들기 전에 받아서, 여기서 난 오류는 호출한 라우트가 오류 상태 코드로 응답합니다.
+    스트리밍을 시작한 뒤의 오류만 마지막 줄에 기록합니다.
+    """
+    rows = iter(rows)
+    first = next(rows, NO_ROWS)
+    if first is not NO_ROWS:
+        rows = itertools.chain((first,), rows)
+    
+    def generate():
+        count = 0
+        try:
+            for row in rows:
+                count += 1
+                yield json.dumps({'row': row}, ensure_ascii=False) + '\n'
+            yield json.dumps({'done': True, 'count': count}) + '\n'
+        except Exception as e:
+            logger.error(f"{label} 스트리밍 오류: {e}")
+            yield json.dumps({'done': False, 'count': count,
+                              'error': f'{label}에 실패했습니다: {str(e)}'}, ensure_ascii=False) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/api/kis/order-history', methods=['GET'])
 def get_order_history():
-    """주문 내역 조회"""
-    global kis_client
+    """주문 내역 조회 (연속조회를 따라가며 NDJSON 스트리밍)"""
+    kis_client = get_request_client()
     
     if not kis_client:
         return jsonify({
             'success': False,
             'error': 'API가 연결되지 않았습니다.'
-        }), 400
+        }), 401
     
     try:
         start_date = request.args.get('startDate')
         end_date = request.args.get('endDate')
+        max_pages = request.args.get('maxPages', type=int)
         
-        order_history = kis_client.get_order_history(start_date, end_date)
-        
-        return jsonify({
-            'success': True,
-            'data': order_history,
-            'timestamp': datetime.now().isoformat()
-        })
+        rows = kis_client.iter_order_history(start_date, end_date, max_pages)
+        return stream_history_ndjson(rows, '주문 내역 조회')
         
+    except PermitTimeout:
+        return permit_timeout_response()
     except Exception as e:
         logger.error(f"주문 내역 조회 오류: {e}")
         return jsonify({
@@ -469,43 +758,57 @@ def get_order_history():
 
 @app.route('/api/kis/execution-history', methods=['GET'])
 def get_execution_history():
-    """체결 내역 조회"""
-    global kis_client
+    """체결 내역 조회 (연속조회를 따라가며 NDJSON 스트리밍)"""
+    kis_client = get_request_client()
     
     if not kis_client:
         return jsonify({
             'success': False,
             'error': 'API가 연결되지 않았습니다.'
-        }), 400
+        }), 401
     
     try:
         start_date = request.args.get('startDate')
         end_date = request.args.get('endDate')
+        max_pages = request.args.get('maxPages', type=int)
         
-        execution_history = kis_client.get_execution_history(start_date, end_date)
+        rows = kis_client.iter_execution_history(start_date, end_date, max_pages)
+        return stream_history_ndjson(rows, '체결 내역 조회')
         
+    except PermitTimeout:
+        return permit_timeout_response()
+    except Exception as e:
+        logger.error(f"체결 내역 조회 오류: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'체결 내역 조회에 실패했습니다: {str(e)}'
+        }), 500
+
+@app.route('/api/kis/quota', methods=['GET'])
+def get_kis_quota():
+    """봇과 서버가 함께 쓰는 KIS 호출 한도 실시간 사용률"""
+    try:
         return jsonify({
             'success': True,
-            'data': execution_history,
-            'timestamp': datetime.now().isoformat()
+            'data': get_quota_summary()
         })
-        
     except Exception as e:
-        logger.error(f"체결 내역 조회 오류: {e}")
+        logger.error(f"호출 한도 조회 오류: {e}")
         return jsonify({
             'success': False,
-            'error': f'체결 내역 조회에 실패했습니다: {str(e)}'
+            'error': f'호출 한도 조회에 실패했습니다: {str(e)}'
         }), 500
 
 @app.route('/api/kis/status', methods=['GET'])
 def get_api_status():
     """API 연결 상태 확인"""
-    global kis_client
-    
+    client = get_request_client()
     return jsonify({
         'success': True,
         'data': {
-            'isConnected': kis_client is not None,
+            'isConnected': client is not None,
+            'connectedAccounts': len(kis_client_cache),
+            'circuitBreakers': client.http.breakers.get_status() if client else {},
             'timestamp': datetime.now().isoformat()
         }
     })
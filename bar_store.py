@@ -0,0 +1,162 @@
+import os
+import re
+import threading
+import time
+import logging
+from datetime import datetime, timedelta, time as dtime
+from typing import Dict, Any, Optional
+
+import numpy as np
+import pytz
+
+from ohlcv_bars import OHLCVBars, PRICE_FIELDS
+
+# 로깅 설정
+logger = logging.getLogger(__name__)
+
+# 종목별 일봉 파일 디렉토리 (실행 디렉토리 기준)
+BAR_STORE_DIR = os.getenv("KIS_BAR_STORE_DIR", "bar_store")
+# 종목당 보관하는 최대 일봉 수
+MAX_STORED_BARS = 500
+
+US_EASTERN = pytz.timezone('US/Eastern')
+# 정규장 마감 시각 (뉴욕 시간)
+SESSION_CLOSE_HOUR = 16
+
+
+def last_session_close(now: float = None) -> float:
+    """now 이전의 가장 최근 미국 정규장 마감 시각 (주말만 제외, 휴장일은 한 번 더 조회하게 됨)"""
+    now = now if now is not None else time.time()
+    session_date = datetime.fromtimestamp(now, US_EASTERN).date()
+    while True:
+        # 날짜마다 그날의 서머타임 오프셋으로 마감 시각을 만듦 (전환 주말을 건너도 16시 유지)
+        close = US_EASTERN.localize(datetime.combine(session_date, dtime(SESSION_CLOSE_HOUR)))
+        if session_date.weekday() < 5 and close.timestamp() <= now:
+            return close.timestamp()
+        session_date -= timedelta(days=1)
+
+
+def _file_name(ticker: str) -> str:
+    return re.sub(r'[^A-Za-z0-9._-]', '_', ticker) + '.npz'
+
+
+class BarStore:
+    """종목별 일봉을 <directory>/<TICKER>.npz에 보관하고, 새 응답에서 마지막 저장일 이후 봉만 이어 붙이는 저장소
+
+    한 번 읽은 종목은 메모리에 두고, 호출부는 tail(count)로 필요한 만큼만 뷰로 받아 갑니다.
+    마지막 조회 이후 장이 마감된 적이 없으면 needs_refresh()가 False라 KIS를 다시 부르지 않습니다.
+    """
+
+    def __init__(self, directory: str = BAR_STORE_DIR, max_bars: int = MAX_STORED_BARS):
+        self.directory = directory
+        self.max_bars = max_bars
+        os.makedirs(directory, exist_ok=True)
+        self._bars: Dict[str, OHLCVBars] = {}
+        self._fetched_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._refreshes = 0
+        self._appended = 0
+
+    def _path(self, ticker: str) -> str:
+        return os.path.join(self.directory, _file_name(ticker))
+
+    def _load(self, ticker: str) -> Optional[OHLCVBars]:
+        path = self._path(ticker)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                bars = OHLCVBars(dates=data['dates'], **{field: data[field] for field in PRICE_FIELDS})
+                fetched_at = float(data['fetched_at'])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Bar store file for {ticker} unreadable, refetching: {e}")
+            return None
+        self._bars[ticker] = bars
+        self._fetched_at[ticker] = fetched_at
+        return bars
+
+    def get(self, ticker: str) -> Optional[OHLCVBars]:
+        """저장된 일봉 (오래된 날짜부터), 없으면 None"""
+        with self._lock:
+            bars = self._bars.get(ticker)
+            if bars is None:
+                bars = self._load(ticker)
+            return bars
+
+    def needs_refresh(self, ticker: str, now: float = None) -> bool:
+        """마지막 조회 뒤에 장이 마감됐거나 저장된 봉이 없으면 True"""
+        if self.get(ticker) is None:
+            return True
+        with self._lock:
+            fetched_at = self._fetched_at.get(ticker, 0.0)
+        return fetched_at < last_session_close(now)
+
+    def read(self, ticker: str, count: int) -> Optional[OHLCVBars]:
+        """최근 count개 봉 (복사 없이 뷰)"""
+        bars = self.get(ticker)
+        if bars is None:
+            return None
+        with self._lock:
+            self._hits += 1
+        return bars.tail(count)
+
+    def merge(self, ticker: str, fetched: OHLCVBars, now: float = None) -> OHLCVBars:
+        """새 응답에서 마지막 저장일 이후(같은 날 포함, 장중 봉 갱신) 봉만 이어 붙여 저장"""
+        now = now if now is not None else time.time()
+        stored = self.get(ticker)
+        fetched = self._sorted(fetched)
+
+        if stored is None or stored.empty or stored.dates is None or fetched.dates is None:
+            merged = fetched
+            appended = len(fetched)
+        else:
+            last_date = stored.dates[-1]
+            newer = fetched.dates >= last_date
+            appended = int(np.count_nonzero(fetched.dates > last_date))
+            keep = stored.dates < last_date if newer.any() else np.ones(len(stored), dtype=bool)
+            merged = OHLCVBars(
+                dates=np.concatenate([stored.dates[keep], fetched.dates[newer]]),
+                **{field: np.concatenate([stored[field][keep], fetched[field][newer]])
+                   for field in PRICE_FIELDS}
+            )
+        merged = merged.tail(self.max_bars)
+
+        with self._lock:
+            self._bars[ticker] = merged
+            self._fetched_at[ticker] = now
+            self._refreshes += 1
+            self._appended += appended
+        self._save(ticker, merged, now)
+        return merged
+
+    @staticmethod
+    def _sorted(bars: OHLCVBars) -> OHLCVBars:
+        if bars.dates is None or len(bars) < 2:
+            return bars
+        order = np.argsort(bars.dates, kind='stable')
+        if np.all(order[:-1] < order[1:]):
+            return bars
+        return OHLCVBars(dates=bars.dates[order], **{field: bars[field][order] for field in PRICE_FIELDS})
+
+    def _save(self, ticker: str, bars: OHLCVBars, fetched_at: float):
+        """임시 파일에 쓴 뒤 교체 (도중에 죽어도 이전 파일 유지)"""
+        path = self._path(ticker)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        dates = bars.dates if bars.dates is not None else np.empty(len(bars), dtype='<U8')
+        try:
+            np.savez(tmp_path, dates=dates, fetched_at=np.float64(fetched_at),
+                     **{field: bars[field] for field in PRICE_FIELDS})
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Failed to save bars for {ticker}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'tickers': len(self._bars),
+                'hits': self._hits,
+                'refreshes': self._refreshes,
+                'bars_appended': self._appended
+            }
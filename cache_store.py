@@ -0,0 +1,361 @@
+import copy
+import datetime
+import decimal
+import enum
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, List, Tuple
+
+# 로깅 설정
+logger = logging.getLogger(__name__)
+
+# 캐시에 없음을 나타내는 유일한 값 (cache_result는 None 결과를 저장하지 않으므로 None은 히트가 아님)
+MISS = object()
+
+
+class UncacheableArgument(TypeError):
+    """재시작 후에도 같은 캐시 키로 바꿀 수 없는 인자 (호출부는 캐시 없이 실행)"""
+
+
+def _canonical(value: Any) -> Any:
+    """캐시 키용 인자 정규화 (실행마다 달라지는 메모리 주소 등이 키에 들어가지 않도록)"""
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else repr(value)
+    if hasattr(value, 'item') and getattr(value, 'shape', None) == ():
+        # numpy 스칼라 → 파이썬 값
+        return _canonical(value.item())
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((_canonical(item) for item in value), key=repr)
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    # 날짜/시각(pd.Timestamp 포함)은 타입과 ISO 형식으로 값까지 구분
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return f"<{type(value).__qualname__} {value.isoformat()}>"
+    if isinstance(value, (decimal.Decimal, datetime.timedelta)):
+        return f"<{type(value).__qualname__} {value!r}>"
+    if isinstance(value, enum.Enum):
+        return f"<{type(value).__qualname__}.{value.name}>"
+    if isinstance(value, bytes):
+        return f"<bytes {value.hex()}>"
+    # 그 밖의 객체는 값을 알 수 없어 서로 다른 인자가 같은 키를 쓰게 되므로 캐시하지 않음
+    raise UncacheableArgument(f"Cannot build a cache key from {type(value).__module__}.{type(value).__qualname__}")
+
+
+def takes_self(func) -> bool:
+    """첫 매개변수가 self/cls인 메서드인지 (staticmethod처럼 클래스 안에 있어도 아니면 False)"""
+    try:
+        parameters = list(inspect.signature(func).parameters)
+    except (TypeError, ValueError):
+        return False
+    return bool(parameters) and parameters[0] in ('self', 'cls')
+
+
+def make_cache_key(func, args: tuple, kwargs: Dict[str, Any], version: int = 1, skip_self: bool = None) -> str:
+    """함수 이름, 버전, 정규화한 인자로 만든 재시작 후에도 같은 캐시 키
+
+    메서드는 self를 키에서 빼므로 객체를 새로 만들어도 같은 캐시를 씁니다 (skip_self 생략 시 takes_self로 판단).
+    함수 동작이 바뀌어 예전 결과를 버려야 하면 version을 올립니다.
+    정규화할 수 없는 인자가 있으면 UncacheableArgument를 냅니다.
+    """
+    if skip_self is None:
+        skip_self = takes_self(func)
+    if skip_self:
+        args = args[1:]
+    payload = json.dumps([_canonical(list(args)), _canonical(kwargs)],
+                         sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    digest = hashlib.md5(payload.encode('utf-8')).hexdigest()
+    return f"{func.__qualname__}_v{version}_{digest}"
+
+
+class MemoryCache:
+    """프로세스 안의 LRU + TTL 캐시 (디스크 캐시 앞단)
+
+    값과 저장 시각을 함께 보관하고, 만료 여부는 조회하는 쪽이 넘긴 max_age로 판단합니다.
+    maxsize를 넘으면 가장 오래 쓰이지 않은 항목부터 내보냅니다.
+    """
+
+    def __init__(self, maxsize: int = 2048):
+        self.maxsize = maxsize
+        self._entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._warmed = 0
+
+    def get(self, key: str, max_age: float) -> Any:
+        """max_age초 안에 저장된 값이면 (저장 시각, 값), 아니면 MISS"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return MISS
+            timestamp, value = entry
+            if now - timestamp >= max_age:
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return MISS
+            self._entries.move_to_end(key)
+            self._hits += 1
+        # 호출부가 결과 목록/딕셔너리를 고쳐도 캐시 값은 그대로 유지
+        return timestamp, copy.deepcopy(value) if isinstance(value, (list, dict)) else value
+
+    def set(self, key: str, value: Any, timestamp: float = None):
+        """JSON으로 한 번 바꾼 사본을 저장 (호출부가 원본을 고쳐도 영향이 없고, 디스크 캐시와 같은 타입을 돌려줌)
+
+        JSON으로 바꿀 수 없는 값이면 TypeError/ValueError (디스크 캐시에도 저장할 수 없는 값)
+        """
+        value = json.loads(json.dumps(value))
+        with self._lock:
+            self._store(key, value, timestamp if timestamp is not None else time.time())
+
+    def _store(self, key: str, value: Any, timestamp: float):
+        self._entries[key] = (timestamp, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def warm(self, entries: Iterable[Tuple[str, float, Any]]) -> int:
+        """시작 시 디스크 캐시의 (키, 저장 시각, 값)을 적재 - 최근 것이 마지막에 오도록 넘김"""
+        loaded = 0
+        with self._lock:
+            for key, timestamp, value in entries:
+                self._store(key, value, timestamp)
+                loaded += 1
+            self._warmed += loaded
+        return loaded
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': self._hits / lookups if lookups else 0.0,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'warmed': self._warmed
+            }
+
+
+class BackgroundRefresher:
+    """만료된 값을 먼저 돌려준 뒤 키마다 한 번씩만 백그라운드 스레드에서 새로 계산"""
+
+    def __init__(self, name: str = 'cache-refresh'):
+        self.name = name
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self._started = 0
+        self._failed = 0
+
+    def submit(self, key: str, refresh) -> bool:
+        """이미 같은 키를 갱신 중이면 False"""
+        with self._lock:
+            if key in self._in_flight:
+                return False
+            self._in_flight.add(key)
+            self._started += 1
+
+        def run():
+            try:
+                refresh()
+            except Exception as e:
+                with self._lock:
+                    self._failed += 1
+                logger.error(f"Background cache refresh failed for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._in_flight.discard(key)
+
+        threading.Thread(target=run, name=f"{self.name}-{key[:32]}", daemon=True).start()
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'refreshing': len(self._in_flight),
+                'refreshes': self._started,
+                'refresh_failures': self._failed
+            }
+
+
+class SQLiteCacheStore:
+    """cache_result 디스크 캐시 - 키마다 파일을 만드는 대신 하나의 SQLite 파일(WAL)에 저장
+
+    항목마다 만료 시각을 두고, 백그라운드 정리 스레드가 만료 항목을 지우며
+    max_entries를 넘으면 오래 전에 저장된 항목부터 지웁니다.
+    쓰기는 한 문장(INSERT OR REPLACE)이라 도중에 죽어도 반쯤 쓴 항목이 남지 않습니다.
+    """
+
+    def __init__(self, path: str, max_entries: int = 20000, sweep_interval: float = 300.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._sweeper = None
+        self._stats_lock = threading.Lock()
+        self._expired_removed = 0
+        self._evicted = 0
+        self._errors = 0
+
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, expires REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)")
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_created ON cache (created)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """스레드마다 연결 하나 (sqlite3 연결은 스레드 간 공유하지 않음)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count_error(self):
+        with self._stats_lock:
+            self._errors += 1
+
+    def get(self, key: str, max_age: float) -> Any:
+        """max_age초 안에 저장되고 만료되지 않은 (저장 시각, 값), 없으면 MISS"""
+        now = time.time()
+        try:
+            row = self._connect().execute(
+                "SELECT created, expires, value FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._count_error()
+            logger.error(f"Cache store read failed: {e}")
+            return MISS
+        if row is None:
+            return MISS
+        created, expires, value = row
+        if now >= expires or now - created >= max_age:
+            return MISS
+        return created, json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: float, timestamp: float = None):
+        """값을 JSON으로 저장 (직렬화할 수 없는 값은 TypeError/ValueError)"""
+        timestamp = timestamp if timestamp is not None else time.time()
+        payload = json.dumps(value)
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO cache (key, value, created, expires) VALUES (?, ?, ?, ?)",
+                (key, payload, timestamp, timestamp + ttl)
+            )
+        except sqlite3.Error:
+            self._count_error()
+            raise
+
+    def recent(self, limit: int) -> List[Tuple[str, float, Any]]:
+        """만료되지 않은 항목을 오래된 것부터 최대 limit개 (메모리 캐시 적재용)"""
+        try:
+            rows = self._connect().execute(
+                "SELECT key, created, value FROM cache WHERE expires > ? ORDER BY created DESC LIMIT ?",
+                (time.time(), limit)
+            ).fetchall()
+        except sqlite3.Error as e:
+            self._count_error()
+            logger.error(f"Cache store load failed: {e}")
+            return []
+        entries = []
+        for key, created, value in reversed(rows):
+            try:
+                entries.append((key, created, json.loads(value)))
+            except ValueError:
+                continue
+        return entries
+
+    def sweep(self) -> int:
+        """만료 항목 삭제 후 max_entries를 넘는 만큼 오래된 항목 삭제"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            expired = conn.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),)).rowcount
+            total = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            evicted = 0
+            if total > self.max_entries:
+                evicted = conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY created ASC LIMIT ?)",
+                    (total - self.max_entries,)
+                ).rowcount
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            self._count_error()
+            logger.error(f"Cache store sweep failed: {e}")
+            return 0
+        with self._stats_lock:
+            self._expired_removed += expired
+            self._evicted += evicted
+        if expired or evicted:
+            logger.info(f"Cache store swept: expired={expired}, evicted={evicted}")
+        return expired + evicted
+
+    def start_sweeper(self):
+        """sweep_interval마다 정리하는 데몬 스레드 시작 (시작할 때 한 번 바로 정리)"""
+        if self._sweeper is not None:
+            return
+
+        def run():
+            while True:
+                self.sweep()
+                if self._stop.wait(self.sweep_interval):
+                    return
+
+        self._sweeper = threading.Thread(target=run, name='cache-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        try:
+            entries = self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        with self._stats_lock:
+            return {
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'file_bytes': size,
+                'expired_removed': self._expired_removed,
+                'evicted': self._evicted,
+                'errors': self._errors
+            }
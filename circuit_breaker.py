@@ -0,0 +1,202 @@
+import threading
+import time
+import logging
+from collections import deque
+from typing import Dict, Any, Optional, Callable
+from urllib.parse import urlparse
+
+import requests
+
+# 로깅 설정
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# 엔드포인트 경로 → 차단기 묶음 (앞에서부터 먼저 일치하는 묶음 사용)
+ENDPOINT_FAMILIES = (
+    ('oauth', ('/oauth2/',)),
+    ('quotations', ('/quotations/',)),
+    ('inquire-balance', ('inquire-balance', 'trading-inquire/')),
+    ('trading', ('/trading/',)),
+)
+DEFAULT_FAMILY = 'other'
+
+# 초당 거래건수 초과는 브로커 장애가 아니므로 실패로 세지 않음
+THROTTLE_MSG_CD = 'EGW00201'
+
+
+class CircuitOpenError(requests.RequestException):
+    """차단기가 열려 있어 요청을 보내지 않고 바로 실패"""
+
+
+class CircuitBreaker:
+    """오류율 또는 느린 응답 비율이 기준을 넘으면 열리는 차단기
+
+    열린 동안은 바로 실패하고, open_seconds가 지나면 반열림 상태에서
+    한 번에 하나의 시험 요청만 보내 성공하면 닫고 실패하면 다시 엽니다.
+    """
+
+    def __init__(self, name: str, failure_rate: float = 0.5, slow_call_rate: float = 0.8,
+                 slow_call_seconds: float = 5.0, min_calls: int = 10, window: float = 60.0,
+                 open_seconds: float = 30.0,
+                 on_state_change: Optional[Callable[[str, str, str], None]] = None):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_rate = slow_call_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.on_state_change = on_state_change
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        # (완료 시각, 실패 여부, 느린 응답 여부)
+        self._calls = deque()
+
+        self._rejected = 0
+        self._trips = 0
+        self._last_trip_reason = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def _transition(self, new_state: str, reason: str = None):
+        old_state = self._state
+        if old_state == new_state:
+            return
+        self._state = new_state
+        if new_state == OPEN:
+            self._opened_at = time.monotonic()
+            self._trips += 1
+            self._last_trip_reason = reason
+        elif new_state == CLOSED:
+            self._calls.clear()
+        self._probe_in_flight = False
+
+        log = logger.warning if new_state == OPEN else logger.info
+        log(f"Circuit breaker [{self.name}] {old_state} -> {new_state}" + (f" ({reason})" if reason else ""))
+        if self.on_state_change:
+            try:
+                self.on_state_change(self.name, old_state, new_state)
+            except Exception as e:
+                logger.error(f"Circuit breaker callback failed: {e}")
+
+    def before_call(self) -> bool:
+        """요청 전 호출. 열려 있으면 CircuitOpenError, 반열림 시험 요청이면 True 반환"""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CLOSED:
+                return False
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._rejected += 1
+        raise CircuitOpenError(f"KIS circuit breaker [{self.name}] is {state}")
+
+    def record_success(self, latency: float):
+        self._record(failed=False, latency=latency)
+
+    def record_failure(self, latency: float):
+        self._record(failed=True, latency=latency)
+
+    def release(self):
+        """결과를 판단할 수 없는 요청 (마감 초과 등) - 시험 요청 자리만 반납"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def _record(self, failed: bool, latency: float):
+        now = time.monotonic()
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            state = self._current_state(now)
+            if state == HALF_OPEN:
+                if failed or slow:
+                    self._transition(OPEN, reason='probe failed' if failed else f'probe slow ({latency:.1f}s)')
+                else:
+                    self._transition(CLOSED)
+                return
+            if state == OPEN:
+                return
+
+            self._calls.append((now, failed, slow))
+            while self._calls and now - self._calls[0][0] > self.window:
+                self._calls.popleft()
+
+            total = len(self._calls)
+            if total < self.min_calls:
+                return
+            failures = sum(1 for _, f, _ in self._calls if f)
+            slow_calls = sum(1 for _, _, s in self._calls if s)
+            if failures / total >= self.failure_rate:
+                self._transition(OPEN, reason=f'error rate {failures}/{total}')
+            elif slow_calls / total >= self.slow_call_rate:
+                self._transition(OPEN, reason=f'slow calls {slow_calls}/{total}')
+
+    def get_status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            total = len(self._calls)
+            failures = sum(1 for _, f, _ in self._calls if f)
+            return {
+                'state': state,
+                'calls': total,
+                'error_rate': failures / total if total else 0.0,
+                'rejected': self._rejected,
+                'trips': self._trips,
+                'last_trip_reason': self._last_trip_reason,
+                'retry_in': max(self.open_seconds - (now - self._opened_at), 0) if state == OPEN else 0
+            }
+
+
+def is_kis_throttle(response: requests.Response) -> bool:
+    """KIS 초당 거래건수 초과 응답 여부 (HTTP 500으로 오는 경우가 있음)"""
+    try:
+        return THROTTLE_MSG_CD in response.text[:512]
+    except Exception:
+        return False
+
+
+class CircuitBreakerRegistry:
+    """엔드포인트 묶음(quotations, trading, inquire-balance, oauth)별 차단기 모음"""
+
+    def __init__(self, **breaker_kwargs):
+        self._breaker_kwargs = breaker_kwargs
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def family_for(url: str) -> str:
+        path = urlparse(url).path
+        for family, patterns in ENDPOINT_FAMILIES:
+            if any(pattern in path for pattern in patterns):
+                return family
+        return DEFAULT_FAMILY
+
+    def get(self, family: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(family)
+            if breaker is None:
+                breaker = CircuitBreaker(family, **self._breaker_kwargs)
+                self._breakers[family] = breaker
+            return breaker
+
+    def for_url(self, url: str) -> CircuitBreaker:
+        return self.get(self.family_for(url))
+
+    def get_status(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {family: breaker.get_status() for family, breaker in breakers.items()}
@@ -0,0 +1,208 @@
+import os
+import sys
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import ta
+
+from ohlcv_bars import OHLCVBars, PRICE_FIELDS
+
+# 로깅 설정
+logger = logging.getLogger(__name__)
+
+# 지표 계산에 필요한 최소 봉 수 (MACD 느린 EMA 26)
+MIN_INDICATOR_BARS = 26
+# 이보다 적은 종목은 프로세스 풀로 넘기는 비용이 더 커서 현재 프로세스에서 계산
+MIN_PARALLEL_TICKERS = 16
+
+
+def add_technical_indicators(df: pd.DataFrame) -> pd.DataFrame:
+    """볼린저 밴드, RSI, MACD, EMA, ADX, 거래량 이동평균 컬럼 추가"""
+    try:
+        df = df.copy()
+        if len(df) < MIN_INDICATOR_BARS:
+            logger.warning(f"Data length {len(df)} is less than required {MIN_INDICATOR_BARS}")
+            return df
+
+        indicator_bb = ta.volatility.BollingerBands(close=df['close'])
+        df['bb_bbm'] = indicator_bb.bollinger_mavg()
+        df['bb_bbh'] = indicator_bb.bollinger_hband()
+        df['bb_bbl'] = indicator_bb.bollinger_lband()
+        df['rsi'] = ta.momentum.RSIIndicator(close=df['close']).rsi()
+        macd = ta.trend.MACD(close=df['close'])
+        df['macd'] = macd.macd()
+        df['macd_signal'] = macd.macd_signal()
+        df['macd_diff'] = macd.macd_diff()
+        df['ema_9'] = ta.trend.EMAIndicator(close=df['close'], window=9).ema_indicator()
+        df['adx'] = ta.trend.ADXIndicator(high=df['high'],
+                                          low=df['low'],
+                                          close=df['close']).adx()
+        df['volume_sma'] = df['volume'].rolling(window=20).mean()
+        return df
+    except Exception as e:
+        logger.error(f"Failed to add technical indicators: {e}")
+        return df
+
+
+def indicator_summary(df: pd.DataFrame) -> Optional[Dict[str, float]]:
+    """점수 계산에 쓰는 마지막 지표 값만 추림 (프로세스 간에는 이 작은 딕셔너리만 전달)"""
+    if len(df) < MIN_INDICATOR_BARS or 'rsi' not in df:
+        return None
+    return {
+        'bars': len(df),
+        'rsi': float(df['rsi'].iloc[-1]),
+        'macd_diff_prev': float(df['macd_diff'].iloc[-2]),
+        'macd_diff': float(df['macd_diff'].iloc[-1]),
+        'close': float(df['close'].iloc[-1]),
+        'close_5': float(df['close'].iloc[-5]),
+        'bb_bbl': float(df['bb_bbl'].iloc[-1]),
+        'volume': float(df['volume'].iloc[-1]),
+        'volume_sma': float(df['volume_sma'].iloc[-1])
+    }
+
+
+def summarize_bars(bars: OHLCVBars) -> Optional[Dict[str, float]]:
+    return indicator_summary(add_technical_indicators(bars.to_dataframe()))
+
+
+def _summarize_rows(shm_name: str, shape: tuple, rows: List[int], lengths: List[int]) -> List[Optional[Dict[str, float]]]:
+    """작업 프로세스: 공유 메모리 패널의 rows 행을 읽어 지표 요약 계산"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        panel = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        summaries = []
+        for row, length in zip(rows, lengths):
+            data = panel[row, shape[1] - length:]
+            # DataFrame이 공유 메모리를 가리키지 않도록 복사한 뒤 계산
+            df = pd.DataFrame({field: data[:, i].copy() for i, field in enumerate(PRICE_FIELDS)})
+            summaries.append(indicator_summary(add_technical_indicators(df)))
+            del data
+        del panel
+        return summaries
+    finally:
+        shm.close()
+
+
+@contextmanager
+def _as_worker_main():
+    """spawn/forkserver 작업 프로세스가 봇 스크립트 대신 이 모듈을 __main__으로 준비하도록 잠시 바꿈
+
+    작업 프로세스는 시작할 때 부모의 __main__을 다시 실행하므로, 그대로 두면 봇 스크립트의 모듈 수준
+    초기화(설정 로드, 토큰 발급, 캐시 정리 스레드, TensorFlow import 등)가 작업 프로세스마다 반복됩니다.
+    이 모듈은 import할 때 부수 효과가 없어 작업 프로세스의 __main__으로 써도 안전합니다.
+    """
+    main = sys.modules['__main__']
+    sys.modules['__main__'] = sys.modules[__name__]
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = main
+
+
+class IndicatorPool:
+    """지표 계산 전용 프로세스 풀 (GIL 없이 코어 수만큼 병렬)
+
+    일봉은 (종목 × 봉 × 필드) 패널 하나로 공유 메모리에 쓰고, 작업 프로세스는
+    종목 묶음의 행 번호만 받아 읽습니다. 결과는 종목별 지표 요약만 돌려받습니다.
+    """
+
+    def __init__(self, workers: int = None, start_method: str = 'spawn'):
+        self.workers = workers or max((os.cpu_count() or 2) - 1, 1)
+        # fork는 다른 스레드가 잡고 있던 락과 TensorFlow 상태까지 복사하므로 spawn/forkserver만 사용
+        if start_method not in ('spawn', 'forkserver'):
+            raise ValueError(f"Unsupported start method for indicator pool: {start_method}")
+        self.start_method = start_method
+        self._executor = None
+        self._batches = 0
+        self._fallbacks = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context(self.start_method))
+        return self._executor
+
+    def _submit(self, executor: ProcessPoolExecutor, fn, *args):
+        """작업 프로세스는 submit 때 필요한 만큼 새로 뜨므로, 그동안 이 모듈을 __main__으로 보이게 함"""
+        with _as_worker_main():
+            return executor.submit(fn, *args)
+
+    def start(self):
+        """프로그램 시작 시 작업 프로세스를 미리 띄움 (첫 스캔이 프로세스 시작을 기다리지 않도록)"""
+        if self.workers <= 1:
+            return
+        # 작업 프로세스가 공유 메모리 정리 프로세스를 각자 띄우지 않고 부모 것을 물려받도록 먼저 실행
+        resource_tracker.ensure_running()
+        # 놀고 있는 작업 프로세스가 없을 때마다 하나씩 뜨므로 workers개를 한꺼번에 넣어 모두 띄움
+        executor = self._get_executor()
+        for future in [self._submit(executor, int) for _ in range(self.workers)]:
+            future.result()
+        logger.info(f"Indicator pool started with {self.workers} {self.start_method} workers")
+
+    def _discard_executor(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def summarize(self, bars_list: Sequence[Optional[OHLCVBars]]) -> List[Optional[Dict[str, float]]]:
+        """종목별 지표 요약 (봉이 부족하거나 없으면 None)"""
+        results: List[Optional[Dict[str, float]]] = [None] * len(bars_list)
+        rows = [i for i, bars in enumerate(bars_list) if bars is not None and len(bars) >= MIN_INDICATOR_BARS]
+        if not rows:
+            return results
+        if len(rows) < MIN_PARALLEL_TICKERS or self.workers <= 1:
+            for i in rows:
+                results[i] = summarize_bars(bars_list[i])
+            return results
+
+        days = max(len(bars_list[i]) for i in rows)
+        shape = (len(rows), days, len(PRICE_FIELDS))
+        shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+        try:
+            panel = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+            lengths = []
+            for row, i in enumerate(rows):
+                bars = bars_list[i]
+                lengths.append(len(bars))
+                for column, field in enumerate(PRICE_FIELDS):
+                    panel[row, days - len(bars):, column] = bars[field]
+            del panel
+
+            self._batches += 1
+            chunk = -(-len(rows) // self.workers)
+            try:
+                executor = self._get_executor()
+                futures = [
+                    (start, self._submit(executor, _summarize_rows, shm.name, shape,
+                                         list(range(start, min(start + chunk, len(rows)))),
+                                         lengths[start:start + chunk]))
+                    for start in range(0, len(rows), chunk)
+                ]
+                for start, future in futures:
+                    for offset, summary in enumerate(future.result()):
+                        results[rows[start + offset]] = summary
+            except BrokenProcessPool as e:
+                # 작업 프로세스가 죽으면 이번 묶음은 현재 프로세스에서 계산하고, 망가진 풀은 버려 다음 묶음에서 새로 만듦
+                logger.error(f"Indicator pool broken, computing in-process: {e}")
+                self._fallbacks += 1
+                self._discard_executor()
+                for i in rows:
+                    results[i] = summarize_bars(bars_list[i])
+            return results
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'workers': self.workers, 'running': self._executor is not None, 'batches': self._batches,
+                'fallbacks': self._fallbacks}
+
+    def shutdown(self):
+        self._discard_executor()
@@ -4,10 +4,16 @@ import time
 import hashlib
 import hmac
 import base64
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Tuple, Union
 import logging
 
+from kis_http import KISHttpPool, KIS_BASE_URL, REQUEST_PERMIT_TIMEOUT
+from rate_limit import TokenBucket, AdaptiveRateController, PermitTimeout, priority_scope, LANE_ORDER
+from kis_quota import shared_quota_for_app, KIS_API_MAX_RATE
+from kis_token_store import get_token_store
+
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -15,50 +21,59 @@ logger = logging.getLogger(__name__)
 class KISApiClient:
     """한국투자증권 해외주식 API 클라이언트"""
     
-    def __init__(self, app_key: str, app_secret: str, account_number: str, account_code: str):
+    def __init__(self, app_key: str, app_secret: str, account_number: str, account_code: str,
+                 max_workers: int = 5, requests_per_second: float = 10):
         self.app_key = app_key
         self.app_secret = app_secret
         self.account_number = account_number
         self.account_code = account_code
         
         # API 엔드포인트
-        self.base_url = "https://openapi.koreainvestment.com:9443"
-        self.oauth_url = "https://openapi.koreainvestment.com:9443/oauth2/tokenP"
+        self.base_url = KIS_BASE_URL
+        self.oauth_url = f"{KIS_BASE_URL}/oauth2/tokenP"
         
         # 토큰 정보
         self.access_token = None
         self.token_expires_at = None
         
-        # 세션
-        self.session = requests.Session()
+        # 일괄 조회 병렬 작업 수와 초당 호출 한도
+        self.max_workers = max_workers
+        # 같은 앱키를 쓰는 봇 프로세스와 초당 호출 한도를 공유 (kis_quota.json)
+        self.throttle = TokenBucket(requests_per_second, shared=shared_quota_for_app(
+            app_key, app_secret, 'api', requests_per_second, label='web', max_rate=KIS_API_MAX_RATE))
+
+        # 세션 (keep-alive 연결 풀, 기본 타임아웃 적용)
+        self.http = KISHttpPool(pool_maxsize=max_workers)
+        # 초과(EGW00201) 응답이나 지연이 늘면 호출 속도를 줄이고 회복되면 다시 올림
+        self.rate_controller = AdaptiveRateController(self.throttle, max_rate=KIS_API_MAX_RATE)
+        self.http.add_response_listener(self.rate_controller.observe)
+        # 재시도/헤지 요청도 같은 한도에서 허가를 받음
+        self.http.set_permit_source(self.throttle.acquire)
+        self.session = self.http.session
         self.session.headers.update({
             'Content-Type': 'application/json',
             'Accept': 'application/json'
         })
+        
+        # 토큰 저장소 (kis_token.json을 봇 프로세스와 공유, expires_in 반영)
+        self.token_store = get_token_store(app_key, app_secret, token_url=self.oauth_url, http=self.http)
     
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """초당 호출 한도 안에서 API 요청 전송 (REQUEST_PERMIT_TIMEOUT 안에 허가를 받지 못하면 PermitTimeout)"""
+        if not self.throttle.acquire(timeout=REQUEST_PERMIT_TIMEOUT):
+            raise PermitTimeout(f"No API permit within {REQUEST_PERMIT_TIMEOUT}s")
+        return self.http.request(method, url, **kwargs)
+
     def _get_access_token(self) -> str:
-        """액세스 토큰 발급"""
-        if self.access_token and self.token_expires_at and datetime.now() < self.token_expires_at:
-            return self.access_token
-        
+        """액세스 토큰 발급 (봇 프로세스와 공유하는 토큰 저장소 사용)"""
         try:
-            data = {
-                'grant_type': 'client_credentials',
-                'appkey': self.app_key,
-                'appsecret': self.app_secret
-            }
-            
-            response = self.session.post(self.oauth_url, json=data)
-            response.raise_for_status()
-            
-            token_data = response.json()
-            self.access_token = token_data['access_token']
-            
-            # 토큰 만료 시간 설정 (실제로는 expires_in 값을 사용해야 함)
-            self.token_expires_at = datetime.now() + timedelta(hours=23)
+            token = self.token_store.get_token()
+            self.access_token = token
+            self.token_expires_at = datetime.fromtimestamp(self.token_store.expires_at)
             
-            logger.info("액세스 토큰 발급 성공")
-            return self.access_token
+            # 첫 발급에 성공한 뒤부터 만료 전 백그라운드 갱신
+            self.token_store.start_background_refresh()
+            return token
             
         except Exception as e:
             logger.error(f"액세스 토큰 발급 실패: {e}")
@@ -96,7 +111,7 @@ class KISApiClient:
                 'CTX_AREA_NK100': ''
             }
             
-            response = self.session.get(url, headers=headers, params=params)
+            response = self._request('GET', url, headers=headers, params=params)
             response.raise_for_status()
             
             return response.json()
@@ -120,7 +135,7 @@ class KISApiClient:
                 'CTX_AREA_NK200': ''
             }
             
-            response = self.session.get(url, headers=headers, params=params)
+            response = self._request('GET', url, headers=headers, params=params)
             response.raise_for_status()
             
             return response.json()
@@ -144,7 +159,7 @@ class KISApiClient:
                 'DIVD_YN': '0'
             }
             
-            response = self.session.get(url, headers=headers, params=params)
+            response = self._request('GET', url, headers=headers, params=params)
             response.raise_for_status()
             
             return response.json()
@@ -153,6 +168,41 @@ class KISApiClient:
             logger.error(f"해외주식 현재가 조회 실패: {e}")
             raise
     
+    def get_overseas_stock_prices(self, symbols: Iterable[Union[str, Tuple[str, str]]],
+                                  exchange: str = 'NASD') -> List[Dict[str, Any]]:
+        """여러 해외주식 현재가 동시 조회 (symbol 또는 (symbol, exchange) 목록)
+
+        요청 순서대로 종목별 결과를 반환하며, 실패한 종목은 error 필드에 사유를 담습니다.
+        """
+        targets = []
+        for item in symbols:
+            if isinstance(item, (tuple, list)):
+                target = (item[0], item[1] or exchange)
+            else:
+                target = (item, exchange)
+            if target not in targets:
+                targets.append(target)
+
+        if not targets:
+            return []
+
+        # 토큰을 먼저 확보해 병렬 요청이 동시에 토큰을 발급받지 않도록 함
+        self._get_access_token()
+
+        def fetch(target):
+            symbol, excd = target
+            try:
+                data = self.get_overseas_stock_price(symbol, excd)
+                if data.get('rt_cd') not in (None, '0'):
+                    return {'symbol': symbol, 'exchange': excd, 'success': False,
+                            'error': data.get('msg1', 'Unknown error'), 'data': data}
+                return {'symbol': symbol, 'exchange': excd, 'success': True, 'data': data}
+            except Exception as e:
+                return {'symbol': symbol, 'exchange': excd, 'success': False, 'error': str(e)}
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(targets))) as executor:
+            return list(executor.map(fetch, targets))
+
     def get_overseas_stock_chart(self, symbol: str, exchange: str = 'NASD', 
                                  interval: str = 'D', period: int = 30) -> Dict[str, Any]:
         """해외주식 차트 데이터 조회"""
@@ -171,7 +221,7 @@ class KISApiClient:
                 'INQR_CNT': str(period)
             }
             
-            response = self.session.get(url, headers=headers, params=params)
+            response = self._request('GET', url, headers=headers, params=params)
             response.raise_for_status()
             
             return response.json()
@@ -209,7 +259,9 @@ class KISApiClient:
                 'ORD_DVSN_CD': '00'
             }
             
-            response = self.session.post(url, headers=headers, json=data)
+            # 주문은 조회보다 먼저 호출 한도 허가를 받음 (재시도 허가도 같은 차선)
+            with priority_scope(LANE_ORDER):
+                response = self._request('POST', url, headers=headers, json=data)
             response.raise_for_status()
             
             return response.json()
@@ -240,7 +292,7 @@ class KISApiClient:
                 'INQR_END_DT': end_date
             }
             
-            response = self.session.get(url, headers=headers, params=params)
+            response = self._request('GET', url, headers=headers, params=params)
             response.raise_for_status()
             
             return response.json()
@@ -271,7 +323,7 @@ class KISApiClient:
                 'INQR_END_DT': end_date
             }
             
-            response = self.session.get(url, headers=headers, params=params)
+            response = self._request('GET', url, headers=headers, params=params)
             response.raise_for_status()
             
             return response.json()
@@ -280,6 +332,111 @@ class KISApiClient:
             logger.error(f"체결 내역 조회 실패: {e}")
             raise
     
+    def _iter_history_pages(self, url: str, start_date: str = None, end_date: str = None,
+                            max_pages: int = None) -> Iterator[Dict[str, Any]]:
+        """연속조회 키(CTX_AREA_FK200/NK200)를 따라가며 내역 응답을 페이지 단위로 반환"""
+        if not start_date:
+            start_date = (datetime.now() - timedelta(days=30)).strftime('%Y%m%d')
+        if not end_date:
+            end_date = datetime.now().strftime('%Y%m%d')
+        
+        ctx_fk = ''
+        ctx_nk = ''
+        tr_cont = ''
+        pages = 0
+        
+        while True:
+            headers = self._get_headers()
+            # 다음 페이지 요청은 tr_cont=N
+            headers['tr_cont'] = 'N' if pages > 0 else ''
+            
+            params = {
+                'CANO': self.account_number,
+                'ACNT_PRDT_CD': self.account_code,
+                'OVRS_EXCG_CD': 'NASD',
+                'SORT_DVSN': '00',
+                'CTX_AREA_FK200': ctx_fk,
+                'CTX_AREA_NK200': ctx_nk,
+                'INQR_STRT_DT': start_date,
+                'INQR_END_DT': end_date
+            }
+            
+            response = self._request('GET', url, headers=headers, params=params)
+            response.raise_for_status()
+            data = response.json()
+            pages += 1
+            
+            yield data
+            
+            if data.get('rt_cd') != '0':
+                break
+            
+            # 응답 헤더 tr_cont가 M/F면 다음 페이지가 있음
+            tr_cont = response.headers.get('tr_cont', '')
+            ctx_fk = data.get('ctx_area_fk200', '')
+            ctx_nk = data.get('ctx_area_nk200', '')
+            if tr_cont not in ('M', 'F') or not ctx_nk.strip():
+                break
+            if max_pages and pages >= max_pages:
+                logger.warning(f"내역 조회 최대 페이지 수({max_pages}) 도달")
+                break
+    
+    @staticmethod
+    def _normalize_history_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        """내역 응답 행을 공통 필드 이름과 숫자 타입으로 정리"""
+        raw = {k.lower(): v.strip() if isinstance(v, str) else v for k, v in row.items()}
+        
+        def number(*keys):
+            for key in keys:
+                value = raw.get(key)
+                if value not in (None, ''):
+                    try:
+                        return float(value)
+                    except (TypeError, ValueError):
+                        return None
+            return None
+        
+        return {
+            'order_date': raw.get('ord_dt') or raw.get('dmst_ord_dt'),
+            'order_time': raw.get('ord_tmd'),
+            'order_no': raw.get('odno'),
+            'original_order_no': raw.get('orgn_odno'),
+            'symbol': raw.get('pdno'),
+            'name': raw.get('prdt_name'),
+            'exchange': raw.get('ovrs_excg_cd'),
+            'side': raw.get('sll_buy_dvsn_cd_name') or raw.get('sll_buy_dvsn_cd'),
+            'quantity': number('ft_ord_qty', 'ord_qty'),
+            'price': number('ft_ord_unpr3', 'ord_unpr'),
+            'filled_quantity': number('ft_ccld_qty', 'ccld_qty'),
+            'filled_price': number('ft_ccld_unpr3', 'ccld_unpr'),
+            'filled_amount': number('ft_ccld_amt3', 'ccld_amt'),
+            'currency': raw.get('tr_crcy_cd'),
+            'raw': raw
+        }
+    
+    def _iter_history_rows(self, url: str, start_date: str = None, end_date: str = None,
+                           max_pages: int = None) -> Iterator[Dict[str, Any]]:
+        for page in self._iter_history_pages(url, start_date, end_date, max_pages):
+            if page.get('rt_cd') != '0':
+                raise Exception(page.get('msg1', 'Unknown error'))
+            output = page.get('output') or []
+            if isinstance(output, dict):
+                output = [output]
+            for row in output:
+                yield self._normalize_history_row(row)
+    
+    def iter_order_history(self, start_date: str = None, end_date: str = None,
+                           max_pages: int = None) -> Iterator[Dict[str, Any]]:
+        """주문 내역 전체를 페이지를 따라가며 정리된 행 단위로 반환 (지연 평가)"""
+        url = f"{self.base_url}/uapi/overseas-stock/v1/trading-inquire/order"
+        return self._iter_history_rows(url, start_date, end_date, max_pages)
+    
+    def iter_execution_history(self, start_date: str = None, end_date: str = None,
+                               max_pages: int = None) -> Iterator[Dict[str, Any]]:
+        """체결 내역 전체를 페이지를 따라가며 정리된 행 단위로 반환 (지연 평가)"""
+        url = f"{self.base_url}/uapi/overseas-stock/v1/trading-inquire/execution"
+        return self._iter_history_rows(url, start_date, end_date, max_pages)
+    
     def test_connection(self) -> bool:
         """API 연결 테스트"""
         try:
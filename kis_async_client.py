@@ -0,0 +1,368 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Iterable, Tuple, Union
+import logging
+
+import aiohttp
+
+from kis_http import KIS_BASE_URL, REQUEST_PERMIT_TIMEOUT
+from kis_token_store import get_token_store
+from rate_limit import TokenBucket, PermitTimeout, priority_scope, LANE_ORDER
+from kis_quota import shared_quota_for_app
+
+# 로깅 설정
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class AsyncKISApiClient:
+    """한국투자증권 해외주식 API 비동기 클라이언트 (KISApiClient의 asyncio 버전)"""
+
+    def __init__(self, app_key: str, app_secret: str, account_number: str, account_code: str,
+                 max_concurrency: int = 10, connect_timeout: float = 3.05, read_timeout: float = 10.0,
+                 requests_per_second: float = 10):
+        self.app_key = app_key
+        self.app_secret = app_secret
+        self.account_number = account_number
+        self.account_code = account_code
+
+        # API 엔드포인트
+        self.base_url = KIS_BASE_URL
+        self.oauth_url = f"{KIS_BASE_URL}/oauth2/tokenP"
+
+        # 토큰 정보 (kis_token.json을 봇 프로세스, KISApiClient와 공유)
+        self.access_token = None
+        self.token_expires_at = None
+        self.token_store = get_token_store(app_key, app_secret, token_url=self.oauth_url)
+
+        # 동시 요청 수와 초당 호출 한도
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.throttle = TokenBucket(requests_per_second, shared=shared_quota_for_app(
+            app_key, app_secret, 'api', requests_per_second, label='web-async'))
+
+        self._timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+
+        # 세션은 이벤트 루프 안에서 처음 요청할 때 생성
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        await self._get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.max_concurrency)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self._timeout,
+                headers={
+                    'Content-Type': 'application/json',
+                    'Accept': 'application/json'
+                }
+            )
+        return self.session
+
+    async def close(self):
+        """세션 종료"""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def _get_access_token(self) -> str:
+        """액세스 토큰 발급 (KISApiClient와 같은 공유 토큰 저장소 사용)"""
+        token = self.token_store.cached_token()
+        if token:
+            return token
+
+        try:
+            # 파일 락과 OAuth 요청은 블로킹이므로 이벤트 루프 밖에서 실행
+            token = await asyncio.to_thread(self.token_store.get_token)
+            self.access_token = token
+            self.token_expires_at = datetime.fromtimestamp(self.token_store.expires_at)
+            self.token_store.start_background_refresh()
+            return token
+
+        except Exception as e:
+            logger.error(f"액세스 토큰 발급 실패: {e}")
+            raise
+
+    async def _get_headers(self) -> Dict[str, str]:
+        """API 요청 헤더 생성"""
+        token = await self._get_access_token()
+        return {
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'authorization': f'Bearer {token}',
+            'appkey': self.app_key,
+            'appsecret': self.app_secret,
+            'tr_id': 'TTTS3012R'  # 기본 거래 ID
+        }
+
+    async def _request(self, method: str, url: str, headers: Dict[str, str],
+                       params: Dict[str, str] = None, json_body: Dict[str, Any] = None) -> Dict[str, Any]:
+        """동시 요청 수와 초당 호출 한도 안에서 API 호출 (REQUEST_PERMIT_TIMEOUT 안에 허가를 받지 못하면 PermitTimeout)"""
+        session = await self._get_session()
+        if not await self.throttle.acquire_async(timeout=REQUEST_PERMIT_TIMEOUT):
+            raise PermitTimeout(f"No API permit within {REQUEST_PERMIT_TIMEOUT}s")
+        async with self._semaphore:
+            async with session.request(method, url, headers=headers, params=params, json=json_body) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+
+    async def get_account_info(self) -> Dict[str, Any]:
+        """계좌 정보 조회"""
+        try:
+            url = f"{self.base_url}/uapi/domestic-stock/v1/trading-inquire/balance"
+            headers = await self._get_headers()
+
+            params = {
+                'CANO': self.account_number,
+                'ACNT_PRDT_CD': self.account_code,
+                'AFHR_FLPR_YN': 'N',
+                'OFL_YN': '',
+                'INQR_DVSN': '02',
+                'UNPR_DVSN': '01',
+                'FUND_STTL_ICLD_YN': 'N',
+                'FNCG_AMT_AUTO_RDPT_YN': 'N',
+                'PRCS_DVSN': '01',
+                'CTX_AREA_FK100': '',
+                'CTX_AREA_NK100': ''
+            }
+
+            return await self._request('GET', url, headers, params=params)
+
+        except Exception as e:
+            logger.error(f"계좌 정보 조회 실패: {e}")
+            raise
+
+    async def get_overseas_stock_balance(self) -> Dict[str, Any]:
+        """해외주식 잔고 조회"""
+        try:
+            url = f"{self.base_url}/uapi/overseas-stock/v1/trading-inquire/balance"
+            headers = await self._get_headers()
+
+            params = {
+                'CANO': self.account_number,
+                'ACNT_PRDT_CD': self.account_code,
+                'OVRS_EXCG_CD': 'NASD',  # 나스닥 기준
+                'TR_CRCY_CD': 'USD',
+                'CTX_AREA_FK200': '',
+                'CTX_AREA_NK200': ''
+            }
+
+            return await self._request('GET', url, headers, params=params)
+
+        except Exception as e:
+            logger.error(f"해외주식 잔고 조회 실패: {e}")
+            raise
+
+    async def get_overseas_stock_price(self, symbol: str, exchange: str = 'NASD') -> Dict[str, Any]:
+        """해외주식 현재가 조회"""
+        try:
+            url = f"{self.base_url}/uapi/overseas-price/v1/quotations/price"
+            headers = await self._get_headers()
+
+            params = {
+                'AUTH': '',
+                'EXCD': exchange,
+                'SYMB': symbol,
+                'OVRS_EXCG_CD': exchange,
+                'GUBN': '0',
+                'DIVD_YN': '0'
+            }
+
+            return await self._request('GET', url, headers, params=params)
+
+        except Exception as e:
+            logger.error(f"해외주식 현재가 조회 실패: {e}")
+            raise
+
+    async def gather_prices(self, symbols: Iterable[Union[str, Tuple[str, str]]],
+                            exchange: str = 'NASD') -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """여러 종목 현재가 동시 조회 (symbol 또는 (symbol, exchange) 목록)
+
+        (거래소, 종목)별 결과를 {'data': ...} 또는 {'error': ...} 형태로 반환합니다.
+        같은 종목이 여러 거래소에 있어도 결과가 서로 덮어쓰지 않습니다.
+        """
+        targets = []
+        for item in symbols:
+            if isinstance(item, (tuple, list)):
+                target = (item[0], item[1] or exchange)
+            else:
+                target = (item, exchange)
+            if target not in targets:
+                targets.append(target)
+
+        # 토큰을 먼저 확보해 동시 요청이 토큰 발급을 기다리지 않도록 함
+        await self._get_access_token()
+
+        results = await asyncio.gather(
+            *(self.get_overseas_stock_price(symbol, excd) for symbol, excd in targets),
+            return_exceptions=True
+        )
+
+        prices = {}
+        for (symbol, excd), result in zip(targets, results):
+            if isinstance(result, Exception):
+                prices[(excd, symbol)] = {'error': str(result)}
+            else:
+                prices[(excd, symbol)] = {'data': result}
+        return prices
+
+    async def get_overseas_stock_chart(self, symbol: str, exchange: str = 'NASD',
+                                       interval: str = 'D', period: int = 30) -> Dict[str, Any]:
+        """해외주식 차트 데이터 조회"""
+        try:
+            url = f"{self.base_url}/uapi/overseas-price/v1/quotations/inquire-daily-chartprice"
+            headers = await self._get_headers()
+
+            params = {
+                'AUTH': '',
+                'EXCD': exchange,
+                'SYMB': symbol,
+                'OVRS_EXCG_CD': exchange,
+                'GUBN': '0',
+                'DIVD_YN': '0',
+                'INQR_DVSN': interval,
+                'INQR_CNT': str(period)
+            }
+
+            return await self._request('GET', url, headers, params=params)
+
+        except Exception as e:
+            logger.error(f"해외주식 차트 데이터 조회 실패: {e}")
+            raise
+
+    async def place_overseas_stock_order(self, symbol: str, exchange: str, order_type: str,
+                                         quantity: int, price: float, order_side: str) -> Dict[str, Any]:
+        """해외주식 주문 전송"""
+        try:
+            url = f"{self.base_url}/uapi/overseas-stock/v1/trading/order"
+            headers = await self._get_headers()
+
+            # 주문 타입에 따른 TR ID 설정
+            if order_side == 'BUY':
+                tr_id = 'JTTT1002U' if order_type == 'MARKET' else 'JTTT1001U'
+            else:  # SELL
+                tr_id = 'JTTT1006U' if order_type == 'MARKET' else 'JTTT1005U'
+
+            headers['tr_id'] = tr_id
+
+            data = {
+                'CANO': self.account_number,
+                'ACNT_PRDT_CD': self.account_code,
+                'OVRS_EXCG_CD': exchange,
+                'PDNO': symbol,
+                'OVRS_ORD_UNPR': str(price),
+                'OVRS_ORD_DVSN': '00' if order_type == 'MARKET' else '01',
+                'ORD_DVSN': '00' if order_type == 'MARKET' else '01',
+                'ORD_QTY': str(quantity),
+                'OVRS_ORD_UNPR_UNIT': 'USD',
+                'ORD_SORT_DVSN': '00',
+                'ORD_DVSN_CD': '00'
+            }
+
+            # 주문은 조회보다 먼저 호출 한도 허가를 받음
+            with priority_scope(LANE_ORDER):
+                return await self._request('POST', url, headers, json_body=data)
+
+        except Exception as e:
+            logger.error(f"해외주식 주문 전송 실패: {e}")
+            raise
+
+    async def get_order_history(self, start_date: str = None, end_date: str = None) -> Dict[str, Any]:
+        """주문 내역 조회"""
+        try:
+            url = f"{self.base_url}/uapi/overseas-stock/v1/trading-inquire/order"
+            headers = await self._get_headers()
+
+            if not start_date:
+                start_date = (datetime.now() - timedelta(days=30)).strftime('%Y%m%d')
+            if not end_date:
+                end_date = datetime.now().strftime('%Y%m%d')
+
+            params = {
+                'CANO': self.account_number,
+                'ACNT_PRDT_CD': self.account_code,
+                'OVRS_EXCG_CD': 'NASD',
+                'SORT_DVSN': '00',
+                'CTX_AREA_FK200': '',
+                'CTX_AREA_NK200': '',
+                'INQR_STRT_DT': start_date,
+                'INQR_END_DT': end_date
+            }
+
+            return await self._request('GET', url, headers, params=params)
+
+        except Exception as e:
+            logger.error(f"주문 내역 조회 실패: {e}")
+            raise
+
+    async def get_execution_history(self, start_date: str = None, end_date: str = None) -> Dict[str, Any]:
+        """체결 내역 조회"""
+        try:
+            url = f"{self.base_url}/uapi/overseas-stock/v1/trading-inquire/execution"
+            headers = await self._get_headers()
+
+            if not start_date:
+                start_date = (datetime.now() - timedelta(days=30)).strftime('%Y%m%d')
+            if not end_date:
+                end_date = datetime.now().strftime('%Y%m%d')
+
+            params = {
+                'CANO': self.account_number,
+                'ACNT_PRDT_CD': self.account_code,
+                'OVRS_EXCG_CD': 'NASD',
+                'SORT_DVSN': '00',
+                'CTX_AREA_FK200': '',
+                'CTX_AREA_NK200': '',
+                'INQR_STRT_DT': start_date,
+                'INQR_END_DT': end_date
+            }
+
+            return await self._request('GET', url, headers, params=params)
+
+        except Exception as e:
+            logger.error(f"체결 내역 조회 실패: {e}")
+            raise
+
+    async def test_connection(self) -> bool:
+        """API 연결 테스트"""
+        try:
+            await self._get_access_token()
+            account_info = await self.get_account_info()
+
+            if account_info.get('rt_cd') == '0':
+                logger.info("한국투자증권 API 연결 테스트 성공")
+                return True
+            else:
+                logger.error(f"API 연결 테스트 실패: {account_info.get('msg1')}")
+                return False
+
+        except Exception as e:
+            logger.error(f"API 연결 테스트 실패: {e}")
+            return False
+
+
+# 사용 예시
+if __name__ == "__main__":
+    APP_KEY = "your_app_key"
+    APP_SECRET = "your_app_secret"
+    ACCOUNT_NUMBER = "your_account_number"
+    ACCOUNT_CODE = "01"
+
+    async def main():
+        async with AsyncKISApiClient(APP_KEY, APP_SECRET, ACCOUNT_NUMBER, ACCOUNT_CODE) as client:
+            prices = await client.gather_prices(["AAPL", "MSFT", "NVDA"])
+            for (excd, symbol), result in prices.items():
+                print(f"관심종목 현재가 {excd}:{symbol}:", json.dumps(result, indent=2, ensure_ascii=False))
+
+    try:
+        asyncio.run(main())
+    except Exception as e:
+        print(f"오류 발생: {e}")
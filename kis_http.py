@@ -0,0 +1,549 @@
+import os
+import threading
+import time
+import logging
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from circuit_breaker import CircuitBreakerRegistry, is_kis_throttle
+from kis_transport import adapter_from_env
+
+# 로깅 설정
+logger = logging.getLogger(__name__)
+
+# 한국투자증권 API 호스트 (KIS_BASE_URL로 로컬 대역 서버 등을 지정 가능)
+KIS_BASE_URL = os.getenv("KIS_BASE_URL", "https://openapi.koreainvestment.com:9443").rstrip('/')
+
+# 기본 타임아웃 (연결, 읽기) - 초 단위
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10.0
+
+# 재시도 대기 (지수 백오프 시작값, 최대값)
+RETRY_BACKOFF_BASE = 0.2
+RETRY_BACKOFF_MAX = 2.0
+
+# 헤지 요청: 엔드포인트별 지연 시간 표본이 이만큼 쌓인 뒤 p95 지연을 기준으로 보냄
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 0.05
+
+# 재시도 전 호출 한도 허가를 기다리는 최대 시간 (초, 마감 시간이 더 짧으면 그만큼만)
+RETRY_PERMIT_TIMEOUT = 5.0
+# 첫 요청 전 호출 한도 허가를 기다리는 최대 시간 (초, 넘으면 PermitTimeout)
+REQUEST_PERMIT_TIMEOUT = 10.0
+
+TimeoutType = Union[float, Tuple[float, float]]
+
+
+class DeadlineExceeded(requests.Timeout):
+    """현재 작업(거래 사이클 등)의 마감 시간이 지나 요청을 보내지 않음"""
+
+
+class Deadline:
+    """절대 마감 시각 (time.monotonic 기준)"""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+_current_deadline: contextvars.ContextVar = contextvars.ContextVar('kis_deadline', default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """현재 컨텍스트의 마감 시간 (없으면 None)"""
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(seconds: float):
+    """블록 안의 모든 KIS 요청에 마감 시간 적용 (바깥 마감이 더 빠르면 그대로 유지)"""
+    outer = _current_deadline.get()
+    deadline = Deadline(seconds)
+    if outer is not None and outer.expires_at < deadline.expires_at:
+        deadline = outer
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """현재 컨텍스트(마감 시간 포함)를 복사해 작업 스레드에서 실행"""
+    ctx = contextvars.copy_context()
+    return executor.submit(ctx.run, fn, *args, **kwargs)
+
+
+class RetryBudget:
+    """엔드포인트별 재시도 예산 (최근 window초 요청 수의 ratio 비율까지만 재시도 허용)"""
+
+    def __init__(self, ratio: float = 0.1, min_retries: int = 3, window: float = 10.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._lock = threading.Lock()
+        self._requests: Dict[str, deque] = {}
+        self._retries: Dict[str, deque] = {}
+        self._denied: Dict[str, int] = {}
+
+    def _prune(self, events: deque, now: float):
+        while events and now - events[0] > self.window:
+            events.popleft()
+
+    def record_request(self, endpoint: str):
+        now = time.monotonic()
+        with self._lock:
+            events = self._requests.setdefault(endpoint, deque())
+            events.append(now)
+            self._prune(events, now)
+
+    def try_acquire(self, endpoint: str) -> bool:
+        """재시도 가능하면 예산을 차감하고 True"""
+        now = time.monotonic()
+        with self._lock:
+            requests_ = self._requests.setdefault(endpoint, deque())
+            retries = self._retries.setdefault(endpoint, deque())
+            self._prune(requests_, now)
+            self._prune(retries, now)
+            allowed = max(self.min_retries, int(len(requests_) * self.ratio))
+            if len(retries) >= allowed:
+                self._denied[endpoint] = self._denied.get(endpoint, 0) + 1
+                return False
+            retries.append(now)
+            return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            stats = {}
+            for endpoint, events in self._requests.items():
+                self._prune(events, now)
+                retries = self._retries.get(endpoint, deque())
+                self._prune(retries, now)
+                stats[endpoint] = {
+                    'recent_requests': len(events),
+                    'recent_retries': len(retries),
+                    'denied': self._denied.get(endpoint, 0)
+                }
+            return stats
+
+
+class LatencyTracker:
+    """엔드포인트별 최근 응답 지연 시간 (p50/p95)"""
+
+    def __init__(self, maxlen: int = 200):
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+        self.maxlen = maxlen
+
+    def record(self, endpoint: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(endpoint, deque(maxlen=self.maxlen)).append(seconds)
+
+    def percentile(self, endpoint: str, pct: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            samples = list(self._samples.get(endpoint, ()))
+        if len(samples) < min_samples:
+            return None
+        samples.sort()
+        index = min(int(len(samples) * pct), len(samples) - 1)
+        return samples[index]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = list(self._samples.keys())
+        return {
+            endpoint: {
+                'p50': self.percentile(endpoint, 0.5),
+                'p95': self.percentile(endpoint, 0.95)
+            }
+            for endpoint in endpoints
+        }
+
+
+def _close_response(future):
+    """헤지 경쟁에서 진 응답의 연결을 풀에 반환"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class KISHttpPool:
+    """한국투자증권 API 호출용 keep-alive 연결 풀 (스레드 안전)"""
+
+    def __init__(self, pool_maxsize: int = 10, pool_connections: int = 4,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 pool_block: bool = True):
+        # pool_connections: 호스트별 풀 개수, pool_maxsize: 호스트당 최대 연결 수
+        self.pool_maxsize = pool_maxsize
+        self.timeout = (connect_timeout, read_timeout)
+
+        # 재시도는 호출부(tenacity 등)에서 처리하므로 어댑터 재시도는 끔
+        # KIS_HTTP_MODE=record|replay면 응답을 기록/재생하는 어댑터 사용
+        adapter_kwargs = dict(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            max_retries=0
+        )
+        self._adapter = adapter_from_env(**adapter_kwargs) or HTTPAdapter(**adapter_kwargs)
+
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        self.session.headers.update({'Connection': 'keep-alive'})
+
+        self._lock = threading.Lock()
+        self._request_count = 0
+        self._error_count = 0
+        self._retry_count = 0
+        self._hedge_count = 0
+        self._hedge_wins = 0
+        self._deadline_exceeded = 0
+        self._permit_denied = 0
+
+        self.retry_budget = RetryBudget()
+        self.latency = LatencyTracker()
+        self.breakers = CircuitBreakerRegistry()
+        # 응답마다 호출되는 (url, response, elapsed) 콜백 (적응형 호출 한도 등)
+        self._response_listeners = []
+        # 재시도/헤지 요청 전에 호출하는 acquire(timeout=...) -> bool (호출 한도 토큰 버킷 등)
+        self._permit_source = None
+        self._hedge_executor = None
+
+    def _effective_timeout(self, timeout: Optional[TimeoutType]) -> Tuple[float, float]:
+        """기본/지정 타임아웃을 현재 마감 시간 안으로 줄임"""
+        timeout = timeout or self.timeout
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+
+        deadline = current_deadline()
+        if deadline is not None:
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                with self._lock:
+                    self._deadline_exceeded += 1
+                raise DeadlineExceeded("KIS request deadline exceeded")
+            connect = min(connect, remaining)
+            read = min(read, remaining)
+        return connect, read
+
+    def _send(self, method: str, url: str, timeout: Tuple[float, float], **kwargs) -> requests.Response:
+        with self._lock:
+            self._request_count += 1
+        try:
+            return self.session.request(method, url, timeout=timeout, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                self._error_count += 1
+            raise
+
+    def _get_hedge_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(max_workers=self.pool_maxsize,
+                                                          thread_name_prefix="kis-hedge")
+            return self._hedge_executor
+
+    def _hedged_send(self, endpoint: str, method: str, url: str, timeout: Tuple[float, float],
+                     **kwargs) -> requests.Response:
+        """p95 지연 안에 응답이 없으면 같은 요청을 한 번 더 보내 먼저 온 응답 사용"""
+        p95 = self.latency.percentile(endpoint, 0.95, min_samples=HEDGE_MIN_SAMPLES)
+        if p95 is None:
+            return self._send(method, url, timeout, **kwargs)
+
+        executor = self._get_hedge_executor()
+        primary = executor.submit(self._send, method, url, timeout, **kwargs)
+        done, _ = wait([primary], timeout=max(p95, HEDGE_MIN_DELAY))
+        if done:
+            return primary.result()
+
+        # 헤지도 호출 한도를 쓰므로 토큰이 바로 있을 때만 보냄
+        if not self._take_permit(0):
+            return primary.result()
+        with self._lock:
+            self._hedge_count += 1
+        hedge = executor.submit(self._send, method, url, timeout, **kwargs)
+        futures = [primary, hedge]
+
+        first_error = None
+        for future in as_completed(futures):
+            try:
+                response = future.result()
+            except Exception as e:
+                first_error = first_error or e
+                continue
+            for other in futures:
+                if other is not future:
+                    other.add_done_callback(_close_response)
+            if future is hedge:
+                with self._lock:
+                    self._hedge_wins += 1
+            return response
+        raise first_error
+
+    def request(self, method: str, url: str, timeout: Optional[TimeoutType] = None,
+                retries: int = 0, hedge: bool = False, **kwargs) -> requests.Response:
+        """연결 풀을 통해 HTTP 요청 전송
+
+        현재 마감 시간(deadline_scope) 안으로 타임아웃을 줄이고, 연결 오류/타임아웃/5xx는
+        엔드포인트 재시도 예산이 남아 있을 때만 최대 retries번 재시도합니다.
+        hedge=True면 조회성 GET 요청을 p95 지연 뒤 한 번 더 보냅니다.
+        """
+        endpoint = urlparse(url).path
+        # 엔드포인트 묶음 차단기가 열려 있으면 네트워크에 나가지 않고 바로 CircuitOpenError
+        breaker = self.breakers.for_url(url)
+        breaker.before_call()
+
+        started = time.monotonic()
+        try:
+            response = self._request_with_retries(endpoint, method, url, timeout, retries, hedge, **kwargs)
+        except DeadlineExceeded:
+            breaker.release()
+            raise
+        except requests.RequestException:
+            breaker.record_failure(time.monotonic() - started)
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+
+        elapsed = time.monotonic() - started
+        if response.status_code >= 500 and not is_kis_throttle(response):
+            breaker.record_failure(elapsed)
+        else:
+            breaker.record_success(elapsed)
+
+        for listener in self._response_listeners:
+            try:
+                listener(url, response, elapsed)
+            except Exception as e:
+                logger.error(f"Response listener failed: {e}")
+        return response
+
+    def add_response_listener(self, listener):
+        """최종 응답마다 listener(url, response, elapsed) 호출"""
+        self._response_listeners.append(listener)
+
+    def set_permit_source(self, acquire):
+        """재시도/헤지 요청마다 acquire(timeout=...)로 호출 한도 허가를 받음 (False면 보내지 않음)"""
+        self._permit_source = acquire
+
+    def _take_permit(self, timeout: float) -> bool:
+        if self._permit_source is None:
+            return True
+        deadline = current_deadline()
+        if deadline is not None:
+            timeout = min(timeout, max(deadline.remaining(), 0))
+        if self._permit_source(timeout=timeout):
+            return True
+        with self._lock:
+            self._permit_denied += 1
+        return False
+
+    def _request_with_retries(self, endpoint: str, method: str, url: str, timeout: Optional[TimeoutType],
+                              retries: int, hedge: bool, **kwargs) -> requests.Response:
+        self.retry_budget.record_request(endpoint)
+        attempt = 0
+
+        while True:
+            effective_timeout = self._effective_timeout(timeout)
+            started = time.monotonic()
+            response = error = None
+            try:
+                if hedge and method.upper() == 'GET':
+                    response = self._hedged_send(endpoint, method, url, effective_timeout, **kwargs)
+                else:
+                    response = self._send(method, url, effective_timeout, **kwargs)
+                self.latency.record(endpoint, time.monotonic() - started)
+
+                # 초당 거래건수 초과(EGW00201)는 HTTP 500으로 오지만 다시 보내면 한도만 더 넘기므로 재시도하지 않음
+                if response.status_code < 500 or is_kis_throttle(response) or \
+                        not self._should_retry(endpoint, attempt, retries):
+                    return response
+            except DeadlineExceeded:
+                raise
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not self._should_retry(endpoint, attempt, retries):
+                    raise
+                error = e
+
+            attempt += 1
+            self._backoff(attempt)
+            # 재시도도 호출 한도 토큰을 하나 씀 (받지 못하면 마지막 결과로 끝냄)
+            if not self._take_permit(RETRY_PERMIT_TIMEOUT):
+                if error is not None:
+                    raise error
+                return response
+            if response is not None:
+                response.close()
+
+    def _should_retry(self, endpoint: str, attempt: int, retries: int) -> bool:
+        if attempt >= retries:
+            return False
+        deadline = current_deadline()
+        if deadline is not None and deadline.remaining() <= RETRY_BACKOFF_BASE:
+            return False
+        if not self.retry_budget.try_acquire(endpoint):
+            logger.warning(f"Retry budget exhausted for {endpoint}")
+            return False
+        with self._lock:
+            self._retry_count += 1
+        return True
+
+    @staticmethod
+    def _backoff(attempt: int):
+        delay = min(RETRY_BACKOFF_BASE * (2 ** (attempt - 1)), RETRY_BACKOFF_MAX)
+        deadline = current_deadline()
+        if deadline is not None:
+            delay = min(delay, max(deadline.remaining(), 0))
+        time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """연결 풀 통계 (연결 재사용률, 열린 연결 수 등)"""
+        hosts = {}
+        total_requests = 0
+        total_connections = 0
+        open_connections = 0
+
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+
+            # 대기열에 남아있는 유휴 연결과 현재 사용 중인 연결
+            queue = getattr(pool, 'pool', None)
+            idle = 0
+            in_use = 0
+            if queue is not None:
+                idle = sum(1 for conn in list(queue.queue)
+                           if conn is not None and getattr(conn, 'sock', None) is not None)
+                in_use = max(self.pool_maxsize - queue.qsize(), 0)
+
+            host_open = idle + in_use
+            open_connections += host_open
+            total_requests += pool.num_requests
+            total_connections += pool.num_connections
+
+            hosts[f"{pool.host}:{pool.port}"] = {
+                'requests': pool.num_requests,
+                'connections_created': pool.num_connections,
+                'open_connections': host_open,
+                'idle_connections': idle,
+                'in_use_connections': in_use
+            }
+
+        reuse_ratio = 0.0
+        if total_requests > 0:
+            reuse_ratio = max(total_requests - total_connections, 0) / total_requests
+
+        with self._lock:
+            request_count = self._request_count
+            error_count = self._error_count
+            counters = {
+                'retries': self._retry_count,
+                'hedges': self._hedge_count,
+                'hedge_wins': self._hedge_wins,
+                'deadline_exceeded': self._deadline_exceeded,
+                'permit_denied': self._permit_denied
+            }
+
+        return {
+            'requests': request_count,
+            'errors': error_count,
+            **counters,
+            'latency': self.latency.get_stats(),
+            'retry_budget': self.retry_budget.get_stats(),
+            'circuit_breakers': self.breakers.get_status(),
+            'connections_created': total_connections,
+            'open_connections': open_connections,
+            'reuse_ratio': reuse_ratio,
+            'pool_maxsize': self.pool_maxsize,
+            'hosts': hosts
+        }
+
+    def close(self):
+        """풀에 열린 모든 연결 종료"""
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False)
+        self.session.close()
+
+
+class _FlightCall:
+    """진행 중인 단일 요청 상태"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """같은 키로 동시에 들어온 호출을 하나의 실제 요청으로 합쳐 결과를 공유"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, _FlightCall] = {}
+        self._executed = 0
+        self._shared = 0
+
+    def do(self, key: Any, fn, *args, **kwargs):
+        """key에 대해 진행 중인 요청이 있으면 그 결과를 기다리고, 없으면 fn을 실행"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._shared += 1
+                leader = False
+            else:
+                call = _FlightCall()
+                self._calls[key] = call
+                self._executed += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """실행된 요청 수와 공유된(합쳐진) 호출 수"""
+        with self._lock:
+            total = self._executed + self._shared
+            return {
+                'executed': self._executed,
+                'shared': self._shared,
+                'in_flight': len(self._calls),
+                'shared_ratio': self._shared / total if total else 0.0
+            }
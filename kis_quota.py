@@ -0,0 +1,182 @@
+import os
+import sys
+import json
+import time
+import logging
+from typing import Dict, Any, Callable, Optional, Tuple
+
+from kis_token_store import file_lock, app_key_id
+
+# 로깅 설정
+logger = logging.getLogger(__name__)
+
+# 같은 호스트의 봇 프로세스와 Flask 서버가 함께 쓰는 호출 한도 파일 (실행 디렉토리 기준)
+QUOTA_FILE = os.getenv("KIS_QUOTA_FILE", "kis_quota.json")
+
+# 사용률 계산 구간과 기록 보관 기간 (초)
+UTILIZATION_WINDOW = 10
+HISTORY_SECONDS = 60
+# 이 시간 동안 호출이 없는 프로세스는 목록에서 제거
+PROCESS_IDLE_SECONDS = 120
+
+# 적응형 조절로 올릴 수 있는 API 초당 한도 상한 (앱키를 함께 쓰는 모든 프로세스에 공통,
+# 실전 계좌 기준 초당 20건 아래로 유지)
+KIS_API_MAX_RATE = float(os.getenv("KIS_API_MAX_RATE", "18"))
+
+
+def _read_state(path: str) -> Dict[str, Any]:
+    try:
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict) and 'buckets' in data:
+                return data
+    except (OSError, ValueError) as e:
+        logger.warning(f"Quota file load failed, resetting: {e}")
+    return {'buckets': {}}
+
+
+def _write_state(path: str, data: Dict[str, Any]):
+    """임시 파일에 쓴 뒤 교체해 락 없이 읽는 쪽(대시보드)도 온전한 파일을 읽도록 함"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _summarize(entry: Dict[str, Any], now: float) -> Dict[str, Any]:
+    """버킷 상태를 대시보드용 사용률 요약으로 변환"""
+    history = entry.get('history', {})
+    recent = sum(count for second, count in history.items()
+                 if now - int(second) < UTILIZATION_WINDOW)
+    rate = entry.get('rate', 0) or 0
+    tokens = min(entry.get('capacity', 0),
+                 entry.get('tokens', 0) + max(now - entry.get('updated', now), 0) * rate)
+    return {
+        'rate': rate,
+        'max_rate': entry.get('max_rate', rate),
+        'capacity': entry.get('capacity', 0),
+        'tokens': round(tokens, 3),
+        'calls_per_second': recent / UTILIZATION_WINDOW,
+        'utilization': min(recent / (rate * UTILIZATION_WINDOW), 1.0) if rate else 0.0,
+        'processes': {
+            pid: {'label': info.get('label'), 'granted': info.get('granted', 0)}
+            for pid, info in entry.get('processes', {}).items()
+            if now - info.get('last_seen', 0) < PROCESS_IDLE_SECONDS
+        }
+    }
+
+
+class SharedQuota:
+    """호스트의 모든 프로세스가 하나의 토큰 버킷을 나눠 쓰도록 잠긴 파일에 상태를 저장
+
+    TokenBucket(shared=...)에 연결하면 프로세스 안의 우선순위/순서는 TokenBucket이,
+    프로세스 간 전체 한도는 이 파일이 맡습니다.
+    """
+
+    def __init__(self, key: str, rate: float, capacity: float = None,
+                 path: str = QUOTA_FILE, label: str = None, max_rate: float = None):
+        self.key = key
+        self.rate = float(rate)
+        # 파일에 버킷이 없을 때만 쓰이는 상한 (이후에는 파일에 저장된 상한을 모두가 따름)
+        self.max_rate = float(max_rate if max_rate is not None else rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self.path = path
+        self.lock_file = f"{path}.lock"
+        self.label = label or (os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else 'python')
+        self.pid = str(os.getpid())
+
+    def _entry(self, data: Dict[str, Any], now: float) -> Dict[str, Any]:
+        entry = data['buckets'].get(self.key)
+        if entry is None:
+            entry = {'rate': self.rate, 'max_rate': self.max_rate, 'capacity': self.capacity,
+                     'tokens': self.capacity, 'updated': now, 'history': {}, 'processes': {}}
+            data['buckets'][self.key] = entry
+        entry.setdefault('max_rate', max(entry['rate'], self.max_rate))
+        # 한도는 가장 최근에 설정한 프로세스 기준 (set_rate)
+        if now > entry['updated']:
+            entry['tokens'] = min(entry['capacity'], entry['tokens'] + (now - entry['updated']) * entry['rate'])
+            entry['updated'] = now
+        return entry
+
+    def try_take(self, permits: float, reserve: float = 0.0) -> float:
+        """남길 토큰(reserve)을 빼고도 충분하면 차감하고 0, 아니면 토큰이 찰 때까지 남은 시간 반환"""
+        now = time.time()
+        with file_lock(self.lock_file):
+            data = _read_state(self.path)
+            entry = self._entry(data, now)
+            needed = permits + reserve * entry['capacity'] / self.capacity
+            if entry['tokens'] < needed:
+                return (needed - entry['tokens']) / entry['rate']
+
+            entry['tokens'] -= permits
+            second = str(int(now))
+            history = {s: c for s, c in entry['history'].items() if now - int(s) < HISTORY_SECONDS}
+            history[second] = history.get(second, 0) + permits
+            entry['history'] = history
+
+            process = entry['processes'].setdefault(self.pid, {'label': self.label, 'granted': 0})
+            process['granted'] += permits
+            process['last_seen'] = now
+            entry['processes'] = {pid: info for pid, info in entry['processes'].items()
+                                  if now - info.get('last_seen', 0) < PROCESS_IDLE_SECONDS}
+            _write_state(self.path, data)
+            return 0.0
+
+    def tokens(self) -> float:
+        now = time.time()
+        with file_lock(self.lock_file):
+            return self._entry(_read_state(self.path), now)['tokens']
+
+    def set_rate(self, rate: float):
+        """모든 프로세스에 적용되는 초당 한도 변경"""
+        now = time.time()
+        with file_lock(self.lock_file):
+            data = _read_state(self.path)
+            entry = self._entry(data, now)
+            entry['rate'] = float(rate)
+            _write_state(self.path, data)
+        self.rate = float(rate)
+
+    def adjust_rate(self, update: Callable[[float], Optional[float]],
+                    min_rate: float = 0.0) -> Tuple[float, float]:
+        """파일 락 안에서 현재 공용 한도를 읽어 update(rate)로 바꾸고 (이전, 새) 한도 반환
+
+        여러 프로세스의 조절기가 각자 본 값이 아니라 항상 최신 공용 값에서 계산하도록 하며,
+        결과는 min_rate와 파일에 저장된 상한(max_rate) 사이로 제한합니다. update가 None이면 그대로 둡니다.
+        """
+        now = time.time()
+        with file_lock(self.lock_file):
+            data = _read_state(self.path)
+            entry = self._entry(data, now)
+            rate = entry['rate']
+            new_rate = update(rate)
+            if new_rate is not None:
+                new_rate = min(max(new_rate, min_rate), entry['max_rate'])
+            if new_rate is None or new_rate == rate:
+                self.rate = rate
+                return rate, rate
+            entry['rate'] = float(new_rate)
+            _write_state(self.path, data)
+        self.rate = float(new_rate)
+        return rate, self.rate
+
+    def get_status(self) -> Dict[str, Any]:
+        data = _read_state(self.path)
+        entry = data['buckets'].get(self.key)
+        return _summarize(entry, time.time()) if entry else {}
+
+
+def shared_quota_for_app(app_key: str, app_secret: str, name: str, rate: float,
+                         capacity: float = None, label: str = None,
+                         path: str = QUOTA_FILE, max_rate: float = None) -> SharedQuota:
+    """앱키별 공용 호출 한도 (같은 앱키를 쓰는 봇과 Flask 서버가 같은 버킷 사용)"""
+    return SharedQuota(f"{app_key_id(app_key, app_secret)}:{name}", rate,
+                       capacity=capacity, path=path, label=label, max_rate=max_rate)
+
+
+def read_quota_status(path: str = QUOTA_FILE) -> Dict[str, Any]:
+    """대시보드용: 파일에 있는 모든 버킷의 현재 사용률 (락 없이 읽음)"""
+    now = time.time()
+    data = _read_state(path)
+    return {key: _summarize(entry, now) for key, entry in data['buckets'].items()}
@@ -0,0 +1,343 @@
+"""한국투자증권 API 로컬 대역 서버
+
+실제 계좌 없이 봇(Auto-ganggang.py)과 Flask 서버(KISApiClient)를 실행해 보기 위한 서버입니다.
+KIS_BASE_URL=http://127.0.0.1:9443 으로 지정하면 현재가, 일봉, 잔고, 주문, 주문/체결 내역 요청을
+이 서버가 받습니다. 응답 지연과 초당 거래건수 초과(EGW00201) 오류를 설정할 수 있습니다.
+
+    python kis_stub_server.py --port 9443 --latency-ms 80 --jitter-ms 40 --throttle-rate 0.05 --rps-limit 20
+"""
+import argparse
+import hashlib
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Any, List
+import logging
+
+from flask import Flask, request, jsonify
+
+# 로깅 설정
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 실제 KIS가 초당 호출 한도를 넘었을 때 돌려주는 오류
+THROTTLE_MSG_CD = "EGW00201"
+THROTTLE_MSG = "초당 거래건수를 초과하였습니다."
+
+DEFAULT_CONFIG = {
+    'latency_ms': 0.0,        # 기본 응답 지연
+    'jitter_ms': 0.0,         # 지연 편차 (0 ~ jitter_ms 추가)
+    'throttle_rate': 0.0,     # 무작위로 EGW00201을 돌려줄 확률
+    'rps_limit': 0,           # 초당 요청 한도 (0이면 제한 없음)
+    'page_size': 20,          # 내역 조회 한 페이지 행 수
+    'initial_cash': 100000.0, # 예수금 (USD)
+    'history_days': 120,      # 일봉 개수
+    'seed': 42                # 시세 생성 시드
+}
+
+app = Flask(__name__)
+
+_lock = threading.Lock()
+config: Dict[str, Any] = dict(DEFAULT_CONFIG)
+state: Dict[str, Any] = {}
+stats: Dict[str, int] = {}
+_recent_requests = deque()
+
+
+def reset_state():
+    """계좌, 주문 내역, 통계 초기화"""
+    with _lock:
+        state.clear()
+        state.update({'cash': float(config['initial_cash']), 'holdings': {}, 'orders': []})
+        stats.clear()
+        stats.update({'requests': 0, 'throttled': 0, 'orders': 0, 'tokens': 0})
+        _recent_requests.clear()
+
+
+def _ticker_seed(ticker: str) -> int:
+    digest = hashlib.sha256(f"{config['seed']}:{ticker}".encode('utf-8')).hexdigest()
+    return int(digest[:8], 16)
+
+
+def daily_bars(ticker: str) -> List[Dict[str, Any]]:
+    """종목별로 항상 같은 값이 나오는 일봉 (오래된 날짜부터)"""
+    rng = random.Random(_ticker_seed(ticker))
+    count = int(config['history_days'])
+    price = rng.uniform(20, 500)
+    today = datetime.now().date()
+
+    bars = []
+    for i in range(count):
+        day = today - timedelta(days=count - 1 - i)
+        open_price = price
+        price = max(1.0, price * (1 + rng.gauss(0.0005, 0.02)))
+        high = max(open_price, price) * (1 + rng.uniform(0, 0.01))
+        low = min(open_price, price) * (1 - rng.uniform(0, 0.01))
+        bars.append({
+            'xymd': day.strftime('%Y%m%d'),
+            'ovrs_oprc': f"{open_price:.4f}",
+            'ovrs_hgpr': f"{high:.4f}",
+            'ovrs_lwpr': f"{low:.4f}",
+            'ovrs_clpr': f"{price:.4f}",
+            'acml_vol': str(int(rng.uniform(1e6, 5e6)))
+        })
+    return bars
+
+
+def last_price(ticker: str) -> float:
+    return float(daily_bars(ticker)[-1]['ovrs_clpr'])
+
+
+def ok(payload: Dict[str, Any] = None, headers: Dict[str, str] = None):
+    body = {'rt_cd': '0', 'msg_cd': 'MCA00000', 'msg1': '정상처리 되었습니다.'}
+    body.update(payload or {})
+    return jsonify(body), 200, headers or {}
+
+
+def error(msg_cd: str, msg: str, status: int = 200):
+    return jsonify({'rt_cd': '1', 'msg_cd': msg_cd, 'msg1': msg}), status
+
+
+@app.before_request
+def simulate_network():
+    """설정된 지연을 적용하고 초당 한도/무작위 비율로 EGW00201 반환"""
+    if request.path.startswith('/_stub'):
+        return None
+
+    now = time.monotonic()
+    with _lock:
+        stats['requests'] += 1
+        while _recent_requests and now - _recent_requests[0] > 1.0:
+            _recent_requests.popleft()
+        _recent_requests.append(now)
+        over_limit = config['rps_limit'] and len(_recent_requests) > config['rps_limit']
+        latency = config['latency_ms'] + random.uniform(0, config['jitter_ms'])
+        throttle_rate = config['throttle_rate']
+
+    if latency > 0:
+        time.sleep(latency / 1000.0)
+
+    if request.path != '/oauth2/tokenP' and (over_limit or random.random() < throttle_rate):
+        with _lock:
+            stats['throttled'] += 1
+        return error(THROTTLE_MSG_CD, THROTTLE_MSG, status=500)
+    return None
+
+
+@app.route('/oauth2/tokenP', methods=['POST'])
+def issue_token():
+    body = request.get_json(silent=True) or {}
+    if not body.get('appkey') or not body.get('appsecret'):
+        return jsonify({'error_code': 'EGW00103', 'error_description': '유효하지 않은 AppKey입니다.'}), 403
+    with _lock:
+        stats['tokens'] += 1
+    return jsonify({
+        'access_token': uuid.uuid4().hex,
+        'token_type': 'Bearer',
+        'expires_in': 86400,
+        'access_token_token_expired': (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+    })
+
+
+def _symbol_param() -> str:
+    # 봇은 fid_input_iscd, KISApiClient는 SYMB 사용
+    return (request.args.get('fid_input_iscd') or request.args.get('SYMB') or '').upper()
+
+
+@app.route('/uapi/overseas-price/v1/quotations/price', methods=['GET'])
+def quotations_price():
+    ticker = _symbol_param()
+    if not ticker:
+        return error('OPSQ0001', '종목코드를 입력하세요.')
+    bars = daily_bars(ticker)
+    last, prev = float(bars[-1]['ovrs_clpr']), float(bars[-2]['ovrs_clpr'])
+    return ok({'output': {
+        'rsym': f"D{request.args.get('EXCD', 'NAS')}{ticker}",
+        'last': f"{last:.4f}",
+        'base': f"{prev:.4f}",
+        'diff': f"{last - prev:.4f}",
+        'rate': f"{(last / prev - 1) * 100:.2f}",
+        'tvol': bars[-1]['acml_vol']
+    }})
+
+
+@app.route('/uapi/overseas-price/v1/quotations/dailyprice', methods=['GET'])
+@app.route('/uapi/overseas-price/v1/quotations/inquire-daily-chartprice', methods=['GET'])
+def quotations_dailyprice():
+    ticker = _symbol_param()
+    if not ticker:
+        return error('OPSQ0001', '종목코드를 입력하세요.')
+    bars = daily_bars(ticker)
+    count = request.args.get('INQR_CNT')
+    if count and count.isdigit():
+        bars = bars[-int(count):]
+    return ok({'output': bars})
+
+
+def _balance_payload() -> Dict[str, Any]:
+    with _lock:
+        cash = state['cash']
+        holdings = {k: dict(v) for k, v in state['holdings'].items()}
+
+    rows = []
+    for (exchange, ticker), position in holdings.items():
+        if position['qty'] <= 0:
+            continue
+        price = last_price(ticker)
+        rows.append({
+            'ovrs_excg_cd': exchange,
+            'ovrs_pdno': ticker,
+            'ovrs_cblc_qty': str(position['qty']),
+            'pchs_avg_pric': f"{position['avg_price']:.4f}",
+            'now_pric2': f"{price:.4f}",
+            'ovrs_stck_evlu_amt': f"{price * position['qty']:.2f}"
+        })
+    # 봇은 output1[0].dnca_tot_amt와 output2 보유 목록을 읽음
+    return {'output1': [{'dnca_tot_amt': f"{cash:.2f}"}], 'output2': rows}
+
+
+@app.route('/uapi/overseas-stock/v1/trading/inquire-balance', methods=['GET'])
+@app.route('/uapi/overseas-stock/v1/trading-inquire/balance', methods=['GET'])
+@app.route('/uapi/domestic-stock/v1/trading-inquire/balance', methods=['GET'])
+def inquire_balance():
+    return ok(_balance_payload())
+
+
+@app.route('/uapi/overseas-stock/v1/trading/order', methods=['POST'])
+def place_order():
+    body = {k.lower(): v for k, v in (request.get_json(silent=True) or {}).items()}
+    ticker = str(body.get('pdno', '')).upper()
+    exchange = body.get('ovrs_excg_cd', 'NAS')
+    tr_id = request.headers.get('tr_id', '')
+    try:
+        qty = int(body.get('ord_qty', 0))
+        price = float(body.get('ord_unpr') or body.get('ovrs_ord_unpr') or 0)
+    except (TypeError, ValueError):
+        return error('APBK0918', '주문수량 또는 단가를 확인하세요.')
+    if not ticker or qty <= 0:
+        return error('APBK0918', '주문수량 또는 단가를 확인하세요.')
+
+    # 봇의 매도는 시장가(ord_dvsn=01, 단가 0), KISApiClient는 tr_id로 매수/매도 구분
+    is_sell = tr_id in ('JTTT1005U', 'JTTT1006U') or (body.get('ord_dvsn') == '01' and price == 0)
+    fill_price = price if price > 0 else last_price(ticker)
+
+    with _lock:
+        key = (exchange, ticker)
+        position = state['holdings'].setdefault(key, {'qty': 0, 'avg_price': 0.0})
+        if is_sell:
+            if position['qty'] < qty:
+                return error('APBK0400', '주문 가능 수량이 부족합니다.')
+            position['qty'] -= qty
+            state['cash'] += fill_price * qty
+        else:
+            if state['cash'] < fill_price * qty:
+                return error('APBK0952', '주문 가능 금액을 초과하였습니다.')
+            total = position['avg_price'] * position['qty'] + fill_price * qty
+            position['qty'] += qty
+            position['avg_price'] = total / position['qty']
+            state['cash'] -= fill_price * qty
+
+        now = datetime.now()
+        order_no = f"{len(state['orders']) + 1:010d}"
+        state['orders'].append({
+            'ord_dt': now.strftime('%Y%m%d'),
+            'ord_tmd': now.strftime('%H%M%S'),
+            'odno': order_no,
+            'orgn_odno': '',
+            'pdno': ticker,
+            'prdt_name': ticker,
+            'ovrs_excg_cd': exchange,
+            'sll_buy_dvsn_cd': '01' if is_sell else '02',
+            'sll_buy_dvsn_cd_name': '매도' if is_sell else '매수',
+            'ft_ord_qty': str(qty),
+            'ft_ord_unpr3': f"{price:.4f}",
+            'ft_ccld_qty': str(qty),
+            'ft_ccld_unpr3': f"{fill_price:.4f}",
+            'ft_ccld_amt3': f"{fill_price * qty:.2f}",
+            'tr_crcy_cd': 'USD'
+        })
+        stats['orders'] += 1
+
+    return ok({'output': {'KRX_FWDG_ORD_ORGNO': '91252', 'ODNO': order_no, 'ORD_TMD': now.strftime('%H%M%S')}})
+
+
+@app.route('/uapi/overseas-stock/v1/trading-inquire/order', methods=['GET'])
+@app.route('/uapi/overseas-stock/v1/trading-inquire/execution', methods=['GET'])
+def inquire_history():
+    """CTX_AREA_NK200을 다음 시작 위치로 쓰는 연속 조회 (응답 헤더 tr_cont=M이면 다음 페이지 있음)"""
+    start = request.args.get('INQR_STRT_DT', '')
+    end = request.args.get('INQR_END_DT', '99999999')
+    offset_text = request.args.get('CTX_AREA_NK200', '').strip()
+    offset = int(offset_text) if offset_text.isdigit() else 0
+
+    with _lock:
+        rows = [dict(o) for o in state['orders'] if start <= o['ord_dt'] <= end]
+        page_size = int(config['page_size'])
+
+    page = rows[offset:offset + page_size]
+    next_offset = offset + len(page)
+    has_more = next_offset < len(rows)
+    return ok({
+        'ctx_area_fk200': start if has_more else '',
+        'ctx_area_nk200': str(next_offset) if has_more else '',
+        'output': page
+    }, headers={'tr_cont': 'M' if has_more else 'D'})
+
+
+@app.route('/_stub/config', methods=['GET', 'POST'])
+def stub_config():
+    """실행 중에 지연/오류 설정 변경"""
+    if request.method == 'POST':
+        updates = request.get_json(silent=True) or {}
+        with _lock:
+            for key, value in updates.items():
+                if key in DEFAULT_CONFIG:
+                    config[key] = type(DEFAULT_CONFIG[key])(value)
+    with _lock:
+        return jsonify(dict(config))
+
+
+@app.route('/_stub/stats', methods=['GET'])
+def stub_stats():
+    with _lock:
+        return jsonify(dict(stats))
+
+
+@app.route('/_stub/reset', methods=['POST'])
+def stub_reset():
+    reset_state()
+    return jsonify({'success': True})
+
+
+reset_state()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='한국투자증권 API 로컬 대역 서버')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9443)
+    parser.add_argument('--latency-ms', type=float, default=DEFAULT_CONFIG['latency_ms'])
+    parser.add_argument('--jitter-ms', type=float, default=DEFAULT_CONFIG['jitter_ms'])
+    parser.add_argument('--throttle-rate', type=float, default=DEFAULT_CONFIG['throttle_rate'])
+    parser.add_argument('--rps-limit', type=int, default=DEFAULT_CONFIG['rps_limit'])
+    parser.add_argument('--page-size', type=int, default=DEFAULT_CONFIG['page_size'])
+    parser.add_argument('--initial-cash', type=float, default=DEFAULT_CONFIG['initial_cash'])
+    parser.add_argument('--seed', type=int, default=DEFAULT_CONFIG['seed'])
+    args = parser.parse_args()
+
+    config.update({
+        'latency_ms': args.latency_ms,
+        'jitter_ms': args.jitter_ms,
+        'throttle_rate': args.throttle_rate,
+        'rps_limit': args.rps_limit,
+        'page_size': args.page_size,
+        'initial_cash': args.initial_cash,
+        'seed': args.seed
+    })
+    reset_state()
+
+    logger.info(f"KIS 대역 서버 시작: http://{args.host}:{args.port} {config}")
+    app.run(host=args.host, port=args.port, threaded=True)
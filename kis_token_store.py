@@ -0,0 +1,231 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+import requests
+
+from kis_http import KIS_BASE_URL
+
+# 로깅 설정
+logger = logging.getLogger(__name__)
+
+KIS_TOKEN_URL = f"{KIS_BASE_URL}/oauth2/tokenP"
+
+# 봇 프로세스와 Flask 서버가 함께 쓰는 토큰 파일 (실행 디렉토리 기준)
+TOKEN_FILE = os.getenv("KIS_TOKEN_FILE", "kis_token.json")
+
+# 요청 경로에서 토큰을 새로 받는 기준 (만료 5분 전)
+TOKEN_EXPIRY_MARGIN = 300
+# 백그라운드 갱신 시점 (만료 1시간 전)
+TOKEN_REFRESH_AHEAD = 3600
+# expires_in이 없을 때 기본 유효 기간
+DEFAULT_EXPIRES_IN = 86400
+# 백그라운드 갱신 실패 시 재시도 간격
+REFRESH_RETRY_INTERVAL = 60
+# 백그라운드 갱신 사이 최소 간격 (유효 기간이 refresh_ahead보다 짧은 토큰의 연속 발급 방지)
+REFRESH_MIN_INTERVAL = 60
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+
+@contextmanager
+def file_lock(lock_path: str):
+    """프로세스 간 배타적 파일 락"""
+    with open(lock_path, 'a+') as lock_file:
+        if sys.platform == "win32":
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if sys.platform == "win32":
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def app_key_id(app_key: str, app_secret: str) -> str:
+    """토큰 파일에 자격 증명 원문을 남기지 않도록 (앱키, 시크릿) 해시로 식별"""
+    return hashlib.sha256(f"{app_key}:{app_secret}".encode('utf-8')).hexdigest()[:16]
+
+
+class KISTokenStore:
+    """앱키별 KIS 액세스 토큰을 프로세스 간 공유하고 만료 전에 백그라운드로 갱신"""
+
+    def __init__(self, app_key: str, app_secret: str, token_url: str = KIS_TOKEN_URL,
+                 token_file: str = TOKEN_FILE, http=None, timeout=(3.05, 10),
+                 expiry_margin: int = TOKEN_EXPIRY_MARGIN, refresh_ahead: int = TOKEN_REFRESH_AHEAD):
+        self.app_key = app_key
+        self.app_secret = app_secret
+        self.token_url = token_url
+        self.token_file = token_file
+        self.lock_file = f"{token_file}.lock"
+        self.key_id = app_key_id(app_key, app_secret)
+
+        # .post(url, json=..., timeout=...)를 제공하는 객체 (requests 모듈 또는 KISHttpPool)
+        self.http = http or requests
+        self.timeout = timeout
+        self.expiry_margin = expiry_margin
+        self.refresh_ahead = refresh_ahead
+
+        self.access_token = None
+        self.expires_at = 0.0
+
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+        self._stop_event = threading.Event()
+
+    def cached_token(self) -> Optional[str]:
+        """메모리에 있는 유효한 토큰 (네트워크/파일 접근 없음)"""
+        if self.access_token and time.time() < self.expires_at - self.expiry_margin:
+            return self.access_token
+        return None
+
+    def get_token(self) -> str:
+        """유효한 토큰 반환 (필요 시 다른 프로세스가 받은 토큰을 읽거나 새로 발급)"""
+        token = self.cached_token()
+        if token:
+            return token
+
+        with self._lock:
+            token = self.cached_token()
+            if token:
+                return token
+            self._refresh(min_remaining=self.expiry_margin)
+            return self.access_token
+
+    def refresh(self, force: bool = False) -> str:
+        """토큰 갱신 (force=True면 남은 시간과 무관하게 새로 발급)"""
+        with self._lock:
+            self._refresh(min_remaining=None if force else self.refresh_ahead)
+            return self.access_token
+
+    def _refresh(self, min_remaining: Optional[float]):
+        """파일 락을 잡고, 공유 토큰이 min_remaining초 이상 남았으면 재사용하고 아니면 발급"""
+        with file_lock(self.lock_file):
+            if min_remaining is not None:
+                entry = self._read_entry()
+                if entry and time.time() < entry.get('expires_at', 0) - min_remaining:
+                    self.access_token = entry['access_token']
+                    self.expires_at = entry['expires_at']
+                    return
+
+            entry = self._issue_token()
+            self._write_entry(entry)
+            self.access_token = entry['access_token']
+            self.expires_at = entry['expires_at']
+
+    def _issue_token(self) -> Dict[str, Any]:
+        """OAuth 토큰 발급"""
+        body = {
+            "grant_type": "client_credentials",
+            "appkey": self.app_key,
+            "appsecret": self.app_secret
+        }
+        response = self.http.post(self.token_url, json=body, timeout=self.timeout)
+        data = response.json()
+        if "access_token" not in data:
+            raise Exception(f"Token refresh failed: {data}")
+
+        issued_at = time.time()
+        logger.info("Access token refreshed")
+        return {
+            "access_token": data["access_token"],
+            "issued_at": issued_at,
+            "expires_at": issued_at + int(data.get("expires_in", DEFAULT_EXPIRES_IN))
+        }
+
+    def _read_all(self) -> Dict[str, Any]:
+        try:
+            if os.path.exists(self.token_file):
+                with open(self.token_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                # 이전 형식({"access_token", "expires_at"})은 무시하고 새로 발급
+                if isinstance(data, dict) and 'tokens' in data:
+                    return data
+        except Exception as e:
+            logger.error(f"Token load failed: {e}")
+        return {'tokens': {}}
+
+    def _read_entry(self) -> Optional[Dict[str, Any]]:
+        return self._read_all()['tokens'].get(self.key_id)
+
+    def _write_entry(self, entry: Dict[str, Any]):
+        """임시 파일에 쓴 뒤 교체해 다른 프로세스가 반쯤 쓰인 파일을 읽지 않도록 함"""
+        data = self._read_all()
+        data['tokens'][self.key_id] = entry
+        tmp_file = f"{self.token_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_file, self.token_file)
+
+    def start_background_refresh(self):
+        """만료 전에 토큰을 미리 갱신하는 데몬 스레드 시작 (중복 호출 무시)"""
+        with self._lock:
+            if self._refresh_thread and self._refresh_thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._refresh_thread = threading.Thread(target=self._refresh_loop, daemon=True,
+                                                    name=f"kis-token-refresh-{self.key_id[:6]}")
+            self._refresh_thread.start()
+
+    def stop_background_refresh(self):
+        self._stop_event.set()
+
+    def _next_refresh_wait(self, last_refresh: Optional[float]) -> float:
+        """다음 백그라운드 갱신까지 기다릴 시간 (남은 유효 기간이 짧으면 그 절반 지점에서 갱신)"""
+        now = time.time()
+        refresh_at = max(self.expires_at - self.refresh_ahead, now + (self.expires_at - now) / 2)
+        if last_refresh is not None:
+            refresh_at = max(refresh_at, last_refresh + REFRESH_MIN_INTERVAL)
+        return refresh_at - now
+
+    def _refresh_loop(self):
+        last_refresh = None
+        while not self._stop_event.is_set():
+            wait = self._next_refresh_wait(last_refresh)
+            if wait > 0 and self._stop_event.wait(wait):
+                break
+            last_refresh = time.time()
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Background token refresh failed: {e}")
+                if self._stop_event.wait(REFRESH_RETRY_INTERVAL):
+                    break
+
+    def get_status(self) -> Dict[str, Any]:
+        """토큰 상태 (토큰 값은 포함하지 않음)"""
+        return {
+            'has_token': self.access_token is not None,
+            'expires_at': self.expires_at,
+            'expires_in': max(self.expires_at - time.time(), 0),
+            'background_refresh': bool(self._refresh_thread and self._refresh_thread.is_alive())
+        }
+
+
+_stores: Dict[Any, KISTokenStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_token_store(app_key: str, app_secret: str, token_file: str = TOKEN_FILE, **kwargs) -> KISTokenStore:
+    """앱키별 토큰 저장소 (프로세스 안에서 하나만 생성)"""
+    key = (app_key, app_secret, os.path.abspath(token_file))
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = KISTokenStore(app_key, app_secret, token_file=token_file, **kwargs)
+            _stores[key] = store
+        return store
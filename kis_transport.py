@@ -0,0 +1,162 @@
+import os
+import json
+import hashlib
+import threading
+import logging
+from typing import Dict, Any, Optional, List
+from urllib.parse import urlparse, parse_qsl
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# 로깅 설정
+logger = logging.getLogger(__name__)
+
+# KIS_HTTP_MODE=record|replay 로 실제 응답을 기록하거나 기록된 응답으로 재생
+HTTP_MODE_ENV = "KIS_HTTP_MODE"
+CASSETTE_DIR_ENV = "KIS_CASSETTE_DIR"
+DEFAULT_CASSETTE_DIR = "kis_cassettes"
+
+# 요청 지문에서 제외할 값 (매 요청마다 달라지거나 민감한 값)
+_VOLATILE_BODY_KEYS = {'appkey', 'appsecret'}
+# 기록 파일에 남기지 않을 응답 필드
+_REDACTED_RESPONSE_KEYS = {'access_token'}
+# 재생 시 그대로 돌려줄 응답 헤더
+_REPLAY_HEADER_KEYS = ('content-type', 'tr_cont')
+
+
+def request_fingerprint(method: str, url: str, body: Optional[bytes]) -> str:
+    """메서드, 경로, 정렬된 쿼리, 정규화된 JSON 본문으로 요청 지문 생성"""
+    parsed = urlparse(url)
+    query = sorted(parse_qsl(parsed.query, keep_blank_values=True))
+
+    body_key = ''
+    if body:
+        try:
+            data = json.loads(body)
+            if isinstance(data, dict):
+                data = {k: v for k, v in data.items() if k.lower() not in _VOLATILE_BODY_KEYS}
+            body_key = json.dumps(data, sort_keys=True, ensure_ascii=False)
+        except (ValueError, TypeError):
+            body_key = hashlib.sha256(body if isinstance(body, bytes) else str(body).encode()).hexdigest()
+
+    raw = json.dumps([method.upper(), parsed.path, query, body_key], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:24]
+
+
+def _redact(data: Any) -> Any:
+    if isinstance(data, dict):
+        return {k: ('REDACTED' if k in _REDACTED_RESPONSE_KEYS else _redact(v)) for k, v in data.items()}
+    if isinstance(data, list):
+        return [_redact(v) for v in data]
+    return data
+
+
+class RecordReplayAdapter(HTTPAdapter):
+    """실제 KIS 응답을 디스크에 기록하거나(record) 기록된 응답을 순서대로 재생(replay)하는 전송 어댑터
+
+    같은 요청이 여러 번 기록되면 재생 시 기록된 순서대로 돌려주고, 마지막 응답은 반복합니다.
+    """
+
+    def __init__(self, mode: str, cassette_dir: str = DEFAULT_CASSETTE_DIR, **kwargs):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown transport mode: {mode}")
+        super().__init__(**kwargs)
+        self.mode = mode
+        self.cassette_dir = cassette_dir
+        os.makedirs(cassette_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._replay_positions: Dict[str, int] = {}
+        self._recorded_this_run: set = set()
+
+    def _cassette_path(self, fingerprint: str) -> str:
+        return os.path.join(self.cassette_dir, f"{fingerprint}.json")
+
+    def _load(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        path = self._cassette_path(fingerprint)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        fingerprint = request_fingerprint(request.method, request.url, request.body)
+        if self.mode == 'replay':
+            return self._replay(request, fingerprint)
+
+        response = super().send(request, stream=stream, timeout=timeout, verify=verify,
+                                cert=cert, proxies=proxies)
+        self._record(request, fingerprint, response)
+        return response
+
+    def _record(self, request, fingerprint: str, response: requests.Response):
+        content = response.content
+        try:
+            body = {'json': _redact(json.loads(content))}
+        except (ValueError, TypeError):
+            body = {'text': content.decode(response.encoding or 'utf-8', errors='replace')}
+
+        entry = {
+            'status': response.status_code,
+            'headers': {k: v for k, v in response.headers.items() if k.lower() in _REPLAY_HEADER_KEYS},
+            **body
+        }
+
+        with self._lock:
+            # 이번 실행에서 처음 기록하는 요청이면 이전 기록을 덮어씀
+            cassette = None
+            if fingerprint in self._recorded_this_run:
+                cassette = self._load(fingerprint)
+            if cassette is None:
+                parsed = urlparse(request.url)
+                cassette = {'method': request.method, 'path': parsed.path, 'query': parsed.query,
+                            'responses': []}
+            cassette['responses'].append(entry)
+            self._recorded_this_run.add(fingerprint)
+
+            tmp_path = f"{self._cassette_path(fingerprint)}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(cassette, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self._cassette_path(fingerprint))
+
+    def _replay(self, request, fingerprint: str) -> requests.Response:
+        with self._lock:
+            cassette = self._load(fingerprint)
+            if cassette is None or not cassette.get('responses'):
+                raise requests.ConnectionError(
+                    f"No recorded response for {request.method} {request.url}", request=request)
+            responses: List[Dict[str, Any]] = cassette['responses']
+            position = self._replay_positions.get(fingerprint, 0)
+            entry = responses[min(position, len(responses) - 1)]
+            self._replay_positions[fingerprint] = position + 1
+
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry.get('headers', {}))
+        if 'json' in entry:
+            response._content = json.dumps(entry['json'], ensure_ascii=False).encode('utf-8')
+            response.headers.setdefault('content-type', 'application/json; charset=utf-8')
+        else:
+            response._content = entry.get('text', '').encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.reason = 'Replayed'
+        return response
+
+    def reset_replay(self):
+        """재생 위치를 처음으로 되돌림"""
+        with self._lock:
+            self._replay_positions.clear()
+
+
+def adapter_from_env(**kwargs) -> Optional[RecordReplayAdapter]:
+    """KIS_HTTP_MODE 환경 변수가 설정된 경우 기록/재생 어댑터 생성"""
+    mode = os.getenv(HTTP_MODE_ENV, '').strip().lower()
+    if not mode or mode == 'live':
+        return None
+    cassette_dir = os.getenv(CASSETTE_DIR_ENV, DEFAULT_CASSETTE_DIR)
+    logger.info(f"KIS HTTP transport mode: {mode} ({cassette_dir})")
+    return RecordReplayAdapter(mode, cassette_dir=cassette_dir, **kwargs)
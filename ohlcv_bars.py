@@ -0,0 +1,105 @@
+import logging
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+# 로깅 설정
+logger = logging.getLogger(__name__)
+
+# OHLCV 컬럼 (모두 float64)
+PRICE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+# 해외주식 일봉 응답(output) 필드 → 컬럼 이름
+KIS_DAILY_FIELDS = {
+    'open': 'ovrs_oprc',
+    'high': 'ovrs_hgpr',
+    'low': 'ovrs_lwpr',
+    'close': 'ovrs_clpr',
+    'volume': 'acml_vol'
+}
+KIS_DATE_FIELD = 'xymd'
+
+
+def _decode_column(rows: Sequence[Dict[str, Any]], key: str) -> np.ndarray:
+    """응답 행의 문자열 값을 float64 배열로 변환 (빈 값/누락은 NaN)"""
+    values = [row.get(key) for row in rows]
+    try:
+        # 문자열 배열 → float64 변환은 numpy 안에서 한 번에 처리
+        return np.asarray(values, dtype=np.str_).astype(np.float64)
+    except (TypeError, ValueError):
+        column = np.empty(len(values), dtype=np.float64)
+        for i, value in enumerate(values):
+            try:
+                column[i] = float(value)
+            except (TypeError, ValueError):
+                column[i] = np.nan
+        return column
+
+
+class OHLCVBars:
+    """일봉을 컬럼별 연속 NumPy 배열로 담는 가벼운 컨테이너
+
+    bars.close[-1], bars['volume'][-2]처럼 배열로 바로 읽고,
+    DataFrame은 to_dataframe()을 호출할 때만 만듭니다.
+    """
+
+    __slots__ = ('dates', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, open, high, low, close, volume, dates=None):
+        self.open = np.ascontiguousarray(open, dtype=np.float64)
+        self.high = np.ascontiguousarray(high, dtype=np.float64)
+        self.low = np.ascontiguousarray(low, dtype=np.float64)
+        self.close = np.ascontiguousarray(close, dtype=np.float64)
+        self.volume = np.ascontiguousarray(volume, dtype=np.float64)
+        self.dates = None if dates is None else np.asarray(dates)
+
+    @classmethod
+    def from_kis_output(cls, rows: Optional[List[Dict[str, Any]]]) -> 'OHLCVBars':
+        """KIS 일봉 응답의 output 목록을 컬럼 배열로 바로 변환"""
+        rows = rows or []
+        columns = {field: _decode_column(rows, key) for field, key in KIS_DAILY_FIELDS.items()}
+        dates = None
+        if rows and KIS_DATE_FIELD in rows[0]:
+            dates = np.asarray([row.get(KIS_DATE_FIELD, '') for row in rows], dtype=np.str_)
+        return cls(dates=dates, **columns)
+
+    @classmethod
+    def empty_bars(cls) -> 'OHLCVBars':
+        zeros = np.empty(0, dtype=np.float64)
+        return cls(zeros, zeros, zeros, zeros, zeros)
+
+    def __len__(self) -> int:
+        return len(self.close)
+
+    @property
+    def empty(self) -> bool:
+        return len(self.close) == 0
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        if field == 'date':
+            return self.dates
+        if field not in PRICE_FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def tail(self, count: int) -> 'OHLCVBars':
+        """최근 count개 봉 (배열 복사 없이 뷰로 반환)"""
+        if count >= len(self):
+            return self
+        start = len(self) - max(count, 0)
+        return OHLCVBars(self.open[start:], self.high[start:], self.low[start:],
+                         self.close[start:], self.volume[start:],
+                         dates=None if self.dates is None else self.dates[start:])
+
+    def to_dataframe(self):
+        """pandas DataFrame으로 변환 (지표 계산 등 DataFrame이 필요한 호출부 전용)"""
+        import pandas as pd
+
+        df = pd.DataFrame({field: getattr(self, field) for field in PRICE_FIELDS})
+        if self.dates is not None:
+            df['date'] = self.dates
+        return df
+
+    def __repr__(self) -> str:
+        last = f", last_close={self.close[-1]:.4f}" if len(self) else ""
+        return f"OHLCVBars(len={len(self)}{last})"
@@ -0,0 +1,463 @@
+import asyncio
+import threading
+import time
+import logging
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Optional, Tuple
+
+from circuit_breaker import is_kis_throttle
+
+# 로깅 설정
+logger = logging.getLogger(__name__)
+
+# 우선순위 차선 (앞일수록 먼저): 주문 > 보유 종목 위험 점검 > 잔고 조회 > 종목 스캔
+LANE_ORDER = 'order'
+LANE_RISK = 'risk'
+LANE_BALANCE = 'balance'
+LANE_SCAN = 'scan'
+LANES = (LANE_ORDER, LANE_RISK, LANE_BALANCE, LANE_SCAN)
+DEFAULT_LANE = LANE_BALANCE
+
+# 차선별로 남겨 둘 토큰 비율 (버킷 용량 대비)
+# 스캔은 버킷이 30% 아래로 비면 멈춰서, 주문/위험 점검이 항상 바로 토큰을 받을 수 있음
+LANE_RESERVE = {
+    LANE_ORDER: 0.0,
+    LANE_RISK: 0.0,
+    LANE_BALANCE: 0.1,
+    LANE_SCAN: 0.3
+}
+
+class PermitTimeout(TimeoutError):
+    """정해진 시간 안에 호출 한도 허가를 받지 못해 요청을 보내지 않음"""
+
+
+_current_lane: contextvars.ContextVar = contextvars.ContextVar('kis_priority_lane', default=None)
+
+
+def current_lane() -> str:
+    return _current_lane.get() or DEFAULT_LANE
+
+
+@contextmanager
+def priority_scope(lane: str):
+    """이 블록 안의 KIS 요청을 lane 우선순위로 대기 (submit_with_context로 작업 스레드에도 전달)"""
+    if lane not in LANES:
+        raise ValueError(f"Unknown priority lane: {lane}")
+    token = _current_lane.set(lane)
+    try:
+        yield lane
+    finally:
+        _current_lane.reset(token)
+
+
+class _Waiter:
+    """토큰을 기다리는 호출자 (스레드는 threading.Event, 코루틴은 asyncio.Event로 깨움)"""
+
+    __slots__ = ('permits', 'lane', 'loop', 'event')
+
+    def __init__(self, permits: float, lane: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.permits = permits
+        self.lane = lane
+        self.loop = loop
+        self.event = asyncio.Event() if loop is not None else threading.Event()
+
+    def wake(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.event.set)
+        else:
+            self.event.set()
+
+
+class TokenBucket:
+    """초당 rate개씩 채워지고 최대 capacity개까지 쌓이는 토큰 버킷
+
+    대기자는 우선순위 차선 순서로, 같은 차선 안에서는 도착 순서(FIFO)대로 토큰을 받고,
+    대기 중에는 락을 잡지 않습니다. 맨 앞 대기자만 다음 토큰이 찰 때까지 잠들고,
+    나머지는 앞 대기자가 깨울 때까지 기다립니다. 높은 차선 대기자가 오면 낮은 차선은 순서를 양보하고,
+    낮은 차선은 LANE_RESERVE만큼 토큰을 남겨 두어 예산이 빠듯할 때 먼저 밀려납니다.
+    """
+
+    def __init__(self, rate: float, capacity: float = None, name: str = 'kis', shared=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.name = name
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+
+        # shared (kis_quota.SharedQuota)가 있으면 토큰 수는 프로세스 간 공용 파일에서 관리
+        self.shared = shared
+
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._waiters = {lane: deque() for lane in LANES}
+        self._lane_granted = {lane: 0 for lane in LANES}
+
+        self._granted = 0
+        self._waited = 0
+        self._timeouts = 0
+        self._total_wait = 0.0
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def _reserve(self, lane: str) -> float:
+        return LANE_RESERVE.get(lane, 0.0) * self.capacity
+
+    def _head(self) -> Optional[_Waiter]:
+        for lane in LANES:
+            if self._waiters[lane]:
+                return self._waiters[lane][0]
+        return None
+
+    def _grant(self, permits: float, lane: str):
+        self._granted += 1
+        self._lane_granted[lane] += 1
+
+    def _try_take(self, permits: float, lane: str) -> float:
+        """락 밖에서 호출: 차감했으면 0, 아니면 토큰이 찰 때까지 남은 시간
+
+        공용 파일 잠금과 읽기/쓰기는 프로세스 안의 락을 잡지 않은 채로 해서 다른 스레드가 줄을 서거나
+        통계를 읽는 동안 막히지 않도록 합니다.
+        """
+        reserve = self._reserve(lane)
+        shared = self.shared
+        if shared is not None:
+            try:
+                wait = shared.try_take(permits, reserve)
+            except OSError as e:
+                # 공용 파일을 쓸 수 없으면 프로세스 자체 버킷으로 계속 진행
+                logger.error(f"Shared quota unavailable, using local bucket: {e}")
+                self.shared = None
+            else:
+                if wait > 0:
+                    return wait
+                with self._lock:
+                    self._grant(permits, lane)
+                return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            needed = permits + reserve
+            if self._tokens >= needed:
+                self._tokens -= permits
+                self._grant(permits, lane)
+                return 0.0
+            return (needed - self._tokens) / self.rate
+
+    async def _try_take_async(self, permits: float, lane: str) -> float:
+        """_try_take의 asyncio 버전 (공용 파일 잠금은 이벤트 루프 밖 스레드에서)"""
+        if self.shared is None:
+            return self._try_take(permits, lane)
+        return await asyncio.to_thread(self._try_take, permits, lane)
+
+    def _can_skip_queue(self, lane: str) -> bool:
+        """락 안에서 호출: 같거나 높은 차선 대기자가 없으면 줄을 서지 않고 바로 받아 볼 수 있음"""
+        for other in LANES:
+            if self._waiters[other]:
+                return False
+            if other == lane:
+                break
+        return True
+
+    def _is_head(self, waiter: _Waiter) -> bool:
+        with self._lock:
+            return self._head() is waiter
+
+    def _dequeue(self, waiter: _Waiter, started: float):
+        """토큰을 받은 맨 앞 대기자를 빼고 다음 맨 앞 대기자를 깨움"""
+        with self._lock:
+            self._waiters[waiter.lane].remove(waiter)
+            self._record_wait(started)
+            head = self._head()
+            if head is not None:
+                head.wake()
+
+    def _enqueue(self, waiter: _Waiter):
+        """락 안에서 호출: 높은 차선이 새 맨 앞이 되면 기존 맨 앞은 다음 확인 때 양보"""
+        self._waiters[waiter.lane].append(waiter)
+
+    def _abandon(self, waiter: _Waiter):
+        with self._lock:
+            was_head = self._head() is waiter
+            try:
+                self._waiters[waiter.lane].remove(waiter)
+            except ValueError:
+                return
+            head = self._head()
+            if was_head and head is not None:
+                head.wake()
+
+    def set_rate(self, rate: float):
+        """초당 충전 속도 변경 (공용 버킷이면 다른 프로세스에도 적용)"""
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        shared = self.shared
+        if shared is not None:
+            try:
+                shared.set_rate(rate)
+            except OSError as e:
+                logger.error(f"Shared quota rate update failed: {e}")
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+            # 맨 앞 대기자가 이전 속도로 계산한 시간만큼 자고 있지 않도록 깨움
+            head = self._head()
+            if head is not None:
+                head.wake()
+
+    def adjust_rate(self, update: Callable[[float], Optional[float]], min_rate: float,
+                    max_rate: float) -> Tuple[float, float]:
+        """현재 속도를 update(rate)로 바꾸고 (이전, 새) 속도 반환 (update가 None이면 그대로)
+
+        공용 버킷이면 읽기-계산-쓰기를 공용 파일 락 안에서 하고 상한은 파일에 저장된 값을 따릅니다.
+        """
+        if self.shared is not None:
+            try:
+                rate, new_rate = self.shared.adjust_rate(update, min_rate)
+            except OSError as e:
+                logger.error(f"Shared quota rate update failed: {e}")
+            else:
+                with self._lock:
+                    self._refill(time.monotonic())
+                    self.rate = new_rate
+                    head = self._head()
+                    if head is not None:
+                        head.wake()
+                return rate, new_rate
+
+        with self._lock:
+            rate = self.rate
+            new_rate = update(rate)
+            if new_rate is None:
+                return rate, rate
+            new_rate = min(max(new_rate, min_rate), max_rate)
+            self._refill(time.monotonic())
+            self.rate = float(new_rate)
+            head = self._head()
+            if head is not None:
+                head.wake()
+            return rate, self.rate
+
+    def _check_permits(self, permits: float, lane: str):
+        if lane not in LANES:
+            raise ValueError(f"Unknown priority lane: {lane}")
+        if permits + self._reserve(lane) > self.capacity:
+            raise ValueError(f"permits ({permits}) exceed bucket capacity ({self.capacity})")
+
+    def _record_wait(self, started: float):
+        self._waited += 1
+        self._total_wait += time.monotonic() - started
+
+    def acquire(self, permits: float = 1, timeout: Optional[float] = None, lane: str = None) -> bool:
+        """토큰을 받을 때까지 대기 (timeout초 안에 받지 못하면 False, lane 미지정 시 priority_scope 차선)"""
+        lane = lane or current_lane()
+        self._check_permits(permits, lane)
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+
+        with self._lock:
+            skip_queue = self._can_skip_queue(lane)
+        if skip_queue and self._try_take(permits, lane) == 0:
+            return True
+        waiter = _Waiter(permits, lane)
+        with self._lock:
+            self._enqueue(waiter)
+
+        try:
+            while True:
+                waiter.event.clear()
+                delay = None
+                if self._is_head(waiter):
+                    delay = self._try_take(permits, lane)
+                    if delay == 0:
+                        self._dequeue(waiter, started)
+                        return True
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    with self._lock:
+                        self._timeouts += 1
+                    break
+                wait_for = delay
+                if deadline is not None:
+                    wait_for = min(deadline - now, wait_for if wait_for is not None else deadline - now)
+                waiter.event.wait(wait_for)
+        except BaseException:
+            self._abandon(waiter)
+            raise
+
+        self._abandon(waiter)
+        return False
+
+    async def acquire_async(self, permits: float = 1, timeout: Optional[float] = None,
+                            lane: str = None) -> bool:
+        """acquire의 asyncio 버전 (이벤트 루프를 막지 않고 대기)"""
+        lane = lane or current_lane()
+        self._check_permits(permits, lane)
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+
+        with self._lock:
+            skip_queue = self._can_skip_queue(lane)
+        if skip_queue and await self._try_take_async(permits, lane) == 0:
+            return True
+        waiter = _Waiter(permits, lane, loop=asyncio.get_running_loop())
+        with self._lock:
+            self._enqueue(waiter)
+
+        try:
+            while True:
+                waiter.event.clear()
+                delay = None
+                if self._is_head(waiter):
+                    delay = await self._try_take_async(permits, lane)
+                    if delay == 0:
+                        self._dequeue(waiter, started)
+                        return True
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    with self._lock:
+                        self._timeouts += 1
+                    break
+                wait_for = delay
+                if deadline is not None:
+                    wait_for = min(deadline - now, wait_for if wait_for is not None else deadline - now)
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), wait_for)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._abandon(waiter)
+            raise
+
+        self._abandon(waiter)
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        shared = self.shared
+        shared_tokens = None
+        if shared is not None:
+            try:
+                shared_tokens = shared.tokens()
+            except OSError:
+                pass
+        with self._lock:
+            self._refill(time.monotonic())
+            tokens = self._tokens if shared_tokens is None else shared_tokens
+            return {
+                'rate': self.rate,
+                'capacity': self.capacity,
+                'tokens': round(tokens, 3),
+                'shared': shared is not None,
+                'queued': sum(len(q) for q in self._waiters.values()),
+                'lanes': {lane: {'queued': len(self._waiters[lane]), 'granted': self._lane_granted[lane]}
+                          for lane in LANES},
+                'granted': self._granted,
+                'waited': self._waited,
+                'timeouts': self._timeouts,
+                'avg_wait': self._total_wait / self._waited if self._waited else 0.0
+            }
+
+
+class AdaptiveRateController:
+    """KIS 초당 거래건수 초과(EGW00201) 응답과 응답 지연으로 버킷 속도를 조절 (AIMD)
+
+    초과 응답이 오면 속도를 decrease_factor배로 줄이고, 평균 지연이 latency_target을 넘으면
+    latency_factor배로 줄입니다. 줄인 뒤 cooldown 동안은 다시 줄이지 않습니다.
+    increase_interval 동안 문제없이 현재 속도의 절반 이상을 쓰고 있으면 increase_step만큼 올립니다.
+    """
+
+    def __init__(self, bucket: TokenBucket, min_rate: float = 1.0, max_rate: float = None,
+                 decrease_factor: float = 0.5, latency_factor: float = 0.8, latency_target: float = 1.5,
+                 increase_step: float = 0.5, increase_interval: float = 2.0, cooldown: float = 1.0,
+                 is_throttled=None):
+        self.bucket = bucket
+        self.min_rate = min_rate
+        # 공용 버킷이면 상한은 공용 파일에 저장된 값이 적용됨 (SharedQuota.max_rate)
+        self.max_rate = max_rate if max_rate is not None else bucket.rate
+        self.decrease_factor = decrease_factor
+        self.latency_factor = latency_factor
+        self.latency_target = latency_target
+        self.increase_step = increase_step
+        self.increase_interval = increase_interval
+        self.cooldown = cooldown
+        # (response) -> bool, 기본은 응답 본문에서 EGW00201 확인
+        self.is_throttled = is_throttled or is_kis_throttle
+
+        self._lock = threading.Lock()
+        self._latency_ewma = None
+        self._last_decrease = 0.0
+        self._window_started = time.monotonic()
+        self._window_successes = 0
+
+        self._throttle_events = 0
+        self._throttle_by_endpoint: Dict[str, int] = {}
+        self._last_throttle_at = None
+        self._decreases = 0
+        self._increases = 0
+
+    def observe(self, url: str, response, elapsed: float):
+        """KISHttpPool 응답 콜백"""
+        now = time.monotonic()
+        throttled = self.is_throttled(response)
+        update = None
+
+        with self._lock:
+            self._latency_ewma = elapsed if self._latency_ewma is None else \
+                0.8 * self._latency_ewma + 0.2 * elapsed
+            in_cooldown = now - self._last_decrease < self.cooldown
+
+            # 새 속도는 공용 한도의 최신 값에서 계산하도록 (rate) -> 새 속도 함수로 넘김
+            if throttled:
+                endpoint = url.split('?', 1)[0].rsplit('/', 1)[-1]
+                self._throttle_events += 1
+                self._throttle_by_endpoint[endpoint] = self._throttle_by_endpoint.get(endpoint, 0) + 1
+                self._last_throttle_at = time.time()
+                if not in_cooldown:
+                    update = lambda rate: rate * self.decrease_factor
+            elif self._latency_ewma > self.latency_target and not in_cooldown:
+                update = lambda rate: rate * self.latency_factor
+            else:
+                self._window_successes += 1
+                if now - self._window_started >= self.increase_interval:
+                    used = self._window_successes / (now - self._window_started)
+                    if not in_cooldown:
+                        update = lambda rate: rate + self.increase_step if used >= rate * 0.5 else None
+                    self._window_started = now
+                    self._window_successes = 0
+
+        if update is None:
+            return
+        rate, new_rate = self.bucket.adjust_rate(update, self.min_rate, self.max_rate)
+        if new_rate == rate:
+            return
+
+        with self._lock:
+            if new_rate < rate:
+                self._decreases += 1
+                self._last_decrease = now
+                self._window_started = now
+                self._window_successes = 0
+            else:
+                self._increases += 1
+        log = logger.warning if new_rate < rate else logger.info
+        log(f"KIS {self.bucket.name} rate {rate:.1f}/s -> {new_rate:.1f}/s"
+            + (" (throttled)" if throttled else ""))
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'rate': self.bucket.rate,
+                'min_rate': self.min_rate,
+                'max_rate': self.max_rate,
+                'latency_ewma': self._latency_ewma,
+                'throttle_events': self._throttle_events,
+                'throttle_by_endpoint': dict(self._throttle_by_endpoint),
+                'last_throttle_at': self._last_throttle_at,
+                'decreases': self._decreases,
+                'increases': self._increases
+            }
+
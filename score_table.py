@@ -0,0 +1,62 @@
+import json
+import threading
+import logging
+from typing import Dict, Any, Optional, Tuple
+
+from cache_store import SQLiteCacheStore, MISS
+
+# 로깅 설정
+logger = logging.getLogger(__name__)
+
+# 입력이 바뀌지 않은 점수를 보관하는 기간 (초) - 휴장일이 이어져도 유지되도록 넉넉히
+SCORE_TTL = 7 * 24 * 3600
+
+
+def input_version(inputs: Dict[str, Any]) -> str:
+    """점수 계산 입력(마지막 봉 날짜/값, 시장 지표 등)을 비교 가능한 문자열로 변환"""
+    return json.dumps(inputs, sort_keys=True, separators=(',', ':'), default=str)
+
+
+class ScoreTable:
+    """종목별 마지막 점수와 그때의 입력 버전을 디스크 캐시에 보관
+
+    입력 버전이 같으면 저장된 점수를 그대로 쓰고, 바뀐 종목만 다시 계산합니다.
+    """
+
+    def __init__(self, store: SQLiteCacheStore, ttl: float = SCORE_TTL, prefix: str = 'score:'):
+        self.store = store
+        self.ttl = ttl
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._reused = 0
+        self._rescored = 0
+
+    def lookup(self, ticker: str, inputs: Dict[str, Any]) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """(입력이 같아 재사용 가능한지, 저장된 분석 결과)"""
+        try:
+            cached = self.store.get(self.prefix + ticker, self.ttl)
+        except Exception as e:
+            logger.error(f"Score table read failed for {ticker}: {e}")
+            cached = MISS
+        if cached is not MISS and cached[1].get('inputs') == input_version(inputs):
+            with self._lock:
+                self._reused += 1
+            return True, cached[1].get('analysis')
+        return False, None
+
+    def record(self, ticker: str, inputs: Dict[str, Any], analysis: Optional[Dict[str, Any]]):
+        with self._lock:
+            self._rescored += 1
+        try:
+            self.store.set(self.prefix + ticker, {'inputs': input_version(inputs), 'analysis': analysis}, self.ttl)
+        except Exception as e:
+            logger.error(f"Score table write failed for {ticker}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self._reused + self._rescored
+            return {
+                'reused': self._reused,
+                'rescored': self._rescored,
+                'reuse_ratio': self._reused / total if total else 0.0
+            }
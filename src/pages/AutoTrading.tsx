@@ -295,6 +295,12 @@ const AutoTrading: React.FC = () => {
     currentBalance: 0,
     lastTradeTime: 'N/A'
   });
+  const [kisQuota, setKisQuota] = useState({
+    utilization: 0,
+    callsPerSecond: 0,
+    rate: 0,
+    processes: 0
+  });
   const [tradingLogs, setTradingLogs] = useState<Array<{
     timestamp: string;
     message: string;
@@ -318,6 +324,15 @@ const AutoTrading: React.FC = () => {
             currentBalance: status.current_balance || 0,
             lastTradeTime: status.last_activity || 'N/A'
           });
+
+          // 봇과 서버가 함께 쓰는 KIS 호출 한도 사용률
+          const quota = status.kis_quota || {};
+          setKisQuota({
+            utilization: quota.utilization || 0,
+            callsPerSecond: quota.calls_per_second || 0,
+            rate: quota.rate || 0,
+            processes: quota.processes || 0
+          });
       }
     } catch (error) {
         console.error('상태 업데이트 실패:', error);
@@ -529,6 +544,19 @@ const AutoTrading: React.FC = () => {
           <StatusValue>{tradingStats.lastTradeTime}</StatusValue>
           <StatusLabel>가장 최근 거래 시간</StatusLabel>
         </StatusCard>
+
+        <StatusCard status={botStatus}>
+          <StatusHeader>
+            <StatusTitle>
+              <FiZap size={20} />
+              KIS 호출 사용률
+            </StatusTitle>
+          </StatusHeader>
+          <StatusValue>{Math.round(kisQuota.utilization * 100)}%</StatusValue>
+          <StatusLabel>
+            초당 {kisQuota.callsPerSecond.toFixed(1)} / {kisQuota.rate}건 · 프로세스 {kisQuota.processes}개
+          </StatusLabel>
+        </StatusCard>
       </StatusGrid>
 
       <ControlPanel>
@@ -0,0 +1,211 @@
+import io
+import os
+import sys
+import threading
+import zipfile
+import logging
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# 로깅 설정
+logger = logging.getLogger(__name__)
+
+# KIS 해외주식 종목 마스터 파일 디렉토리 (nasmst.cod 등, .zip 그대로 두어도 됨)
+MASTER_DIR = os.getenv("KIS_MASTER_DIR", "kis_master")
+
+# 거래소 코드 → 마스터 파일 (같은 종목이 여러 파일에 있으면 앞 거래소 기준)
+MASTER_FILES = (
+    ('NAS', 'nasmst.cod'),
+    ('NYS', 'nysmst.cod'),
+    ('AMS', 'amsmst.cod'),
+)
+MASTER_ENCODING = 'cp949'
+
+# 마스터 파일 탭 구분 컬럼 위치
+COL_EXCHANGE = 2
+COL_SYMBOL = 4
+COL_ENGLISH_NAME = 7
+COL_SECURITY_TYPE = 8
+COL_CURRENCY = 9
+COL_BASE_PRICE = 12
+COL_BID_SIZE = 13
+COL_ASK_SIZE = 14
+
+# 증권 종류 (1: 지수, 2: 주식, 3: ETP, 4: 워런트)
+SECURITY_STOCK = '2'
+SECURITY_ETP = '3'
+
+
+def _to_float(value: str) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class SymbolInfo:
+    """종목 마스터 한 줄 (symbol은 intern된 문자열, id는 레지스트리 안에서 바뀌지 않는 번호)"""
+
+    __slots__ = ('id', 'symbol', 'exchange', 'name', 'security_type', 'currency',
+                 'base_price', 'bid_size', 'ask_size')
+
+    def __init__(self, id: int, symbol: str, exchange: str, name: str, security_type: str,
+                 currency: str, base_price: float, bid_size: float, ask_size: float):
+        self.id = id
+        self.symbol = symbol
+        self.exchange = exchange
+        self.name = name
+        self.security_type = security_type
+        self.currency = currency
+        self.base_price = base_price
+        self.bid_size = bid_size
+        self.ask_size = ask_size
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self) -> str:
+        return f"SymbolInfo({self.exchange}:{self.symbol})"
+
+
+class SymbolRegistry:
+    """KIS 해외주식 마스터 파일로 만든 종목 목록 (종목 코드로 O(1) 조회)
+
+    refresh()는 파일별 수정 시각과 크기를 비교해 바뀐 거래소 파일만 다시 읽습니다.
+    """
+
+    def __init__(self, directory: str = MASTER_DIR, master_files: Tuple[Tuple[str, str], ...] = MASTER_FILES):
+        self.directory = directory
+        self.master_files = master_files
+        self._lock = threading.Lock()
+        # 거래소별 {종목: SymbolInfo}와 전체 조회용 {종목: SymbolInfo}
+        self._by_exchange: Dict[str, Dict[str, SymbolInfo]] = {}
+        self._symbols: Dict[str, SymbolInfo] = {}
+        self._ids: Dict[str, int] = {}
+        self._file_versions: Dict[str, Tuple[float, int]] = {}
+        self._duplicates = 0
+
+    def _master_path(self, file_name: str) -> Optional[str]:
+        for candidate in (file_name, f"{file_name}.zip"):
+            path = os.path.join(self.directory, candidate)
+            if os.path.exists(path):
+                return path
+        return None
+
+    @staticmethod
+    def _read_lines(path: str) -> List[str]:
+        if path.endswith('.zip'):
+            with zipfile.ZipFile(path) as archive:
+                raw = archive.read(archive.namelist()[0])
+            return io.TextIOWrapper(io.BytesIO(raw), encoding=MASTER_ENCODING, errors='replace').readlines()
+        with open(path, 'r', encoding=MASTER_ENCODING, errors='replace') as f:
+            return f.readlines()
+
+    def _symbol_id(self, symbol: str) -> int:
+        symbol_id = self._ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = len(self._ids)
+            self._ids[symbol] = symbol_id
+        return symbol_id
+
+    def _parse(self, exchange: str, lines: Iterable[str]) -> Dict[str, SymbolInfo]:
+        listings = {}
+        for line in lines:
+            columns = line.rstrip('\r\n').split('\t')
+            if len(columns) <= COL_ASK_SIZE:
+                continue
+            symbol = columns[COL_SYMBOL].strip().upper()
+            if not symbol or symbol in listings:
+                continue
+            symbol = sys.intern(symbol)
+            listings[symbol] = SymbolInfo(
+                id=self._symbol_id(symbol),
+                symbol=symbol,
+                exchange=sys.intern(columns[COL_EXCHANGE].strip() or exchange),
+                name=columns[COL_ENGLISH_NAME].strip(),
+                security_type=columns[COL_SECURITY_TYPE].strip(),
+                currency=columns[COL_CURRENCY].strip(),
+                base_price=_to_float(columns[COL_BASE_PRICE]),
+                bid_size=_to_float(columns[COL_BID_SIZE]),
+                ask_size=_to_float(columns[COL_ASK_SIZE])
+            )
+        return listings
+
+    def refresh(self) -> bool:
+        """바뀐 마스터 파일만 다시 읽어 반영, 바뀐 파일이 있으면 True"""
+        with self._lock:
+            changed = False
+            for exchange, file_name in self.master_files:
+                path = self._master_path(file_name)
+                if path is None:
+                    if self._by_exchange.pop(exchange, None) is not None:
+                        self._file_versions.pop(exchange, None)
+                        changed = True
+                    continue
+                try:
+                    stat = os.stat(path)
+                    version = (stat.st_mtime, stat.st_size)
+                    if self._file_versions.get(exchange) == version:
+                        continue
+                    self._by_exchange[exchange] = self._parse(exchange, self._read_lines(path))
+                    self._file_versions[exchange] = version
+                    changed = True
+                    logger.info(f"Loaded {len(self._by_exchange[exchange])} {exchange} symbols from {path}")
+                except (OSError, zipfile.BadZipFile, IndexError) as e:
+                    logger.error(f"Failed to load symbol master {path}: {e}")
+            if changed:
+                self._rebuild_index()
+            return changed
+
+    def _rebuild_index(self):
+        symbols = {}
+        duplicates = 0
+        for exchange, _ in self.master_files:
+            for symbol, info in self._by_exchange.get(exchange, {}).items():
+                if symbol in symbols:
+                    duplicates += 1
+                    continue
+                symbols[symbol] = info
+        self._symbols = symbols
+        self._duplicates = duplicates
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._symbols)
+
+    def get(self, symbol: str) -> Optional[SymbolInfo]:
+        return self._symbols.get(symbol.strip().upper())
+
+    def exchange_of(self, symbol: str) -> Optional[str]:
+        info = self.get(symbol)
+        return info.exchange if info else None
+
+    def symbols(self, exchange: str = None, security_types: Tuple[str, ...] = (SECURITY_STOCK,)) -> List[str]:
+        """거래소(생략 시 전체)의 종목 코드 목록 (기본은 주식만)"""
+        return [symbol for symbol, info in self._symbols.items()
+                if (exchange is None or info.exchange == exchange)
+                and (not security_types or info.security_type in security_types)]
+
+    def resolve(self, candidates: Iterable[str], exchange: str = None) -> List[str]:
+        """후보 종목에서 중복을 빼고, 마스터가 있으면 해당 거래소에 실제 상장된 종목만 남김 (순서 유지)"""
+        resolved = []
+        seen = set()
+        for candidate in candidates:
+            symbol = candidate.strip().upper()
+            if symbol in seen:
+                continue
+            seen.add(symbol)
+            if self.loaded:
+                info = self._symbols.get(symbol)
+                if info is None or (exchange is not None and info.exchange != exchange):
+                    continue
+                symbol = info.symbol
+            resolved.append(symbol)
+        return resolved
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'symbols': len(self._symbols),
+                'exchanges': {exchange: len(listings) for exchange, listings in self._by_exchange.items()},
+                'cross_listed_duplicates': self._duplicates
+            }
@@ -0,0 +1,121 @@
+import threading
+import contextvars
+import logging
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Optional
+
+# 로깅 설정
+logger = logging.getLogger(__name__)
+
+# 사이클 안에서 한 번에 읽어 두는 일봉 수 (가장 긴 호출부: predict_next_price 60개)
+CONTEXT_BARS = 60
+
+_current_cycle: contextvars.ContextVar = contextvars.ContextVar('trading_cycle', default=None)
+
+
+class _InFlight:
+    """계산 중인 값 (같은 이름을 요청한 다른 스레드는 끝날 때까지 기다려 결과를 공유)"""
+
+    __slots__ = ('owner', 'event', 'result', 'error')
+
+    def __init__(self):
+        self.owner = threading.get_ident()
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class TickerContext:
+    """한 사이클 동안 종목 하나의 일봉, 지표, 예측을 한 번만 계산해 공유
+
+    일봉은 가장 긴 구간(max_bars)을 한 번 읽고 짧은 구간은 tail()로 잘라 씁니다.
+    계산은 락 밖에서 하고, None(조회 실패)은 저장하지 않아 다음 호출에서 다시 계산합니다.
+    """
+
+    def __init__(self, ticker: str, load_bars: Callable[[str, int], Any], max_bars: int = CONTEXT_BARS):
+        self.ticker = ticker
+        self.max_bars = max_bars
+        self._load_bars = load_bars
+        self._lock = threading.Lock()
+        self._values: Dict[str, Any] = {}
+        self._in_flight: Dict[str, _InFlight] = {}
+
+    def bars(self, count: int):
+        """최근 count개 일봉 (max_bars보다 길면 None - 호출부가 직접 조회)"""
+        if count > self.max_bars:
+            return None
+        bars = self.memo('bars', lambda: self._load_bars(self.ticker, self.max_bars))
+        return None if bars is None else bars.tail(count)
+
+    def memo(self, name: str, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            if name in self._values:
+                return self._values[name]
+            flight = self._in_flight.get(name)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[name] = _InFlight()
+
+        if not leader:
+            # 같은 스레드가 계산 중에 같은 이름을 다시 요청하면 기다리지 않고 직접 계산
+            if flight.owner == threading.get_ident():
+                return compute()
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = compute()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[name]
+                if flight.error is None and flight.result is not None:
+                    self._values[name] = flight.result
+            flight.event.set()
+
+
+class CycleContext:
+    """매매 사이클 하나에서 종목별 TickerContext와 시장 전체 입력(공포/탐욕 지수 등)을 보관"""
+
+    def __init__(self, load_bars: Callable[[str, int], Any], max_bars: int = CONTEXT_BARS):
+        self.max_bars = max_bars
+        self._load_bars = load_bars
+        self._lock = threading.Lock()
+        self._tickers: Dict[str, TickerContext] = {}
+        self._market = TickerContext('__market__', load_bars, max_bars)
+
+    def ticker(self, ticker: str) -> TickerContext:
+        with self._lock:
+            context = self._tickers.get(ticker)
+            if context is None:
+                context = TickerContext(ticker, self._load_bars, self.max_bars)
+                self._tickers[ticker] = context
+            return context
+
+    def market(self, name: str, compute: Callable[[], Any]) -> Any:
+        return self._market.memo(name, compute)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'tickers': len(self._tickers)}
+
+
+def current_cycle() -> Optional[CycleContext]:
+    """현재 컨텍스트의 매매 사이클 (없으면 None)"""
+    return _current_cycle.get()
+
+
+@contextmanager
+def cycle_scope(load_bars: Callable[[str, int], Any], max_bars: int = CONTEXT_BARS):
+    """블록 안에서 같은 종목 데이터를 한 번만 읽고 계산 (submit_with_context로 작업 스레드에도 전달)"""
+    cycle = CycleContext(load_bars, max_bars)
+    token = _current_cycle.set(cycle)
+    try:
+        yield cycle
+    finally:
+        _current_cycle.reset(token)
@@ -0,0 +1,63 @@
+import logging
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ohlcv_bars import OHLCVBars, PRICE_FIELDS
+
+# 로깅 설정
+logger = logging.getLogger(__name__)
+
+# 패널 마지막 축의 필드 순서
+FIELD_INDEX = {field: i for i, field in enumerate(PRICE_FIELDS)}
+
+
+def build_panel(bars_list: Sequence[Optional[OHLCVBars]], days: int) -> Tuple[np.ndarray, np.ndarray]:
+    """종목별 일봉을 (종목 × 최근 days일 × 필드) float64 패널로 모음
+
+    봉이 모자란 종목은 앞쪽을 NaN으로 채우고, 종목별 실제 봉 수를 함께 반환합니다.
+    """
+    panel = np.full((len(bars_list), days, len(PRICE_FIELDS)), np.nan, dtype=np.float64)
+    lengths = np.zeros(len(bars_list), dtype=np.int64)
+    for row, bars in enumerate(bars_list):
+        if bars is None or bars.empty:
+            continue
+        recent = bars.tail(days)
+        length = len(recent)
+        lengths[row] = length
+        for field, column in FIELD_INDEX.items():
+            panel[row, days - length:, column] = recent[field]
+    return panel, lengths
+
+
+def volume_change_ratios(panel: np.ndarray) -> np.ndarray:
+    """전일 대비 마지막 날 거래량 증가율(%) - 전일 거래량이 0이거나 없으면 NaN"""
+    volume = panel[:, :, FIELD_INDEX['volume']]
+    yesterday = volume[:, -2]
+    today = volume[:, -1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = (today - yesterday) / yesterday * 100
+    ratios[~(yesterday > 0)] = np.nan
+    return ratios
+
+
+def screen_volume_increase(tickers: Sequence[str], panel: np.ndarray,
+                           min_increase: float = 50.0) -> List[Dict[str, Any]]:
+    """거래량 증가율이 min_increase% 이상인 종목을 증가율 높은 순으로 반환 (배열 연산으로 한 번에 계산)"""
+    if panel.shape[0] == 0 or panel.shape[1] < 2:
+        return []
+    ratios = volume_change_ratios(panel)
+    # NaN 비교는 False라 자동으로 제외됨
+    selected = np.flatnonzero(ratios >= min_increase)
+    order = selected[np.argsort(-ratios[selected], kind='stable')]
+
+    volume = panel[:, :, FIELD_INDEX['volume']]
+    return [
+        {
+            'ticker': tickers[i],
+            'volume_increase': float(ratios[i]),
+            'yesterday_volume': float(volume[i, -2]),
+            'today_volume': float(volume[i, -1])
+        }
+        for i in order
+    ]